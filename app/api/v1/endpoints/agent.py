@@ -0,0 +1,163 @@
+import time
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_db
+from app.db.repositories.print_job import (
+    ORDER_PRINT_FILES,
+    claim_next_print_job,
+    finish_print_job,
+    get_leased_job,
+    touch_device,
+)
+from app.core.config import settings
+from app.core.security import authenticate_device
+from app.core.storage import storage
+from app.core.compression import is_compressed, open_original_stream
+from app.core.events import print_job_signals
+from app.core.lifecycle import lifecycle
+from app.schemas.agent import HeartbeatResponse, PrintJobFailure, PrintJobFile, PrintJobRead, PrintJobResult
+
+router = APIRouter()
+
+# API для агентов печати на удалённых устройствах (devices). Агент сам
+# забирает задания, поэтому API не держит соединений с принтерами:
+#
+# 1. GET  /agent/jobs/next?wait=25              — long-poll: задание или 204
+# 2. GET  /agent/jobs/{id}/files/{file_id}      — потоковое скачивание PDF
+# 3. POST /agent/jobs/{id}/ack | /fail          — итог печати
+# 4. POST /agent/heartbeat                      — признак жизни между заданиями
+#
+# Авторизация: заголовки X-Device-Id и X-Device-Secret (devices.secret_key).
+# Пример агента — print_agent.py в корне репозитория.
+
+# Задания с истёкшей арендой сигнала не присылают, поэтому ожидание
+# периодически прерывается для повторной проверки очереди
+LEASE_RECHECK_SECONDS = 10
+
+@router.post("/heartbeat", response_model=HeartbeatResponse)
+async def heartbeat(
+    device_id: str = Depends(authenticate_device),
+    db: AsyncSession = Depends(get_db)
+):
+    await touch_device(db, device_id)
+    await db.commit()
+    return HeartbeatResponse(
+        device_id=device_id,
+        server_time=datetime.utcnow(),
+        long_poll_seconds=settings.AGENT_LONG_POLL_SECONDS
+    )
+
+@router.get("/jobs/next", response_model=PrintJobRead, responses={204: {"description": "No job within the wait time"}})
+async def next_job(
+    request: Request,
+    wait: int = Query(settings.AGENT_LONG_POLL_SECONDS, ge=0, le=60),
+    device_id: str = Depends(authenticate_device),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Long-poll: отдаёт следующее задание устройства или 204, если за `wait`
+    секунд ничего не появилось. Во время ожидания соединение с БД не занято.
+    """
+    # Опрос тоже считается heartbeat; коммит освобождает соединение на время ожидания
+    await touch_device(db, device_id)
+    await db.commit()
+
+    deadline = time.monotonic() + wait
+    while True:
+        job = await claim_next_print_job(db, device_id)
+        if job is not None:
+            break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return Response(status_code=status.HTTP_204_NO_CONTENT)
+        await print_job_signals.wait(device_id, min(remaining, LEASE_RECHECK_SECONDS))
+        if lifecycle.draining or await request.is_disconnected():
+            # Агент ушёл (или воркер останавливается): не выдаём задание в пустоту,
+            # иначе оно ждало бы истечения аренды
+            return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+    result = await db.execute(ORDER_PRINT_FILES, {"order_id": job.order_id})
+    files = [
+        PrintJobFile(
+            file_id=row.file_id,
+            copies=row.copies or 1,
+            url=f"{settings.API_V1_STR}/agent/jobs/{job.id}/files/{row.file_id}"
+        )
+        for row in result.fetchall()
+    ]
+    return PrintJobRead(
+        job_id=job.id,
+        order_id=job.order_id,
+        attempt=job.attempts,
+        duplex=bool(job.duplex),
+        lease_expires_at=job.lease_expires_at,
+        files=files
+    )
+
+@router.get("/jobs/{job_id}/files/{file_id}")
+async def download_job_file(
+    job_id: int,
+    file_id: int,
+    device_id: str = Depends(authenticate_device),
+    db: AsyncSession = Depends(get_db)
+):
+    job = await get_leased_job(db, job_id, device_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Job is not leased by this device")
+
+    result = await db.execute(ORDER_PRINT_FILES, {"order_id": job.order_id})
+    file = next((row for row in result.fetchall() if row.file_id == file_id), None)
+    # Соединение с БД не нужно на время передачи файла
+    await db.commit()
+    if file is None or not file.print_path or not await storage.exists(file.print_path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found for this job")
+
+    # PDF-оригинал мог быть сжат: отдаём распакованным, длина — исходный размер
+    if is_compressed(file.print_path):
+        content_length = file.size
+    else:
+        content_length = await storage.size(file.print_path)
+    return StreamingResponse(
+        open_original_stream(file.print_path),
+        media_type="application/pdf",
+        headers={"Content-Length": str(content_length)}
+    )
+
+async def _delete_print_artifacts(files) -> None:
+    # Как и при локальной печати: временные PDF после печати не нужны
+    for file in files:
+        for temp_path in (file.temp_pdf_path, file.optimized_pdf_path):
+            if temp_path:
+                await storage.delete(temp_path)
+
+@router.post("/jobs/{job_id}/ack", response_model=PrintJobResult)
+async def ack_job(
+    job_id: int,
+    device_id: str = Depends(authenticate_device),
+    db: AsyncSession = Depends(get_db)
+):
+    job = await get_leased_job(db, job_id, device_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Job is not leased by this device")
+    files = (await db.execute(ORDER_PRINT_FILES, {"order_id": job.order_id})).fetchall()
+
+    new_status = await finish_print_job(db, job_id, device_id)
+    if new_status is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Job is not leased by this device")
+
+    await _delete_print_artifacts(files)
+    return PrintJobResult(job_id=job_id, status=new_status)
+
+@router.post("/jobs/{job_id}/fail", response_model=PrintJobResult)
+async def fail_job(
+    job_id: int,
+    failure: PrintJobFailure,
+    device_id: str = Depends(authenticate_device),
+    db: AsyncSession = Depends(get_db)
+):
+    new_status = await finish_print_job(db, job_id, device_id, error=failure.error, retry=failure.retry)
+    if new_status is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Job is not leased by this device")
+    return PrintJobResult(job_id=job_id, status=new_status)
@@ -0,0 +1,67 @@
+from datetime import date, datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.replica import get_read_db
+from app.db.repositories.analytics import get_daily_stats, get_storage_stats
+from app.core.security import require_admin
+from app.schemas.analytics import DailyStats, DailyStatsResponse, StorageStats
+
+router = APIRouter()
+
+MAX_RANGE_DAYS = 366  # Ограничиваем период, чтобы ответ оставался небольшим
+
+def _check_range(date_from: date, date_to: date) -> None:
+    if date_from > date_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_from is after date_to")
+    if (date_to - date_from).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Range is limited to {MAX_RANGE_DAYS} days")
+
+def _with_share(row: dict) -> DailyStats:
+    share = row["duplex_pages"] / row["pages"] if row["pages"] else 0.0
+    return DailyStats(**row, duplex_share=round(share, 4))
+
+def _utc_today() -> date:
+    # printed_at хранится в UTC, дни среза — тоже UTC-даты
+    return datetime.utcnow().date()
+
+@router.get("/daily", response_model=DailyStatsResponse)
+async def daily_by_printer(
+    date_from: date = Query(default_factory=lambda: _utc_today() - timedelta(days=29)),
+    date_to: date = Query(default_factory=_utc_today),
+    printer: str | None = None,
+    admin_id: int = Depends(require_admin),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Выручка, страницы и доля двусторонней печати по дням и принтерам.
+    Читает только предрассчитанные срезы daily_printer_stats.
+    """
+    _check_range(date_from, date_to)
+    rows = await get_daily_stats(db, date_from, date_to, printer)
+    return DailyStatsResponse(items=[_with_share(row) for row in rows])
+
+@router.get("/daily/totals", response_model=DailyStatsResponse)
+async def daily_totals(
+    date_from: date = Query(default_factory=lambda: _utc_today() - timedelta(days=29)),
+    date_to: date = Query(default_factory=_utc_today),
+    admin_id: int = Depends(require_admin),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """То же по дням, суммарно по всем принтерам."""
+    _check_range(date_from, date_to)
+    totals: dict[date, dict] = {}
+    for row in await get_daily_stats(db, date_from, date_to):
+        day = totals.setdefault(row["day"], {
+            "day": row["day"], "orders_count": 0, "revenue": 0, "pages": 0, "duplex_pages": 0
+        })
+        for field in ("orders_count", "revenue", "pages", "duplex_pages"):
+            day[field] += row[field]
+    return DailyStatsResponse(items=[_with_share(row) for row in totals.values()])
+
+@router.get("/storage", response_model=StorageStats)
+async def storage_usage(
+    admin_id: int = Depends(require_admin),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Экономия места от сжатия оригиналов (ORIGINALS_COMPRESSION)."""
+    return StorageStats(**await get_storage_stats(db))
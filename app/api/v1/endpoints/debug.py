@@ -0,0 +1,36 @@
+import re
+from pathlib import Path
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from app.core.config import settings
+from app.core.security import require_admin
+from app.core.runner import tool_stats
+
+router = APIRouter()
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}\.(html|prof)$")
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    admin_id: int = Depends(require_admin)
+):
+    """
+    Профиль запроса, снятый по заголовку X-Debug-Profile: 1.
+    id приходит в заголовке X-Profile-Id ответа профилируемого запроса.
+    """
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid profile id")
+
+    path = Path(settings.PROFILE_DIR) / profile_id
+    if not path.exists():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+
+    media_type = "text/html" if path.suffix == ".html" else "application/octet-stream"
+    return FileResponse(path=str(path), filename=profile_id, media_type=media_type)
+
+
+@router.get("/tools")
+async def get_tool_stats(admin_id: int = Depends(require_admin)):
+    """Метрики внешних утилит (libreoffice, pdfinfo, lp, ...) и состояние circuit breaker в этом воркере."""
+    return tool_stats()
@@ -1,26 +1,64 @@
+import fcntl
+import logging
 import re
-import subprocess
 import tempfile
+import uuid
+from typing import BinaryIO
 from PyPDF2 import PdfReader
-from fastapi import APIRouter, Depends, UploadFile, HTTPException, status, File as FastAPIFile
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, UploadFile, HTTPException, Header, Request, Response, status, File as FastAPIFile
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import text
 from app.db.models.file import File
+from app.db.models.upload_session import UploadSession
 from app.db.session import get_db
-from app.schemas.file import FileUploadResponse
+from app.schemas.file import (
+    FileBatchUploadResponse,
+    FileListResponse,
+    FileStatusResponse,
+    FileUploadResponse,
+    SkippedArchiveEntry,
+    UploadSessionRead,
+)
+from app.schemas.bulk import BulkDeleteRequest, BulkDeleteResponse, BulkItemResult
+from app.core.config import settings
 from app.core.security import decode_access_token
+from app.core.replica import get_read_db
+from app.core.storage import storage
+from app.core.compression import open_original_stream
+from app.core.cache import files_listing_cache, invalidate, listing_version
+from app.core.responses import (
+    LISTING_CACHE_CONTROL,
+    etag_matches,
+    fast_json_response,
+    listing_etag,
+    listing_response,
+    not_modified,
+)
+from app.core.tracing import span
+from app.core.archive import ArchiveError, copy_limited, extract_documents
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from app.tasks.conversion import FILE_PROCESSING, queued_conversions, schedule_processing
 import os
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
+from urllib.parse import quote
 
 router = APIRouter()
-UPLOAD_DIR = Path("./uploads")  # Директория для хранения файлов
-UPLOAD_DIR.mkdir(exist_ok=True)
+# Локальный каталог для недокачанных файлов и рабочих копий при конвертации.
+# Готовые файлы хранятся в storage (см. app/core/storage.py).
+STAGING_DIR = Path(settings.STORAGE_LOCAL_ROOT) / ".partial"
+STAGING_DIR.mkdir(parents=True, exist_ok=True)
+
+logger = logging.getLogger(__name__)
 
 MAX_USER_STORAGE_MB = 100
 ALLOWED_EXTENSIONS = {".docx", ".doc", ".pdf"}
 MAX_FILE_SIZE_MB = 10  # Максимальный размер файла в мегабайтах
+FILE_STATUS_POLL_SECONDS = 2  # Retry-After для файлов в обработке
+ARCHIVE_EXTENSIONS = {".zip"}  # Архивы принимает только /upload, документы из них идут по одному
+MAX_ARCHIVE_ENTRIES = 50
 
 def sanitize_filename(filename: str) -> str:
     """
@@ -35,68 +73,36 @@ def format_size(size_in_bytes):
     else:
         return f"{round(size_in_bytes / 1024, 2)} KB"
 
-def convert_to_pdf_and_count_pages(input_file: str, output_dir: str) -> tuple[str, int | None]:
-    """Конвертирует файл в PDF с помощью LibreOffice и подсчитывает количество страниц."""
-    try:
-        input_path = Path(input_file)
-        output_path = Path(output_dir)
-        output_path.mkdir(parents=True, exist_ok=True)
-
-        # Если файл уже PDF, возвращаем его путь и подсчитываем страницы
-        if input_path.suffix.lower() == ".pdf":
-            pdf_file = input_file
-        else:
-            subprocess.run(
-                [
-                    "libreoffice",
-                    "--headless",
-                    "--convert-to",
-                    "pdf",
-                    input_file,
-                    "--outdir",
-                    str(output_path)
-                ],
-                check=True
-            )
-            pdf_file = str(output_path / f"{input_path.stem}.pdf")
-
-        # Подсчёт страниц с помощью pdfinfo
-        page_info = subprocess.check_output(["pdfinfo", pdf_file]).decode()
-        pages = int([line.split(":")[1].strip() for line in page_info.splitlines() if "Pages" in line][0])
-
-        return pdf_file if input_path.suffix.lower() != ".pdf" else None, pages
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"Failed to convert {input_file} to PDF: {e}")
-    except Exception as e:
-        raise RuntimeError(f"Error counting pages: {e}")
-
-@router.post("/upload", response_model=FileUploadResponse)
-async def upload_file(
-    file: UploadFile = FastAPIFile(...),
-    token: str = Depends(decode_access_token),
-    db: AsyncSession = Depends(get_db)
-):
-    user_email = token.get("sub")
-    if not user_email:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-
+async def _get_user_id(db: AsyncSession, user_email: str) -> int:
     user_query = await db.execute(text("SELECT id FROM users WHERE email = :email"), {"email": user_email})
     user_id = user_query.scalar_one_or_none()
     if not user_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return user_id
 
-    _, ext = os.path.splitext(file.filename)
+def _check_extension(filename: str) -> str:
+    _, ext = os.path.splitext(filename)
     ext = ext.lower()
     if ext not in ALLOWED_EXTENSIONS:
         raise HTTPException(status_code=400, detail="Unsupported file format")
-
-    with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
-        tmp.write(await file.read())
-        tmp_path = tmp.name
-
-    query = text("SELECT COALESCE(SUM(size), 0) FROM files WHERE user_id = :user_id")
+    return ext
+
+async def _store_uploaded_file(
+    db: AsyncSession,
+    user_id: int,
+    user_email: str,
+    original_filename: str,
+    tmp_path: str
+) -> FileUploadResponse:
+    """
+    Общий конвейер для полностью полученного файла: проверка квоты,
+    сохранение оригинала в хранилище и запись в БД со статусом 'processing'.
+    Конвертация и подсчёт страниц идут в фоне (app/tasks/conversion.py),
+    клиент узнаёт итог через GET /files/{id}/status.
+    tmp_path удаляется или перемещается в любом случае.
+    """
+    query = text("SELECT COALESCE(SUM(size), 0) FROM files WHERE user_id = :user_id AND deleted_at IS NULL")
     user_files = await db.execute(query, {"user_id": user_id})
     total_size = user_files.scalar_one_or_none() or 0
 
@@ -106,46 +112,101 @@ async def upload_file(
         os.remove(tmp_path)
         raise HTTPException(status_code=400, detail="Storage limit exceeded")
 
-    user_upload_dir = UPLOAD_DIR / sanitize_filename(user_email)
-    user_upload_dir.mkdir(exist_ok=True)
-
     timestamp = datetime.utcnow().isoformat().replace(":", "-")
-    safe_filename = sanitize_filename(file.filename)
-    filename = f"{timestamp}_{safe_filename}"
-    filepath = user_upload_dir / filename
-
-    os.rename(tmp_path, filepath)
+    safe_filename = sanitize_filename(original_filename)
+    filepath = f"{sanitize_filename(user_email)}/{timestamp}_{safe_filename}"
 
-    # Конвертируем в PDF и подсчитываем страницы
-    try:
-        temp_pdf_path, pages_count = convert_to_pdf_and_count_pages(str(filepath), str(user_upload_dir))
-    except Exception as e:
-        os.remove(filepath)
-        raise HTTPException(status_code=500, detail=str(e))
+    with span("storage"):
+        await storage.save_file(filepath, tmp_path)
 
     new_file = File(
         user_id=user_id,
-        original_filename=file.filename,
+        original_filename=original_filename,
         filename=safe_filename,
-        filepath=str(filepath),
-        temp_pdf_path=temp_pdf_path,
+        filepath=filepath,
         size=file_size,
         uploaded_at=datetime.utcnow(),
-        pages_count=pages_count
+        pages_count=None,
+        status=FILE_PROCESSING
     )
     db.add(new_file)
+    await invalidate(db, files_listing_cache, user_id)
     await db.commit()
     await db.refresh(new_file)
 
+    schedule_processing(new_file.id)
+
     return FileUploadResponse(
         id=new_file.id,
         filename=new_file.filename,
         size=file_size,
-        pages=pages_count
+        status=new_file.status
     )
 
-@router.get("/files", response_model=dict)
-async def list_files(
+async def _store_archive(
+    db: AsyncSession,
+    user_id: int,
+    user_email: str,
+    upload: UploadFile
+) -> FileBatchUploadResponse:
+    """
+    Загрузка zip: каждый .pdf/.doc/.docx архива становится отдельным File и
+    уходит в фоновую конвертацию (параллельно, в пределах MAX_INFLIGHT_CONVERSIONS).
+    Остальные записи, как и не поместившиеся в очередь конвертаций,
+    пропускаются с причиной.
+    """
+    query = text("SELECT COALESCE(SUM(size), 0) FROM files WHERE user_id = :user_id AND deleted_at IS NULL")
+    used_storage = (await db.execute(query, {"user_id": user_id})).scalar_one()
+    remaining = MAX_USER_STORAGE_MB * 1024 * 1024 - used_storage
+    if remaining <= 0:
+        raise HTTPException(status_code=400, detail="Storage limit exceeded")
+
+    with tempfile.TemporaryDirectory(prefix="archive-", dir=STAGING_DIR) as workdir:
+        archive_path = Path(workdir) / "upload.zip"
+        try:
+            await run_in_threadpool(copy_limited, upload.file, archive_path, MAX_USER_STORAGE_MB * 1024 * 1024)
+            # Распаковываем не больше, чем осталось в квоте: иначе zip-бомба заняла бы диск
+            extracted, skipped = await run_in_threadpool(
+                extract_documents,
+                archive_path,
+                Path(workdir),
+                ALLOWED_EXTENSIONS,
+                MAX_FILE_SIZE_MB * 1024 * 1024,
+                remaining,
+                MAX_ARCHIVE_ENTRIES,
+            )
+        except ArchiveError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        archive_path.unlink()
+
+        files = []
+        skipped = [SkippedArchiveEntry(name=name, reason=reason) for name, reason in skipped]
+        # Архив проходит admission одним запросом, но ставит в очередь
+        # много конвертаций: сверх MAX_QUEUED_CONVERSIONS записи пропускаем
+        room = settings.MAX_QUEUED_CONVERSIONS - await queued_conversions(db)
+        for name, path in extracted:
+            if len(files) >= room:
+                skipped.append(SkippedArchiveEntry(name=name, reason="Conversion capacity exhausted, try again later"))
+                continue
+            try:
+                files.append(await _store_uploaded_file(db, user_id, user_email, name, str(path)))
+            except HTTPException as e:
+                skipped.append(SkippedArchiveEntry(name=name, reason=str(e.detail)))
+
+    if not files:
+        raise HTTPException(
+            status_code=400,
+            detail={"message": "No supported files in archive", "skipped": [entry.model_dump() for entry in skipped]}
+        )
+    return FileBatchUploadResponse(files=files, skipped=skipped)
+
+@router.post(
+    "/upload",
+    response_model=FileUploadResponse | FileBatchUploadResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def upload_file(
+    file: UploadFile = FastAPIFile(...),
     token: str = Depends(decode_access_token),
     db: AsyncSession = Depends(get_db)
 ):
@@ -154,6 +215,263 @@ async def list_files(
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
+    user_id = await _get_user_id(db, user_email)
+    if os.path.splitext(file.filename)[1].lower() in ARCHIVE_EXTENSIONS:
+        return await _store_archive(db, user_id, user_email, file)
+    ext = _check_extension(file.filename)
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
+        tmp.write(await file.read())
+        tmp_path = tmp.name
+
+    return await _store_uploaded_file(db, user_id, user_email, file.filename, tmp_path)
+
+# --- Резюмируемая загрузка (по мотивам протокола tus) ---
+#
+# 1. POST   /uploads                   — создать сессию (Upload-Length в заголовке)
+# 2. PATCH  /uploads/{id}              — дописать чанк начиная с Upload-Offset
+# 3. HEAD   /uploads/{id}              — узнать текущий Upload-Offset после обрыва
+# 4. POST   /uploads/{id}/finalize     — проверки и создание File, конвертация уходит в фон
+
+async def _get_upload_session(db: AsyncSession, upload_id: str, user_id: int) -> UploadSession:
+    session = await db.get(UploadSession, upload_id)
+    if not session or session.user_id != user_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found")
+    if session.expires_at < datetime.utcnow():
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Upload session expired")
+    return session
+
+def _lock_staging(staging_path: str) -> BinaryIO:
+    """
+    Открывает staging-файл и берёт на него эксклюзивную flock-блокировку.
+    Занят другим PATCH — BlockingIOError. Блокировка снимается при закрытии.
+    """
+    staging = open(staging_path, "r+b")
+    try:
+        fcntl.flock(staging, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        staging.close()
+        raise
+    return staging
+
+def _rewind_staging(staging: BinaryIO, offset: int) -> None:
+    staging.truncate(offset)
+    staging.seek(offset)
+
+def _upload_headers(session: UploadSession) -> dict:
+    return {
+        "Upload-Offset": str(session.upload_offset),
+        "Upload-Length": str(session.upload_length),
+        "Upload-Expires": session.expires_at.isoformat(),
+    }
+
+@router.post("/uploads", response_model=UploadSessionRead, status_code=status.HTTP_201_CREATED)
+async def create_upload_session(
+    filename: str,
+    response: Response,
+    upload_length: int = Header(...),
+    token: dict = Depends(decode_access_token),
+    db: AsyncSession = Depends(get_db)
+):
+    user_email = token.get("sub")
+    if not user_email:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+    user_id = await _get_user_id(db, user_email)
+    ext = _check_extension(filename)
+
+    if upload_length <= 0 or upload_length > MAX_FILE_SIZE_MB * 1024 * 1024:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File is too large")
+
+    upload_id = uuid.uuid4().hex
+    staging_path = STAGING_DIR / f"{upload_id}{ext}"
+    staging_path.touch()
+
+    now = datetime.utcnow()
+    session = UploadSession(
+        id=upload_id,
+        user_id=user_id,
+        original_filename=filename,
+        upload_length=upload_length,
+        upload_offset=0,
+        staging_path=str(staging_path),
+        created_at=now,
+        expires_at=now + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+    )
+    db.add(session)
+    await db.commit()
+
+    response.headers.update(_upload_headers(session))
+    response.headers["Location"] = f"{settings.API_V1_STR}/files/uploads/{upload_id}"
+    return UploadSessionRead(
+        upload_id=upload_id,
+        offset=0,
+        length=upload_length,
+        expires_at=session.expires_at
+    )
+
+@router.head("/uploads/{upload_id}")
+async def get_upload_offset(
+    upload_id: str,
+    token: dict = Depends(decode_access_token),
+    db: AsyncSession = Depends(get_db)
+):
+    user_email = token.get("sub")
+    if not user_email:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+    user_id = await _get_user_id(db, user_email)
+    session = await _get_upload_session(db, upload_id, user_id)
+    headers = _upload_headers(session)
+    headers["Cache-Control"] = "no-store"
+    return Response(status_code=status.HTTP_200_OK, headers=headers)
+
+@router.patch("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(...),
+    token: dict = Depends(decode_access_token),
+    db: AsyncSession = Depends(get_db)
+):
+    user_email = token.get("sub")
+    if not user_email:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+    user_id = await _get_user_id(db, user_email)
+    session = await _get_upload_session(db, upload_id, user_id)
+
+    # Запись в staging-файл сериализуется блокировкой самого файла, а не
+    # строки в БД: медленный клиент не держит ни транзакцию, ни соединение из пула
+    try:
+        staging = await run_in_threadpool(_lock_staging, session.staging_path)
+    except BlockingIOError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Another upload to this session is in progress",
+            headers=_upload_headers(session)
+        )
+    try:
+        # Смещение перечитываем уже под блокировкой файла и отпускаем соединение
+        await db.refresh(session)
+        await db.commit()
+
+        if upload_offset != session.upload_offset:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Upload-Offset does not match the current offset",
+                headers=_upload_headers(session)
+            )
+
+        # Чанк дописывается в staging-файл по мере чтения тела запроса, без
+        # буферизации в памяти. Обрезаем файл до подтверждённого смещения,
+        # чтобы хвост от прерванной записи не попал в итоговый файл.
+        received = 0
+        await run_in_threadpool(_rewind_staging, staging, upload_offset)
+        try:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if upload_offset + received > session.upload_length:
+                    await run_in_threadpool(_rewind_staging, staging, upload_offset)
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail="Chunk exceeds declared Upload-Length"
+                    )
+                await run_in_threadpool(staging.write, chunk)
+        except ClientDisconnect:
+            # Уже полученные байты засчитываем: клиент продолжит с нового смещения
+            logger.info("Upload %s interrupted by client after %d bytes", upload_id, received)
+        await run_in_threadpool(staging.flush)
+
+        # Файл всё ещё заблокирован; условие на смещение — страховка от
+        # записи в обход блокировки (например, с другого хоста)
+        query = text(
+            "UPDATE upload_sessions SET upload_offset = :new_offset "
+            "WHERE id = :upload_id AND upload_offset = :old_offset RETURNING upload_offset"
+        )
+        result = await db.execute(query, {
+            "new_offset": upload_offset + received,
+            "upload_id": upload_id,
+            "old_offset": upload_offset
+        })
+        new_offset = result.scalar_one_or_none()
+        if new_offset is None:
+            await db.rollback()
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Concurrent upload to the same offset")
+        await db.commit()
+    finally:
+        # Закрытие снимает блокировку — только после коммита нового смещения
+        await run_in_threadpool(staging.close)
+
+    return Response(
+        status_code=status.HTTP_204_NO_CONTENT,
+        headers={"Upload-Offset": str(new_offset)}
+    )
+
+@router.post("/uploads/{upload_id}/finalize", response_model=FileUploadResponse, status_code=status.HTTP_202_ACCEPTED)
+async def finalize_upload(
+    upload_id: str,
+    token: dict = Depends(decode_access_token),
+    db: AsyncSession = Depends(get_db)
+):
+    user_email = token.get("sub")
+    if not user_email:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+    user_id = await _get_user_id(db, user_email)
+    session = await _get_upload_session(db, upload_id, user_id)
+
+    if session.upload_offset != session.upload_length:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload is incomplete",
+            headers=_upload_headers(session)
+        )
+
+    _check_extension(session.original_filename)
+    original_filename = session.original_filename
+    staging_path = session.staging_path
+
+    # Сессию удаляем до запуска конвейера: staging-файл будет перемещён
+    # или удалён внутри _store_uploaded_file, повторный finalize невозможен.
+    await db.delete(session)
+    await db.commit()
+
+    return await _store_uploaded_file(db, user_id, user_email, original_filename, staging_path)
+
+@router.delete("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_upload(
+    upload_id: str,
+    token: dict = Depends(decode_access_token),
+    db: AsyncSession = Depends(get_db)
+):
+    user_email = token.get("sub")
+    if not user_email:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+    user_id = await _get_user_id(db, user_email)
+    session = await _get_upload_session(db, upload_id, user_id)
+
+    Path(session.staging_path).unlink(missing_ok=True)
+    await db.delete(session)
+    await db.commit()
+
+@router.get("/files", response_model=FileListResponse)
+async def list_files(
+    if_none_match: str | None = Header(None),
+    token: str = Depends(decode_access_token),
+    db: AsyncSession = Depends(get_read_db)
+):
+    user_email = token.get("sub")
+    if not user_email:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
     query_user_id = text("SELECT id FROM users WHERE email = :email")
     result_user_id = await db.execute(query_user_id, {"email": user_email})
     user_id = result_user_id.scalar_one_or_none()
@@ -162,27 +480,46 @@ async def list_files(
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    query_files = text("SELECT * FROM files WHERE user_id = :user_id")
+    # Мутация вытесняет тело через шину, а set() с поколением не кэширует
+    # ответ, собранный во время сброса; версия хранится вместе с телом,
+    # так что ETag всегда соответствует именно этому телу
+    cached = files_listing_cache.get(user_id)
+    if cached is not None:
+        version, body = cached
+        return listing_response(body, listing_etag(files_listing_cache.name, user_id, version), if_none_match)
+
+    # Поколение снимаем до запросов: если за время запроса список сбросят,
+    # устаревшее тело не попадёт в кэш
+    generation = files_listing_cache.generation()
+    # Версию читаем до данных: если запись проскочит между запросами,
+    # тело окажется новее ETag, и клиент просто перезапросит список
+    version = await listing_version(db, files_listing_cache, user_id)
+    etag = listing_etag(files_listing_cache.name, user_id, version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    query_files = text("""
+        SELECT id, original_filename, filename, pages_count, size, uploaded_at, status
+        FROM files WHERE user_id = :user_id AND deleted_at IS NULL
+    """)
     result_files = await db.execute(query_files, {"user_id": user_id})
-    files = [
-        {
-            **dict(row),
-            "size": format_size(row["size"])
-        }
-        for row in result_files.mappings()
-    ]
-
-    query_storage = text(
-        "SELECT COALESCE(SUM(size), 0) FROM files WHERE user_id = :user_id")
-    result_storage = await db.execute(query_storage, {"user_id": user_id})
-    used_storage = result_storage.scalar_one_or_none() or 0
+    used_storage = 0
+    files = []
+    for row in result_files.mappings():
+        # Колонки запроса совпадают с полями FileListItem
+        used_storage += row["size"]
+        files.append({**row, "size": format_size(row["size"])})
+
+    # Занятое место считаем по уже полученным строкам, без второго запроса
     remaining_storage_mb = round(
         (MAX_USER_STORAGE_MB * 1024 * 1024 - used_storage) / (1024 * 1024), 2)
 
-    return {
+    response = fast_json_response({
         "files": files,
         "remaining_storage_mb": remaining_storage_mb
-    }
+    }, headers={"ETag": etag, "Cache-Control": LISTING_CACHE_CONTROL})
+    files_listing_cache.set(user_id, (version, response.body), generation)
+    return response
 
 @router.delete("/files/{file_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_file(
@@ -205,30 +542,62 @@ async def delete_file(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
-    query = text(
-        "SELECT * FROM files WHERE id = :file_id AND user_id = :user_id")
-    result = await db.execute(query, {"file_id": file_id, "user_id": user_id})
-    file = result.fetchone()
-
-    if not file:
+    # Только помечаем строку: файл может быть нужен неоплаченному или ещё
+    # не напечатанному заказу. Данные в хранилище и саму строку удалит
+    # reclaim_deleted, когда на файл не останется ссылок.
+    query = text("""
+        UPDATE files SET deleted_at = :now
+        WHERE id = :file_id AND user_id = :user_id AND deleted_at IS NULL
+        RETURNING id
+    """)
+    result = await db.execute(query, {"now": datetime.utcnow(), "file_id": file_id, "user_id": user_id})
+
+    if result.scalar_one_or_none() is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"File with ID {file_id} not found or does not belong to the user"
         )
 
-    filepath = Path(file.filepath)
-    if filepath.exists():
-        filepath.unlink()
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"File with ID {file_id} not found on the disk"
-        )
+    await invalidate(db, files_listing_cache, user_id)
+    await db.commit()
 
-    delete_query = text("DELETE FROM files WHERE id = :file_id")
-    await db.execute(delete_query, {"file_id": file_id})
+@router.post("/files/bulk-delete", response_model=BulkDeleteResponse)
+async def bulk_delete_files(
+    bulk: BulkDeleteRequest,
+    token: str = Depends(decode_access_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Удаляет несколько файлов одной транзакцией. Владелец проверяется тем же
+    UPDATE: чужие и уже удалённые id получают not_found. Данные в хранилище
+    удалит reclaim_deleted в фоне, как и при удалении по одному.
+    """
+    user_email = token.get("sub")
+    if not user_email:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    user_id = await _get_user_id(db, user_email)
+
+    file_ids = list(dict.fromkeys(bulk.ids))
+    result = await db.execute(text("""
+        UPDATE files SET deleted_at = :now
+        WHERE id = ANY(:file_ids) AND user_id = :user_id AND deleted_at IS NULL
+        RETURNING id
+    """), {"now": datetime.utcnow(), "file_ids": file_ids, "user_id": user_id})
+    deleted = set(result.scalars().all())
+
+    if deleted:
+        await invalidate(db, files_listing_cache, user_id)
     await db.commit()
 
+    return BulkDeleteResponse(
+        deleted=len(deleted),
+        results=[
+            BulkItemResult(id=file_id, status="deleted") if file_id in deleted
+            else BulkItemResult(id=file_id, status="not_found", detail="File not found or does not belong to the user")
+            for file_id in file_ids
+        ]
+    )
+
 @router.patch("/files/{file_id}", status_code=status.HTTP_200_OK)
 async def rename_file(
     file_id: int,
@@ -251,7 +620,7 @@ async def rename_file(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
-    query = text("SELECT * FROM files WHERE id = :file_id AND user_id = :user_id")
+    query = text("SELECT * FROM files WHERE id = :file_id AND user_id = :user_id AND deleted_at IS NULL")
     result = await db.execute(query, {"file_id": file_id, "user_id": user_id})
     file = result.fetchone()
 
@@ -264,15 +633,51 @@ async def rename_file(
     new_filename = f"{new_name}{Path(file.filename).suffix}"
     update_query = text("UPDATE files SET filename = :new_filename WHERE id = :file_id")
     await db.execute(update_query, {"new_filename": new_filename, "file_id": file_id})
+    await invalidate(db, files_listing_cache, user_id)
     await db.commit()
 
     return {"message": f"File renamed to {new_filename}"}
 
+@router.get("/files/{file_id}/status", response_model=FileStatusResponse)
+async def get_file_status(
+    file_id: int,
+    response: Response,
+    token: str = Depends(decode_access_token),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Статус фоновой обработки файла: processing -> ready | failed."""
+    user_email = token.get("sub")
+    if not user_email:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token"
+        )
+
+    user_id = await _get_user_id(db, user_email)
+
+    query = text("""
+        SELECT id, status, pages_count, error FROM files
+        WHERE id = :file_id AND user_id = :user_id AND deleted_at IS NULL
+    """)
+    result = await db.execute(query, {"file_id": file_id, "user_id": user_id})
+    file = result.fetchone()
+
+    if not file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"File with ID {file_id} not found or does not belong to the user"
+        )
+
+    if file.status == FILE_PROCESSING:
+        # Подсказка клиенту, как часто опрашивать
+        response.headers["Retry-After"] = str(FILE_STATUS_POLL_SECONDS)
+    response.headers["Cache-Control"] = "no-store"
+    return FileStatusResponse(id=file.id, status=file.status, pages=file.pages_count, error=file.error)
+
 @router.get("/files/download/{file_id}")
 async def download_file(
     file_id: int,
     token: str = Depends(decode_access_token),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     user_email = token.get("sub")
     if not user_email:
@@ -289,7 +694,7 @@ async def download_file(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
-    query = text("SELECT * FROM files WHERE id = :file_id AND user_id = :user_id")
+    query = text("SELECT * FROM files WHERE id = :file_id AND user_id = :user_id AND deleted_at IS NULL")
     result = await db.execute(query, {"file_id": file_id, "user_id": user_id})
     file = result.fetchone()
 
@@ -299,15 +704,18 @@ async def download_file(
             detail=f"File with ID {file_id} not found or does not belong to the user"
         )
 
-    filepath = Path(file.filepath)
-    if not filepath.exists():
+    if not await storage.exists(file.filepath):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="File not found on the server"
         )
 
-    return FileResponse(
-        path=str(filepath),
-        filename=file.filename,
-        media_type="application/octet-stream"
+    # Сжатый оригинал распаковывается на лету; size — исходный размер файла
+    return StreamingResponse(
+        open_original_stream(file.filepath),
+        media_type="application/octet-stream",
+        headers={
+            "Content-Disposition": f"attachment; filename*=utf-8''{quote(file.filename)}",
+            "Content-Length": str(file.size),
+        }
     )
@@ -1,22 +1,43 @@
+import asyncio
+import json
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import text
 from app.db.models.order import Order, OrderFile
 from app.db.session import get_db
 from app.core.config import settings
 from app.core.security import decode_access_token
+from app.core.replica import get_read_db
+from app.core.events import order_events, publish_order_event
+from app.core.lifecycle import lifecycle
+from app.core.idempotency import request_fingerprint, run_idempotent
+from app.core.cache import orders_listing_cache, invalidate, listing_version
+from app.core.responses import (
+    LISTING_CACHE_CONTROL,
+    etag_matches,
+    fast_json_response,
+    listing_etag,
+    listing_response,
+    not_modified,
+)
+from app.schemas.order import OrderListResponse
+from app.schemas.bulk import BulkDeleteRequest, BulkDeleteResponse, BulkItemResult
+from app.tasks.conversion import FILE_READY
 from typing import List
 
 router = APIRouter()
 
 price_per_page = settings.PRICE_PER_PAGE
+SSE_KEEPALIVE_SECONDS = 15
 
 @router.post("/orders")
 async def create_order(
     file_ids: list[int],
     copies: list[int],
     duplex: bool = False,
+    idempotency_key: str | None = Header(None),
     token: dict = Depends(decode_access_token),
     db: AsyncSession = Depends(get_db)
 ):
@@ -32,59 +53,78 @@ async def create_order(
     if not user_id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    # Проверяем, что файлы принадлежат пользователю
-    query = text("SELECT id, pages_count FROM files WHERE id = ANY(:file_ids) AND user_id = :user_id")
-    result = await db.execute(query, {"file_ids": file_ids, "user_id": user_id})
-    user_files = result.fetchall()
-
-    if len(user_files) != len(file_ids):
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Some files do not belong to the user")
-
-    # Рассчитываем цену на основе количества страниц из базы данных
-    total_price = 0
-    files_with_pages = []
-    for idx, file in enumerate(user_files):
-        file_data = {"file_id": file.id, "pages_count": file.pages_count, "copies": copies[idx]}
-        files_with_pages.append(file_data)
-        total_price += file.pages_count * copies[idx] * price_per_page
-
-    if duplex:
-        total_price = int(total_price * 0.8)  # Скидка 20% за двустороннюю печать
-
-    # Создаём заказ
-    new_order = Order(
-        user_id=user_id,
-        created_at=datetime.utcnow(),
-        status="created",
-        total_price=total_price,
-        duplex=duplex
-    )
-    db.add(new_order)
-    await db.commit()
-    await db.refresh(new_order)
-
-    # Связываем файлы с заказом
-    for file_data in files_with_pages:
-        order_file = OrderFile(
-            order_id=new_order.id,
-            file_id=file_data["file_id"],
-            copies=file_data["copies"]
+    async def create():
+        # Проверяем, что файлы принадлежат пользователю
+        query = text("""
+            SELECT id, pages_count, status FROM files
+            WHERE id = ANY(:file_ids) AND user_id = :user_id AND deleted_at IS NULL
+        """)
+        result = await db.execute(query, {"file_ids": file_ids, "user_id": user_id})
+        user_files = result.fetchall()
+
+        if len(user_files) != len(file_ids):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Some files do not belong to the user")
+
+        # Страницы известны только после фоновой конвертации
+        not_ready = [file.id for file in user_files if file.status != FILE_READY]
+        if not_ready:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail={"message": "Some files are not ready yet", "file_ids": not_ready}
+            )
+
+        # Рассчитываем цену на основе количества страниц из базы данных
+        total_price = 0
+        files_with_pages = []
+        for idx, file in enumerate(user_files):
+            file_data = {"file_id": file.id, "pages_count": file.pages_count, "copies": copies[idx]}
+            files_with_pages.append(file_data)
+            total_price += file.pages_count * copies[idx] * price_per_page
+
+        if duplex:
+            total_price = int(total_price * 0.8)  # Скидка 20% за двустороннюю печать
+
+        # Создаём заказ
+        new_order = Order(
+            user_id=user_id,
+            created_at=datetime.utcnow(),
+            status="created",
+            total_price=total_price,
+            duplex=duplex
         )
-        db.add(order_file)
-    await db.commit()
-
-    return {
-        "order_id": new_order.id,
-        "status": new_order.status,
-        "total_price": total_price,
-        "files": files_with_pages
-    }
-
-
-@router.get("/orders")
+        db.add(new_order)
+        # flush выдаёт id заказа; заказ, его файлы и ответ для Idempotency-Key
+        # коммитит одной транзакцией run_idempotent
+        await db.flush()
+
+        # Связываем файлы с заказом
+        for file_data in files_with_pages:
+            order_file = OrderFile(
+                order_id=new_order.id,
+                file_id=file_data["file_id"],
+                copies=file_data["copies"]
+            )
+            db.add(order_file)
+        await publish_order_event(db, new_order.id, user_id, new_order.status)
+        await invalidate(db, orders_listing_cache, user_id)
+
+        return {
+            "order_id": new_order.id,
+            "status": new_order.status,
+            "total_price": total_price,
+            "files": files_with_pages
+        }
+
+    # Повтор с тем же Idempotency-Key получает сохранённый ответ
+    fingerprint = request_fingerprint("POST", "/orders", {"file_ids": file_ids, "copies": copies, "duplex": duplex})
+    return await run_idempotent(db, user_id, idempotency_key, fingerprint, create)
+
+
+@router.get("/orders", response_model=OrderListResponse)
 async def list_orders(
+    if_none_match: str | None = Header(None),
     token: dict = Depends(decode_access_token),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     user_email = token.get("sub")
     if not user_email:
@@ -98,20 +138,94 @@ async def list_orders(
     if not user_id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
+    # Кэш согласуется с версией так же, как в list_files
+    cached = orders_listing_cache.get(user_id)
+    if cached is not None:
+        version, body = cached
+        return listing_response(body, listing_etag(orders_listing_cache.name, user_id, version), if_none_match)
+
+    # Поколение и версию снимаем до данных, см. list_files
+    generation = orders_listing_cache.generation()
+    version = await listing_version(db, orders_listing_cache, user_id)
+    etag = listing_etag(orders_listing_cache.name, user_id, version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
     # Получаем список заказов
-    query_orders = text("SELECT * FROM orders WHERE user_id = :user_id ORDER BY created_at DESC")
+    query_orders = text("""
+        SELECT id, created_at, updated_at, status, total_price, duplex
+        FROM orders WHERE user_id = :user_id AND deleted_at IS NULL ORDER BY created_at DESC
+    """)
     result_orders = await db.execute(query_orders, {"user_id": user_id})
-    orders = result_orders.mappings().all()  # Преобразуем в список словарей
+    # Колонки запроса совпадают с полями OrderListItem
+    orders = [dict(row) for row in result_orders.mappings()]
+
+    response = fast_json_response({"orders": orders}, headers={"ETag": etag, "Cache-Control": LISTING_CACHE_CONTROL})
+    orders_listing_cache.set(user_id, (version, response.body), generation)
+    return response
+
+
+@router.get("/events")
+async def order_events_stream(
+    request: Request,
+    token: dict = Depends(decode_access_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Server-Sent Events со сменами статусов заказов пользователя
+    (created → paid → closed / failed). Заменяет поллинг GET /orders/{order_id}.
+    Сразу после подключения отдаёт снимок незакрытых заказов.
+    """
+    user_email = token.get("sub")
+    if not user_email:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+    query_user_id = text("SELECT id FROM users WHERE email = :email")
+    result_user_id = await db.execute(query_user_id, {"email": user_email})
+    user_id = result_user_id.scalar_one_or_none()
+
+    if not user_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    return {"orders": orders}
+    # Подписываемся до снимка, чтобы не потерять переход между ними
+    queue = order_events.subscribe(user_id)
 
+    query_snapshot = text("""
+        SELECT id, status FROM orders
+        WHERE user_id = :user_id AND status != 'closed' AND deleted_at IS NULL
+    """)
+    result_snapshot = await db.execute(query_snapshot, {"user_id": user_id})
+    snapshot = [{"order_id": row.id, "user_id": user_id, "status": row.status} for row in result_snapshot]
+    # Соединение с БД больше не нужно — не держим его, пока открыт поток
+    await db.close()
+
+    async def stream():
+        try:
+            for event in snapshot:
+                yield f"event: order\ndata: {json.dumps(event)}\n\n"
+            # При остановке воркера поток закрывается, EventSource переподключится к другому
+            while not lifecycle.draining and not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: order\ndata: {json.dumps(event)}\n\n"
+        finally:
+            order_events.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @router.get("/orders/{order_id}")
 async def get_order(
     order_id: int,
     token: dict = Depends(decode_access_token),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     user_email = token.get("sub")
     if not user_email:
@@ -126,7 +240,7 @@ async def get_order(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
     # Получаем информацию о заказе
-    query_order = text("SELECT * FROM orders WHERE id = :order_id AND user_id = :user_id")
+    query_order = text("SELECT * FROM orders WHERE id = :order_id AND user_id = :user_id AND deleted_at IS NULL")
     result_order = await db.execute(query_order, {"order_id": order_id, "user_id": user_id})
     order = result_order.mappings().first()
 
@@ -156,6 +270,60 @@ async def get_order(
     return order
 
 
+@router.post("/orders/bulk-delete", response_model=BulkDeleteResponse)
+async def bulk_delete_orders(
+    bulk: BulkDeleteRequest,
+    token: dict = Depends(decode_access_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Удаляет несколько заказов одной транзакцией, по тем же правилам, что и
+    DELETE /orders/{id}: заказ в печати получает conflict, чужой — not_found.
+    """
+    user_email = token.get("sub")
+    if not user_email:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+    # Получаем ID пользователя
+    query_user_id = text("SELECT id FROM users WHERE email = :email")
+    result_user_id = await db.execute(query_user_id, {"email": user_email})
+    user_id = result_user_id.scalar_one_or_none()
+
+    if not user_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    order_ids = list(dict.fromkeys(bulk.ids))
+    result = await db.execute(text("""
+        UPDATE orders SET deleted_at = :now
+        WHERE id = ANY(:order_ids) AND user_id = :user_id AND deleted_at IS NULL AND status != 'printing'
+        RETURNING id
+    """), {"now": datetime.utcnow(), "order_ids": order_ids, "user_id": user_id})
+    deleted = set(result.scalars().all())
+
+    printing = set()
+    if len(deleted) < len(order_ids):
+        # Один запрос на все неудалённые: отличаем заказы в печати от чужих и несуществующих
+        result = await db.execute(text("""
+            SELECT id FROM orders
+            WHERE id = ANY(:order_ids) AND user_id = :user_id AND deleted_at IS NULL AND status = 'printing'
+        """), {"order_ids": [order_id for order_id in order_ids if order_id not in deleted], "user_id": user_id})
+        printing = set(result.scalars().all())
+
+    if deleted:
+        await invalidate(db, orders_listing_cache, user_id)
+    await db.commit()
+
+    results = []
+    for order_id in order_ids:
+        if order_id in deleted:
+            results.append(BulkItemResult(id=order_id, status="deleted"))
+        elif order_id in printing:
+            results.append(BulkItemResult(id=order_id, status="conflict", detail="Order is being printed"))
+        else:
+            results.append(BulkItemResult(id=order_id, status="not_found", detail="Order not found or already deleted"))
+    return BulkDeleteResponse(deleted=len(deleted), results=results)
+
+
 @router.delete("/orders/{order_id}")
 async def delete_order(
     order_id: int,
@@ -174,17 +342,27 @@ async def delete_order(
     if not user_id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    # Удаляем связанные записи из order_files
-    query_delete_files = text("DELETE FROM order_files WHERE order_id = :order_id")
-    await db.execute(query_delete_files, {"order_id": order_id})
-
-    # Удаляем заказ
-    query_delete_order = text("DELETE FROM orders WHERE id = :order_id AND user_id = :user_id RETURNING id")
-    result_delete_order = await db.execute(query_delete_order, {"order_id": order_id, "user_id": user_id})
+    # Помечаем заказ удалённым; order_files и сам заказ удалит reclaim_deleted.
+    # Заказ, который сейчас печатает агент, удалить нельзя.
+    query_delete_order = text("""
+        UPDATE orders SET deleted_at = :now
+        WHERE id = :order_id AND user_id = :user_id AND deleted_at IS NULL AND status != 'printing'
+        RETURNING id
+    """)
+    result_delete_order = await db.execute(query_delete_order, {
+        "now": datetime.utcnow(),
+        "order_id": order_id,
+        "user_id": user_id
+    })
     deleted_order = result_delete_order.fetchone()
 
     if not deleted_order:
+        query_status = text("SELECT status FROM orders WHERE id = :order_id AND user_id = :user_id AND deleted_at IS NULL")
+        result_status = await db.execute(query_status, {"order_id": order_id, "user_id": user_id})
+        if result_status.scalar_one_or_none() == "printing":
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Order is being printed")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found or already deleted")
 
+    await invalidate(db, orders_listing_cache, user_id)
     await db.commit()
     return {"message": f"Order {order_id} deleted successfully"}
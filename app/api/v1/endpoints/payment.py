@@ -1,15 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import text
 from datetime import datetime
 from app.db.session import get_db
+from app.schemas.payment import PaymentWebhookBatch, PaymentWebhookResponse, PaymentNotificationResult
 from app.core.security import decode_access_token  # Импорт функции для проверки токена
+from app.core.config import settings
+from app.core.events import publish_order_event, publish_order_events
+from app.core.payments import verify_notification
+from app.core.cache import orders_listing_cache, invalidate
+from app.core.idempotency import request_fingerprint, run_idempotent
 
 router = APIRouter()
 
 @router.post("/pay/{order_id}")
 async def process_payment(
     order_id: int,
+    idempotency_key: str | None = Header(None),
     token: dict = Depends(decode_access_token),  # Проверка токена
     db: AsyncSession = Depends(get_db)
 ):
@@ -25,24 +32,114 @@ async def process_payment(
     if not user_id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    # Проверяем существование заказа
-    query_order = text("SELECT * FROM orders WHERE id = :order_id AND user_id = :user_id")
-    result_order = await db.execute(query_order, {"order_id": order_id, "user_id": user_id})
-    order = result_order.fetchone()
+    async def pay():
+        # Переводим в 'paid' одним условным UPDATE: проверка статуса и запись
+        # атомарны, параллельная оплата того же заказа не пройдёт дважды.
+        query_update = text("""
+            UPDATE orders SET status = 'paid', updated_at = :updated_at
+            WHERE id = :order_id AND user_id = :user_id AND status = 'created' AND deleted_at IS NULL
+            RETURNING id
+        """)
+        result_update = await db.execute(query_update, {
+            "updated_at": datetime.utcnow(),
+            "order_id": order_id,
+            "user_id": user_id
+        })
+        if result_update.scalar_one_or_none() is None:
+            # Уточняем причину отказа только на неуспешном пути
+            query_order = text("SELECT status FROM orders WHERE id = :order_id AND user_id = :user_id AND deleted_at IS NULL")
+            result_order = await db.execute(query_order, {"order_id": order_id, "user_id": user_id})
+            if result_order.scalar_one_or_none() is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Order is not in 'created' status")
 
-    if not order:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+        await publish_order_event(db, order_id, user_id, "paid")
+        await invalidate(db, orders_listing_cache, user_id)
+        # Коммитит run_idempotent вместе с сохранённым ответом
+        return {"order_id": order_id, "status": "paid"}
 
-    if order.status != "created":
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Order is not in 'created' status")
+    # Повтор с тем же Idempotency-Key получает сохранённый ответ
+    fingerprint = request_fingerprint("POST", "/pay", {"order_id": order_id})
+    return await run_idempotent(db, user_id, idempotency_key, fingerprint, pay)
 
-    # Обновляем статус на 'paid'
-    query_update = text("UPDATE orders SET status = :status, updated_at = :updated_at WHERE id = :order_id")
-    await db.execute(query_update, {
-        "status": "paid",
-        "updated_at": datetime.utcnow(),
-        "order_id": order_id
-    })
-    await db.commit()
 
-    return {"order_id": order_id, "status": "paid"}
+@router.post("/payments/webhook", response_model=PaymentWebhookResponse)
+async def payment_webhook(
+    batch: PaymentWebhookBatch,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Приём пачки уведомлений от платёжного провайдера.
+    Каждое уведомление подписано HMAC (см. app/core/payments.py).
+    Все валидные уведомления применяются одним условным UPDATE,
+    в ответе — результат по каждому уведомлению.
+    """
+    if not settings.PAYMENT_WEBHOOK_SECRET:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Payment webhook is not configured")
+
+    outcomes: dict[str, str] = {}
+    amounts: dict[int, int] = {}
+    for n in batch.notifications:
+        if n.notification_id in outcomes:
+            continue
+        if not verify_notification(settings.PAYMENT_WEBHOOK_SECRET, n.notification_id, n.order_id, n.amount, n.signature):
+            outcomes[n.notification_id] = "invalid_signature"
+        elif n.order_id in amounts:
+            # Провайдер прислал два разных уведомления на один заказ в одной пачке
+            outcomes[n.notification_id] = "duplicate"
+        else:
+            amounts[n.order_id] = n.amount
+            outcomes[n.notification_id] = "pending"
+
+    paid: dict[int, int] = {}
+    if amounts:
+        query_update = text("""
+            UPDATE orders o SET status = 'paid', updated_at = :updated_at
+            FROM unnest(CAST(:order_ids AS integer[]), CAST(:amounts AS integer[])) AS n(order_id, amount)
+            WHERE o.id = n.order_id AND o.total_price = n.amount AND o.status = 'created'
+              AND o.deleted_at IS NULL
+            RETURNING o.id, o.user_id
+        """)
+        result_update = await db.execute(query_update, {
+            "updated_at": datetime.utcnow(),
+            "order_ids": list(amounts.keys()),
+            "amounts": list(amounts.values())
+        })
+        paid = {row.id: row.user_id for row in result_update}
+
+        # Причины отказа выясняем одним запросом и только для неприменённых
+        rejected_ids = [order_id for order_id in amounts if order_id not in paid]
+        current: dict[int, tuple[str, int]] = {}
+        if rejected_ids:
+            # Удалённый заказ для провайдера — not_found
+            query_current = text(
+                "SELECT id, status, total_price FROM orders WHERE id = ANY(:order_ids) AND deleted_at IS NULL"
+            )
+            result_current = await db.execute(query_current, {"order_ids": rejected_ids})
+            current = {row.id: (row.status, row.total_price) for row in result_current}
+
+        await publish_order_events(db, [(order_id, user_id, "paid") for order_id, user_id in paid.items()])
+        if paid:
+            await invalidate(db, orders_listing_cache, *set(paid.values()))
+        await db.commit()
+
+        for n in batch.notifications:
+            if outcomes[n.notification_id] != "pending":
+                continue
+            if n.order_id in paid:
+                outcomes[n.notification_id] = "paid"
+            elif n.order_id not in current:
+                outcomes[n.notification_id] = "not_found"
+            elif current[n.order_id][0] != "created":
+                outcomes[n.notification_id] = "already_paid"
+            else:
+                outcomes[n.notification_id] = "amount_mismatch"
+
+    return PaymentWebhookResponse(results=[
+        PaymentNotificationResult(
+            notification_id=n.notification_id,
+            order_id=n.order_id,
+            outcome=outcomes[n.notification_id]
+        )
+        for n in batch.notifications
+    ])
@@ -1,21 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import text
-from datetime import datetime
 from app.db.session import get_db
+from app.db.repositories.print_job import ORDER_PRINT_FILES, enqueue_print_job
 from app.core.config import settings
 from app.core.security import decode_access_token
-import subprocess
-from pathlib import Path
-import os
+from app.core.storage import storage
+from app.core.lifecycle import lifecycle
+from app.core.idempotency import request_fingerprint, run_idempotent
+from app.core.runner import ToolUnavailable
+from app.tasks.printing import PrintFailed, print_order_locally, start_local_print
 
 router = APIRouter()
 
-PDF_PRINTER_NAME = settings.PRINTER_NAME
-
 @router.post("/print/{order_id}")
 async def send_to_virtual_printer(
     order_id: int,
+    device_id: str | None = Query(None),  # Удалённое устройство с агентом печати; без него — локальный lp
+    idempotency_key: str | None = Header(None),
     token: dict = Depends(decode_access_token),  # Авторизация через токен
     db: AsyncSession = Depends(get_db)
 ):
@@ -32,49 +35,76 @@ async def send_to_virtual_printer(
     if not user_id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    # Проверяем заказ
-    query_order = text("SELECT * FROM orders WHERE id = :order_id AND user_id = :user_id")
-    result_order = await db.execute(query_order, {"order_id": order_id, "user_id": user_id})
-    order = result_order.fetchone()
+    async def print_order():
+        # Проверяем заказ
+        query_order = text("SELECT * FROM orders WHERE id = :order_id AND user_id = :user_id AND deleted_at IS NULL")
+        result_order = await db.execute(query_order, {"order_id": order_id, "user_id": user_id})
+        order = result_order.fetchone()
+
+        if not order:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+
+        if order.status != "paid":
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Order is not in 'paid' status")
+
+        # Получаем временные PDF-файлы заказа (оптимизированные, если есть)
+        result_files = await db.execute(ORDER_PRINT_FILES, {"order_id": order_id})
+        files = result_files.fetchall()
 
-    if not order:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+        if not files:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No files associated with this order")
 
-    if order.status != "paid":
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Order is not in 'paid' status")
+        if device_id is not None:
+            # Печать на удалённом устройстве: задание заберёт агент (см. endpoints/agent.py)
+            query_device = text("SELECT is_active FROM devices WHERE id = :device_id")
+            is_active = (await db.execute(query_device, {"device_id": device_id})).scalar_one_or_none()
+            if is_active is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Device not found")
+            if not is_active:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Device is disabled")
 
-    # Получаем временные PDF-файлы заказа
-    query_files = text("SELECT f.temp_pdf_path FROM order_files of JOIN files f ON of.file_id = f.id WHERE of.order_id = :order_id")
-    result_files = await db.execute(query_files, {"order_id": order_id})
-    files = result_files.fetchall()
+            # Задание и ответ для Idempotency-Key коммитит run_idempotent
+            job_id = await enqueue_print_job(db, order_id, user_id, device_id)
+            return {"order_id": order_id, "status": "printing", "job_id": job_id, "device_id": device_id}
 
-    if not files:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No files associated with this order")
+        if lifecycle.draining:
+            # Воркер останавливается: печать, начатая сейчас, могла бы оборваться
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is restarting, try again",
+                headers={"Retry-After": "1"}
+            )
 
-    # Печать файлов на виртуальный принтер
-    for file in files:
-        temp_pdf_path = file.temp_pdf_path
-        if not temp_pdf_path or not Path(temp_pdf_path).exists():
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Temporary PDF file {temp_pdf_path} does not exist")
+        # Файлы, уже напечатанные прерванной попыткой, повторно не печатаются
+        for file in files:
+            print_path = file.print_path
+            if file.printed_at is None and (not print_path or not await storage.exists(print_path)):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Temporary PDF file {print_path} does not exist")
 
+        # Переход в 'printing' коммитится до печати, отдельно от ответа: после
+        # сбоя повтор с тем же ключом не напечатает заказ второй раз — условный
+        # UPDATE пропустит только заказ в 'paid'
+        if not await start_local_print(db, order_id, user_id):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Order is not in 'paid' status")
+
+        # Печать идёт отдельной задачей: обрыв запроса её не прерывает,
+        # а остановка воркера дожидается её (app/core/lifecycle.py)
         try:
-            # Отправляем PDF-файл на принтер
-            subprocess.run(["lp", "-d", PDF_PRINTER_NAME, temp_pdf_path], check=True)
-            print(f"Файл {temp_pdf_path} отправлен на принтер {PDF_PRINTER_NAME}")
-            
-            # Удаляем временный файл после успешной печати
-            os.remove(temp_pdf_path)
-            print(f"Временный файл {temp_pdf_path} удалён")
-        except subprocess.CalledProcessError as e:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Ошибка печати файла {temp_pdf_path}: {e}")
-
-    # Обновляем статус заказа
-    query_update = text("UPDATE orders SET status = :status, updated_at = :updated_at WHERE id = :order_id")
-    await db.execute(query_update, {
-        "status": "closed",
-        "updated_at": datetime.utcnow(),
-        "order_id": order_id
-    })
-    await db.commit()
-
-    return {"order_id": order_id, "status": "closed", "message": "Files sent to virtual printer and temporary files deleted"}
+            await asyncio.shield(lifecycle.spawn(print_order_locally(order_id, user_id)))
+        except ToolUnavailable as e:
+            # Очередь печати недавно зависала; статус 'paid', можно повторить позже
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=str(e),
+                headers={"Retry-After": str(settings.TOOL_BREAKER_COOLDOWN_SECONDS)}
+            )
+        except PrintFailed as e:
+            # Статус в БД снова 'paid', печать можно повторить;
+            # клиенту сообщаем о сбое через поток событий.
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+        return {"order_id": order_id, "status": "closed", "message": "Files sent to virtual printer and temporary files deleted"}
+
+    # Повтор с тем же Idempotency-Key получает сохранённый ответ
+    fingerprint = request_fingerprint("POST", "/print", {"order_id": order_id, "device_id": device_id})
+    return await run_idempotent(db, user_id, idempotency_key, fingerprint, print_order)
@@ -0,0 +1,142 @@
+import json
+import math
+import re
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs
+from jose import jwt, JWTError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import text
+from app.core.config import settings
+from app.core.lifecycle import lifecycle
+from app.db.models.upload_bucket import UploadBucket  # noqa: F401  (регистрирует таблицу)
+from app.db.session import async_session
+from app.tasks.conversion import queued_conversions
+
+# Эндпоинты, ставящие конвертацию LibreOffice в очередь: токен-бакет + проверка очереди
+CONVERSION_ROUTES = [
+    ("POST", re.compile(rf"^{re.escape(settings.API_V1_STR)}/files/upload$")),
+    ("POST", re.compile(rf"^{re.escape(settings.API_V1_STR)}/files/uploads/[^/]+/finalize$")),
+]
+# Эндпоинты, которые только расходуют токен пользователя
+RATE_LIMITED_ROUTES = [
+    ("POST", re.compile(rf"^{re.escape(settings.API_V1_STR)}/files/uploads$")),
+]
+
+
+
+class TokenBucket:
+    """
+    Токен-бакет на пользователя: capacity токенов, пополнение rate токенов в секунду.
+    Состояние в таблице upload_buckets, поэтому лимит общий для всех воркеров.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+
+    async def take(self, db: AsyncSession, key: str) -> float:
+        """Списывает токен. Возвращает 0 при успехе или секунды до появления токена."""
+        now = datetime.utcnow()
+        # Upsert блокирует строку бакета до коммита: параллельные запросы
+        # пользователя из любых воркеров списывают токены по очереди
+        result = await db.execute(text("""
+            INSERT INTO upload_buckets AS b (user_key, tokens, updated_at)
+            VALUES (:key, :capacity, :now)
+            ON CONFLICT (user_key) DO UPDATE SET user_key = b.user_key
+            RETURNING tokens, updated_at
+        """), {"key": key, "capacity": self.capacity, "now": now})
+        row = result.one()
+        # Часы воркеров на разных хостах могут немного расходиться
+        elapsed = max(0.0, (now - row.updated_at).total_seconds())
+        tokens = min(self.capacity, row.tokens + elapsed * self.rate)
+        taken = tokens >= 1
+        if taken:
+            tokens -= 1
+        await db.execute(
+            text("UPDATE upload_buckets SET tokens = :tokens, updated_at = :now WHERE user_key = :key"),
+            {"key": key, "tokens": tokens, "now": max(now, row.updated_at)}
+        )
+        await db.commit()
+        return 0 if taken else (1 - tokens) / self.rate
+
+
+async def cleanup_upload_buckets(db: AsyncSession) -> None:
+    """Удаляет полностью восстановившиеся бакеты: хранить их незачем."""
+    refill_seconds = settings.UPLOAD_BURST / (settings.UPLOAD_RATE_PER_MINUTE / 60)
+    await db.execute(
+        text("DELETE FROM upload_buckets WHERE updated_at < :full_since"),
+        {"full_since": datetime.utcnow() - timedelta(seconds=refill_seconds)}
+    )
+    await db.commit()
+
+
+class AdmissionMiddleware:
+    """
+    Контроль допуска для загрузки и конвертации. Работает до чтения тела
+    запроса: пользователь определяется по JWT из query-параметра token
+    (как в decode_access_token), без обращения к БД.
+
+    - per-user токен-бакет в БД, общий для воркеров: при превышении — 429 с Retry-After;
+    - общий предел файлов в очереди конвертации (app/tasks/conversion.py):
+      при переполнении — сразу 503 с Retry-After, файл даже не принимается;
+    - воркер останавливается (app/core/lifecycle.py) — тоже 503, клиент повторит в другом.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.buckets = TokenBucket(settings.UPLOAD_RATE_PER_MINUTE / 60, settings.UPLOAD_BURST)
+        self.max_queued = settings.MAX_QUEUED_CONVERSIONS
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method, path = scope["method"], scope["path"]
+        converts = any(method == m and pattern.match(path) for m, pattern in CONVERSION_ROUTES)
+        limited = converts or any(method == m and pattern.match(path) for m, pattern in RATE_LIMITED_ROUTES)
+        if not limited:
+            return await self.app(scope, receive, send)
+
+        if converts and lifecycle.draining:
+            return await self._reject(send, 503, "Server is restarting, try again", 1)
+
+        user_key = self._user_key(scope)
+        async with async_session() as db:
+            if user_key is not None:
+                retry_after = await self.buckets.take(db, user_key)
+                if retry_after:
+                    return await self._reject(send, 429, "Too many uploads, slow down", retry_after)
+            if converts:
+                queued = await queued_conversions(db)
+                await db.commit()
+                if queued >= self.max_queued:
+                    return await self._reject(send, 503, "Conversion capacity exhausted, try again later", 5)
+
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def _user_key(scope) -> str | None:
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        token = query.get("token", [None])[0]
+        if not token:
+            return None
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except JWTError:
+            # Невалидный токен отклонит сам эндпоинт
+            return None
+        return payload.get("sub")
+
+    @staticmethod
+    async def _reject(send, status_code: int, detail: str, retry_after: float) -> None:
+        body = json.dumps({"detail": detail}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,117 @@
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO
+
+CHUNK_SIZE = 1024 * 1024
+# Во сколько раз запись может быть больше своего сжатого размера. Документы
+# сжимаются в разы, а не в сотни раз; больше — почти наверняка zip-бомба.
+MAX_COMPRESSION_RATIO = 100
+
+
+class ArchiveError(Exception):
+    """Архив отклонён целиком (битый, слишком большой, слишком много записей)."""
+
+
+class _EntryRejected(Exception):
+    pass
+
+
+def copy_limited(src: BinaryIO, target: Path, max_size: int) -> int:
+    """Копирует поток в файл чанками, не больше max_size байт."""
+    written = 0
+    with open(target, "wb") as dst:
+        while chunk := src.read(CHUNK_SIZE):
+            written += len(chunk)
+            if written > max_size:
+                raise ArchiveError(f"Archive is larger than {max_size // (1024 * 1024)} MB")
+            dst.write(chunk)
+    return written
+
+
+def _entry_name(info: zipfile.ZipInfo) -> str | None:
+    """Имя файла без каталогов; None для служебных записей (__MACOSX, скрытые файлы)."""
+    path = PurePosixPath(info.filename.replace("\\", "/"))
+    if "__MACOSX" in path.parts or path.name.startswith("."):
+        return None
+    return path.name or None
+
+
+def _check_entry(info: zipfile.ZipInfo, name: str, allowed_extensions: set[str], max_entry_size: int) -> str:
+    ext = PurePosixPath(name).suffix.lower()
+    if ext not in allowed_extensions:
+        raise _EntryRejected("Unsupported file format")
+    if info.flag_bits & 0x1:
+        raise _EntryRejected("Encrypted entries are not supported")
+    # Заголовок может врать; настоящие размеры всё равно ограничиваются при распаковке
+    if info.file_size > max_entry_size:
+        raise _EntryRejected("File too large")
+    if info.file_size > MAX_COMPRESSION_RATIO * max(info.compress_size, 1):
+        raise _EntryRejected("Suspicious compression ratio")
+    return ext
+
+
+def _extract_entry(zf: zipfile.ZipFile, info: zipfile.ZipInfo, target: Path, limit: int, budget: int) -> int:
+    written = 0
+    try:
+        with zf.open(info) as src, open(target, "wb") as dst:
+            while chunk := src.read(CHUNK_SIZE):
+                written += len(chunk)
+                if written > limit:
+                    raise _EntryRejected("File too large")
+                if written > budget:
+                    raise _EntryRejected("Storage limit exceeded")
+                dst.write(chunk)
+    except (zipfile.BadZipFile, EOFError, NotImplementedError) as e:
+        # Битый CRC, обрезанная запись или неподдерживаемый метод сжатия
+        target.unlink(missing_ok=True)
+        raise _EntryRejected(f"Corrupted entry: {e}")
+    except _EntryRejected:
+        target.unlink(missing_ok=True)
+        raise
+    return written
+
+
+def extract_documents(
+    archive_path: Path,
+    workdir: Path,
+    allowed_extensions: set[str],
+    max_entry_size: int,
+    max_total_size: int,
+    max_entries: int,
+) -> tuple[list[tuple[str, Path]], list[tuple[str, str]]]:
+    """
+    Распаковывает из zip документы с разрешёнными расширениями, по одной
+    записи и чанками: ни архив, ни запись целиком в память не читаются.
+    Защита от zip-бомб: число записей, размер и степень сжатия каждой записи
+    и суммарный распакованный объём (max_total_size) проверяются по заголовкам
+    и ещё раз по фактически прочитанным байтам.
+
+    Возвращает ([(имя, путь)], [(имя, причина пропуска)]). Синхронная —
+    вызывать через run_in_threadpool.
+    """
+    try:
+        zf = zipfile.ZipFile(archive_path)
+    except zipfile.BadZipFile:
+        raise ArchiveError("Invalid zip archive")
+
+    extracted: list[tuple[str, Path]] = []
+    skipped: list[tuple[str, str]] = []
+    with zf:
+        entries = [info for info in zf.infolist() if not info.is_dir()]
+        if len(entries) > max_entries:
+            raise ArchiveError(f"Archive has more than {max_entries} files")
+
+        total = 0
+        for index, info in enumerate(entries):
+            name = _entry_name(info)
+            if name is None:
+                continue
+            try:
+                ext = _check_entry(info, name, allowed_extensions, max_entry_size)
+                target = workdir / f"{index}{ext}"
+                total += _extract_entry(zf, info, target, max_entry_size, max_total_size - total)
+            except _EntryRejected as e:
+                skipped.append((name, str(e)))
+                continue
+            extracted.append((name, target))
+    return extracted, skipped
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+from typing import Callable
+import asyncpg
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import text
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки, которой воркер становится ведущим для периодических задач
+LEADER_LOCK_ID = 0x7072696E  # "prin"
+RECONNECT_DELAY_SECONDS = 1
+MAX_RECONNECT_DELAY_SECONDS = 30
+
+
+def asyncpg_dsn(database_url: str) -> str:
+    """postgresql+asyncpg://... -> postgresql://... (asyncpg не понимает диалект SQLAlchemy)."""
+    return database_url.replace("+asyncpg", "", 1)
+
+
+class CoordinationBus:
+    """
+    Координация между воркерами uvicorn через Postgres LISTEN/NOTIFY.
+
+    Каждый воркер держит одно выделенное asyncpg-соединение, которое
+    слушает все зарегистрированные каналы и заодно удерживает advisory-lock
+    ведущего воркера. Публикация идёт через pg_notify в транзакции
+    вызывающего кода, поэтому подписчики видят только закоммиченные изменения.
+    """
+
+    def __init__(self):
+        self._handlers: dict[str, list[Callable[[dict], None]]] = {}
+        self._reset_hooks: list[Callable[[], None]] = []
+        self._connection: asyncpg.Connection | None = None
+        self._reconnect_task: asyncio.Task | None = None
+        self._stopping = False
+        self.is_leader = False
+
+    @property
+    def connected(self) -> bool:
+        return self._connection is not None
+
+    def subscribe(self, channel: str, handler: Callable[[dict], None]) -> None:
+        """Регистрирует обработчик канала. Вызывать до start() (на импорте модуля)."""
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def on_reset(self, hook: Callable[[], None]) -> None:
+        """
+        Хук на потерю соединения: пока слушателя нет, уведомления теряются,
+        поэтому кэши должны сбросить всё целиком.
+        """
+        self._reset_hooks.append(hook)
+
+    async def start(self) -> None:
+        self._stopping = False
+        await self._connect()
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+        self.is_leader = False
+
+    async def _connect(self) -> None:
+        self._connection = await asyncpg.connect(asyncpg_dsn(settings.DATABASE_URL))
+        self._connection.add_termination_listener(self._on_terminated)
+        for channel in self._handlers:
+            await self._connection.add_listener(channel, self._dispatch)
+        logger.info("Coordination bus listening on %s", ", ".join(self._handlers) or "no channels")
+
+    def _on_terminated(self, connection) -> None:
+        self._connection = None
+        self.is_leader = False  # advisory-lock умер вместе с сессией
+        for hook in self._reset_hooks:
+            hook()
+        if not self._stopping and self._reconnect_task is None:
+            logger.warning("Coordination bus connection lost, reconnecting")
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        delay = RECONNECT_DELAY_SECONDS
+        try:
+            while not self._stopping:
+                try:
+                    await self._connect()
+                    for hook in self._reset_hooks:
+                        hook()
+                    return
+                except (OSError, asyncpg.PostgresError) as e:
+                    logger.warning("Coordination bus reconnect failed: %s", e)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, MAX_RECONNECT_DELAY_SECONDS)
+        finally:
+            self._reconnect_task = None
+
+    def _dispatch(self, connection, pid, channel, payload) -> None:
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning("Malformed %s payload: %s", channel, payload)
+            return
+        for handler in self._handlers.get(channel, ()):
+            try:
+                handler(message)
+            except Exception:
+                logger.exception("Handler for %s failed", channel)
+
+    async def publish(self, db: AsyncSession, channel: str, message: dict) -> None:
+        """Ставит уведомление в транзакцию db; уйдёт подписчикам после COMMIT."""
+        await db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": channel, "payload": json.dumps(message)},
+        )
+
+    async def publish_many(self, db: AsyncSession, channel: str, messages: list[dict]) -> None:
+        """То же, что publish, но одним запросом на список сообщений."""
+        if not messages:
+            return
+        await db.execute(
+            text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+            {"channel": channel, "payloads": [json.dumps(m) for m in messages]},
+        )
+
+    async def try_lead(self) -> bool:
+        """
+        Пытается стать ведущим воркером (pg_try_advisory_lock на соединении шины).
+        Периодические задачи выполняются только в ведущем; если он упал,
+        блокировка освобождается и её забирает следующий воркер.
+        """
+        if self.is_leader:
+            return True
+        if self._connection is None:
+            return False
+        self.is_leader = await self._connection.fetchval("SELECT pg_try_advisory_lock($1)", LEADER_LOCK_ID)
+        if self.is_leader:
+            logger.info("This worker is now the leader for periodic jobs")
+        return self.is_leader
+
+
+bus = CoordinationBus()
@@ -0,0 +1,145 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import text
+from app.core.bus import bus
+from app.db.models.listing_version import ListingVersion  # noqa: F401  (регистрирует таблицу)
+
+CACHE_CHANNEL = "cache_invalidation"
+
+
+class LocalCache:
+    """
+    Небольшой in-process LRU-кэш с TTL. Согласованность между воркерами
+    обеспечивает шина: invalidate() рассылает ключ всем воркерам.
+    Пока шина не подключена, кэш не используется — иначе можно пропустить
+    инвалидацию и отдавать устаревшие данные.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60, versioned: bool = False):
+        self.name = name
+        # versioned: ключи — id пользователей, invalidate() увеличивает
+        # listing_versions.version, по которой эндпоинт строит ETag
+        self.versioned = versioned
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        # Поколения сбросов: set() с поколением, снятым до запроса к БД, не
+        # кладёт в кэш данные, если ключ успели сбросить за время запроса.
+        # Хранятся последние maxsize сбросов; для забытых ключей берётся
+        # самое свежее вытесненное поколение — это только лишний промах кэша.
+        self._generation = 0
+        self._evicted: OrderedDict[Hashable, int] = OrderedDict()
+        self._forgotten = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        if not bus.connected:
+            return None
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def generation(self) -> int:
+        """Снимок поколения; брать до чтения данных, которые пойдут в set()."""
+        return self._generation
+
+    def set(self, key: Hashable, value: Any, generation: int | None = None) -> None:
+        if not bus.connected:
+            return
+        if generation is not None and self._evicted.get(key, self._forgotten) > generation:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def evict(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+        self._generation += 1
+        self._evicted[key] = self._generation
+        self._evicted.move_to_end(key)
+        while len(self._evicted) > self.maxsize:
+            _, self._forgotten = self._evicted.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._generation += 1
+        self._evicted.clear()
+        self._forgotten = self._generation
+
+
+_caches: dict[str, LocalCache] = {}
+_listeners: list[Callable[[str, list], None]] = []
+
+
+def register_cache(cache: LocalCache) -> LocalCache:
+    _caches[cache.name] = cache
+    return cache
+
+
+def add_invalidation_listener(listener: Callable[[str, list], None]) -> None:
+    """
+    Подписка на факт инвалидации (имя кэша, ключи): вызывается сразу в воркере,
+    где шла запись, и после COMMIT — во всех остальных.
+    """
+    _listeners.append(listener)
+
+
+def _on_invalidation(message: dict) -> None:
+    cache = _caches.get(message.get("cache"))
+    if cache is None:
+        return
+    for key in message.get("keys", ()):
+        cache.evict(key)
+    for listener in _listeners:
+        listener(cache.name, message.get("keys", []))
+
+
+def _on_reset() -> None:
+    for cache in _caches.values():
+        cache.clear()
+
+
+bus.subscribe(CACHE_CHANNEL, _on_invalidation)
+bus.on_reset(_on_reset)
+
+
+async def invalidate(db: AsyncSession, cache: LocalCache, *keys: Hashable) -> None:
+    """
+    Сбрасывает ключи в этом воркере сразу, а в остальных (и повторно в этом) —
+    после COMMIT транзакции db. Повторный сброс после коммита нужен на случай,
+    если параллельный запрос успел закэшировать данные до коммита.
+    """
+    for key in keys:
+        cache.evict(key)
+    for listener in _listeners:
+        listener(cache.name, list(keys))
+    if cache.versioned and keys:
+        # В той же транзакции, что и сама мутация: версия и данные меняются атомарно
+        await db.execute(text("""
+            INSERT INTO listing_versions (user_id, listing, version)
+            SELECT user_id, :listing, 1 FROM unnest(CAST(:user_ids AS integer[])) AS user_id
+            ON CONFLICT (user_id, listing) DO UPDATE SET version = listing_versions.version + 1
+        """), {"listing": cache.name, "user_ids": sorted(set(keys))})
+    await bus.publish(db, CACHE_CHANNEL, {"cache": cache.name, "keys": list(keys)})
+
+
+async def listing_version(db: AsyncSession, cache: LocalCache, user_id: int) -> int:
+    """Текущая версия списка пользователя (0, если список ещё не менялся)."""
+    result = await db.execute(
+        text("SELECT version FROM listing_versions WHERE user_id = :user_id AND listing = :listing"),
+        {"user_id": user_id, "listing": cache.name}
+    )
+    return result.scalar_one_or_none() or 0
+
+
+# Кэши списков, инвалидируемые мутациями в file.py, order.py, payment.py и print.py
+files_listing_cache = register_cache(LocalCache("files_listing", maxsize=4096, ttl=300, versioned=True))
+orders_listing_cache = register_cache(LocalCache("orders_listing", maxsize=4096, ttl=300, versioned=True))
@@ -0,0 +1,95 @@
+import logging
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.storage import CHUNK_SIZE, storage
+
+logger = logging.getLogger(__name__)
+
+# Ключ сжатого оригинала: <ключ оригинала>.zst
+COMPRESSED_SUFFIX = ".zst"
+# Значения files.compression
+COMPRESSION_ZSTD = "zstd"
+COMPRESSION_SKIPPED = "none"  # Пробовали, но выигрыш меньше ORIGINALS_COMPRESSION_MIN_SAVING
+
+
+def _zstd():
+    """zstandard — необязательная зависимость, нужна только при ORIGINALS_COMPRESSION=zstd."""
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("ORIGINALS_COMPRESSION=zstd requires zstandard to be installed") from e
+    return zstandard
+
+
+def is_compressed(key: str) -> bool:
+    return key.endswith(COMPRESSED_SUFFIX)
+
+
+def _compress_file(src: str, dst: str) -> None:
+    compressor = _zstd().ZstdCompressor(level=settings.ORIGINALS_COMPRESSION_LEVEL)
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        compressor.copy_stream(fin, fout, read_size=CHUNK_SIZE, write_size=CHUNK_SIZE)
+
+
+def _decompress_file(src: str, dst: str) -> None:
+    decompressor = _zstd().ZstdDecompressor()
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        decompressor.copy_stream(fin, fout, read_size=CHUNK_SIZE, write_size=CHUNK_SIZE)
+
+
+async def compress_original(key: str, size: int) -> tuple[str, int] | None:
+    """
+    Сжимает оригинал в хранилище. Возвращает (новый ключ, размер в хранилище)
+    или None, если выигрыш меньше ORIGINALS_COMPRESSION_MIN_SAVING — тогда
+    оригинал остаётся как есть (docx и pdf уже сжаты внутри и часто не ужимаются).
+    Исходный объект удаляет вызывающий код после того, как запишет новый ключ в БД.
+    """
+    fd, compressed_path = tempfile.mkstemp(suffix=COMPRESSED_SUFFIX)
+    os.close(fd)
+    try:
+        async with storage.local_copy(key) as local_path:
+            await run_in_threadpool(_compress_file, local_path, compressed_path)
+        stored_size = os.path.getsize(compressed_path)
+        if size - stored_size < size * settings.ORIGINALS_COMPRESSION_MIN_SAVING:
+            return None
+        new_key = key + COMPRESSED_SUFFIX
+        # save_file перемещает временный файл в хранилище
+        await storage.save_file(new_key, compressed_path)
+        return new_key, stored_size
+    finally:
+        Path(compressed_path).unlink(missing_ok=True)
+
+
+async def open_original_stream(key: str) -> AsyncIterator[bytes]:
+    """Потоковое чтение оригинала; сжатый распаковывается на лету, чанк за чанком."""
+    if not is_compressed(key):
+        async for chunk in storage.open_stream(key):
+            yield chunk
+        return
+
+    decompressor = _zstd().ZstdDecompressor().decompressobj()
+    async for chunk in storage.open_stream(key):
+        data = await run_in_threadpool(decompressor.decompress, chunk)
+        if data:
+            yield data
+
+
+@asynccontextmanager
+async def local_original(key: str):
+    """Как storage.local_copy, но сжатый оригинал отдаётся распакованным (для lp и т.п.)."""
+    async with storage.local_copy(key) as local_path:
+        if not is_compressed(key):
+            yield local_path
+            return
+        fd, path = tempfile.mkstemp(suffix=Path(key[:-len(COMPRESSED_SUFFIX)]).suffix)
+        os.close(fd)
+        try:
+            await run_in_threadpool(_decompress_file, local_path, path)
+            yield path
+        finally:
+            os.remove(path)
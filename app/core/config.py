@@ -4,12 +4,62 @@ class Settings(BaseSettings):
     PROJECT_NAME: str
     API_V1_STR: str
     DATABASE_URL: str
+    DATABASE_REPLICA_URL: str = ""  # Реплика для чтения списков и карточек; пусто — всё идёт в DATABASE_URL
+    READ_YOUR_WRITES_SECONDS: float = 5  # Сколько после записи пользователя его чтения идут в primary
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
     PRICE_PER_PAGE: int
     PRINTER_NAME: str
     TELEGRAM_API_TOKEN: str
+    TELEGRAM_WEBHOOK_URL: str = ""  # Публичный адрес webhook; пусто — бот работает через polling
+    TELEGRAM_WEBHOOK_SECRET: str = ""  # X-Telegram-Bot-Api-Secret-Token, обязателен для webhook
+    TELEGRAM_WEBHOOK_IN_API: bool = False  # Обслуживать webhook внутри API ({API_V1_STR}/telegram/webhook)
+    TELEGRAM_WEBHOOK_MAX_CONNECTIONS: int = 40  # Параллельных доставок от Telegram (до 100)
+    TELEGRAM_API_SERVER: str = ""  # Свой Bot API server или заглушка для нагрузочного теста
+    UPLOAD_SESSION_TTL_HOURS: int = 24  # Время жизни незавершённой докачки
+    PDF_OPTIMIZER: str = ""  # "", "qpdf" или "ghostscript" — оптимизация PDF перед печатью
+    PDF_OPTIMIZE_DPI: int = 300  # Разрешение, до которого даунсэмплятся картинки
+    STORAGE_BACKEND: str = "local"  # "local" или "s3"
+    STORAGE_LOCAL_ROOT: str = "./uploads"
+    STORAGE_S3_BUCKET: str = "printo"
+    STORAGE_S3_ENDPOINT_URL: str = ""  # Например, http://minio:9000 для локального стенда
+    STORAGE_S3_ACCESS_KEY: str = ""
+    STORAGE_S3_SECRET_KEY: str = ""
+    STORAGE_S3_REGION: str = ""
+    IDEMPOTENCY_TTL_HOURS: int = 24  # Сколько хранить ответ для повторов по Idempotency-Key
+    IDEMPOTENCY_MAX_ROWS: int = 100000  # Верхняя граница размера таблицы idempotency_keys
+    IDEMPOTENCY_WAIT_SECONDS: int = 60  # Сколько дубликат ждёт завершения исходного запроса
+    PAYMENT_WEBHOOK_SECRET: str = ""  # Общий секрет с платёжным провайдером; пусто — вебхук выключен
+    UPLOAD_RATE_PER_MINUTE: float = 10  # Скорость пополнения токен-бакета загрузок на пользователя (общий для всех воркеров)
+    UPLOAD_BURST: int = 5  # Сколько загрузок подряд можно сделать без ожидания
+    MAX_INFLIGHT_CONVERSIONS: int = 2  # Одновременных фоновых конвертаций LibreOffice на воркер
+    MAX_QUEUED_CONVERSIONS: int = 50  # Файлов в очереди конвертации на все воркеры; сверх этого загрузки получают 503
+    FILE_PROCESSING_STALE_MINUTES: int = 30  # Через сколько зависшая конвертация перезапускается
+    AGENT_LONG_POLL_SECONDS: int = 25  # Сколько агент печати ждёт задание в одном запросе
+    PRINT_JOB_LEASE_SECONDS: int = 300  # Время на печать и ack, потом задание выдаётся снова
+    PRINT_JOB_MAX_ATTEMPTS: int = 3  # Попыток выдачи задания до статуса failed
+    DELETED_RETENTION_HOURS: int = 72  # Сколько удалённые файлы и заказы ждут физического удаления
+    RECLAIM_BATCH_SIZE: int = 500  # Строк за одну транзакцию reclaim_deleted
+    ORIGINALS_COMPRESSION: str = ""  # "" или "zstd" — сжатие оригиналов после конвертации (нужен zstandard)
+    ORIGINALS_COMPRESSION_LEVEL: int = 10  # Уровень zstd
+    ORIGINALS_COMPRESSION_MIN_SAVING: float = 0.05  # Меньший выигрыш не стоит распаковки при скачивании
+    SUPERSEDED_GRACE_MINUTES: int = 60  # Сколько несжатый оригинал живёт после сжатия (дочитывают скачивания и печать)
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # "json" или "text"
+    LOG_FILE: str = ""  # Дополнительно писать лог в файл (поток вывода отдельный, event loop не блокируется)
+    LOG_QUEUE_SIZE: int = 10000  # При переполнении записи отбрасываются, а не тормозят запросы
+    LOG_SAMPLING: str = ""  # Доля записей шумных логгеров ниже WARNING, например "sqlalchemy.engine=0.01,app.access=0.1"
+    SQL_ECHO: bool = False  # Лог SQL-запросов (логгер sqlalchemy.engine)
+    SHUTDOWN_DRAIN_SECONDS: float = 25  # Сколько остановка воркера ждёт конвертации и печать (меньше grace period оркестратора)
+    PROFILE_DIR: str = "./profiles"  # Куда сохраняются профили запросов с X-Debug-Profile
+    TOOL_TIMEOUT_LIBREOFFICE: float = 120  # Таймауты внешних утилит, секунды
+    TOOL_TIMEOUT_PDFINFO: float = 15
+    TOOL_TIMEOUT_LP: float = 30
+    TOOL_TIMEOUT_PDF_OPTIMIZE: float = 120
+    TOOL_TIMEOUT_DEFAULT: float = 60
+    TOOL_BREAKER_THRESHOLD: int = 3  # Таймаутов подряд до размыкания circuit breaker
+    TOOL_BREAKER_COOLDOWN_SECONDS: int = 60  # Сколько breaker остаётся разомкнутым
 
     class Config:
         from_attributes = True
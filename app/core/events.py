@@ -0,0 +1,120 @@
+import asyncio
+import logging
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.bus import bus
+
+logger = logging.getLogger(__name__)
+
+ORDER_EVENTS_CHANNEL = "order_events"
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+async def publish_order_event(db: AsyncSession, order_id: int, user_id: int, status: str, **extra) -> None:
+    """
+    Ставит уведомление о смене статуса заказа в текущую транзакцию.
+    Postgres доставит его слушателям только после COMMIT, так что клиенты
+    не увидят статус, который потом откатился.
+    """
+    await bus.publish(db, ORDER_EVENTS_CHANNEL, {
+        "order_id": order_id,
+        "user_id": user_id,
+        "status": status,
+        "at": datetime.utcnow().isoformat(),
+        **extra,
+    })
+
+
+async def publish_order_events(db: AsyncSession, events: list[tuple[int, int, str]]) -> None:
+    """Пакетный вариант publish_order_event: один запрос на список (order_id, user_id, status)."""
+    at = datetime.utcnow().isoformat()
+    await bus.publish_many(db, ORDER_EVENTS_CHANNEL, [
+        {"order_id": order_id, "user_id": user_id, "status": status, "at": at}
+        for order_id, user_id, status in events
+    ])
+
+
+class OrderEventHub:
+    """
+    Раздаёт события заказов SSE-подписчикам текущего воркера.
+    События приходят через шину (app/core/bus.py), поэтому событие,
+    опубликованное в любом воркере, доходит до всех подписчиков.
+    """
+
+    def __init__(self):
+        self._subscribers: dict[int, set[asyncio.Queue]] = {}
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    def dispatch(self, event: dict) -> None:
+        for queue in self._subscribers.get(event.get("user_id"), ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Медленный клиент: пропускаем событие, он увидит итоговый статус
+                # при переподключении (начальный снимок).
+                logger.warning("Dropping order event for slow subscriber of user %s", event.get("user_id"))
+
+
+order_events = OrderEventHub()
+bus.subscribe(ORDER_EVENTS_CHANNEL, order_events.dispatch)
+
+
+PRINT_JOBS_CHANNEL = "print_jobs"
+
+
+async def publish_print_job(db: AsyncSession, device_id: str) -> None:
+    """Будит агентов устройства, ждущих задание в long-poll (после COMMIT)."""
+    await bus.publish(db, PRINT_JOBS_CHANNEL, {"device_id": device_id})
+
+
+class PrintJobSignals:
+    """
+    Пробуждение long-poll запросов агентов печати в текущем воркере.
+    Само задание агент забирает из БД; сигнал лишь сообщает, что пора проверить.
+    """
+
+    def __init__(self):
+        self._waiters: dict[str, set[asyncio.Event]] = {}
+
+    async def wait(self, device_id: str, timeout: float) -> bool:
+        """Ждёт сигнала для устройства не дольше timeout. True — сигнал пришёл."""
+        event = asyncio.Event()
+        self._waiters.setdefault(device_id, set()).add(event)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            waiters = self._waiters.get(device_id)
+            if waiters is not None:
+                waiters.discard(event)
+                if not waiters:
+                    del self._waiters[device_id]
+
+    def dispatch(self, message: dict) -> None:
+        for event in self._waiters.get(message.get("device_id"), ()):
+            event.set()
+
+    def wake_all(self) -> None:
+        # Пока шины не было, сигналы могли потеряться: пусть все перепроверят очередь
+        for waiters in self._waiters.values():
+            for event in waiters:
+                event.set()
+
+
+print_job_signals = PrintJobSignals()
+bus.subscribe(PRINT_JOBS_CHANNEL, print_job_signals.dispatch)
+bus.on_reset(print_job_signals.wake_all)
@@ -0,0 +1,60 @@
+import json
+from datetime import datetime
+from typing import Any
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from sqlalchemy.sql import text
+from app.db.models.bot_state import BotState  # noqa: F401  (регистрирует таблицу)
+from app.db.session import async_session
+
+
+def _storage_key(key: StorageKey) -> str:
+    parts = (
+        key.bot_id, key.chat_id, key.user_id, key.thread_id,
+        getattr(key, "business_connection_id", None), key.destiny,
+    )
+    return ":".join("" if part is None else str(part) for part in parts)
+
+
+class PostgresStorage(BaseStorage):
+    """
+    Хранилище FSM aiogram в таблице bot_fsm_states. В отличие от MemoryStorage
+    состояние видят все процессы бота за webhook и оно не теряется при перезапуске.
+    Каждая операция — одна короткая транзакция из общего пула приложения.
+    """
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        async with async_session() as db:
+            await db.execute(text("""
+                INSERT INTO bot_fsm_states (key, state, updated_at) VALUES (:key, :state, :now)
+                ON CONFLICT (key) DO UPDATE SET state = EXCLUDED.state, updated_at = EXCLUDED.updated_at
+            """), {"key": _storage_key(key), "state": value, "now": datetime.utcnow()})
+            await db.commit()
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        async with async_session() as db:
+            result = await db.execute(
+                text("SELECT state FROM bot_fsm_states WHERE key = :key"), {"key": _storage_key(key)}
+            )
+            return result.scalar_one_or_none()
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        async with async_session() as db:
+            await db.execute(text("""
+                INSERT INTO bot_fsm_states (key, data, updated_at) VALUES (:key, :data, :now)
+                ON CONFLICT (key) DO UPDATE SET data = EXCLUDED.data, updated_at = EXCLUDED.updated_at
+            """), {"key": _storage_key(key), "data": json.dumps(data, ensure_ascii=False), "now": datetime.utcnow()})
+            await db.commit()
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        async with async_session() as db:
+            result = await db.execute(
+                text("SELECT data FROM bot_fsm_states WHERE key = :key"), {"key": _storage_key(key)}
+            )
+            data = result.scalar_one_or_none()
+        return json.loads(data) if data else {}
+
+    async def close(self) -> None:
+        # Пул соединений общий с приложением, закрывать нечего
+        pass
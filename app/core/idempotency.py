@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import text
+from app.core.config import settings
+from app.db.models.idempotency_key import IdempotencyKey  # noqa: F401  (регистрирует таблицу)
+from app.db.session import async_session
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL_SECONDS = 0.2
+MAX_POLL_INTERVAL_SECONDS = 2
+STALE_LOCK_MINUTES = 10  # in_progress старше этого считается брошенным (воркер упал)
+
+
+def request_fingerprint(method: str, path: str, params: Any) -> str:
+    """Хэш запроса: один и тот же ключ нельзя переиспользовать с другими параметрами."""
+    raw = json.dumps([method, path, jsonable_encoder(params)], sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def _claim(db: AsyncSession, user_id: int, key: str, request_hash: str) -> bool:
+    now = datetime.utcnow()
+    # Просроченная запись или брошенный упавшим воркером захват ключ не занимают
+    await db.execute(
+        text("""
+            DELETE FROM idempotency_keys
+            WHERE user_id = :user_id AND key = :key
+              AND (expires_at < :now OR (status = 'in_progress' AND created_at < :stale_before))
+        """),
+        {
+            "user_id": user_id,
+            "key": key,
+            "now": now,
+            "stale_before": now - timedelta(minutes=STALE_LOCK_MINUTES),
+        },
+    )
+    result = await db.execute(
+        text("""
+            INSERT INTO idempotency_keys (user_id, key, request_hash, status, created_at, expires_at)
+            VALUES (:user_id, :key, :request_hash, 'in_progress', :now, :expires_at)
+            ON CONFLICT (user_id, key) DO NOTHING
+            RETURNING id
+        """),
+        {
+            "user_id": user_id,
+            "key": key,
+            "request_hash": request_hash,
+            "now": now,
+            "expires_at": now + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS),
+        },
+    )
+    claimed = result.scalar_one_or_none() is not None
+    await db.commit()
+    return claimed
+
+
+async def _wait_for_result(db: AsyncSession, user_id: int, key: str, request_hash: str) -> JSONResponse | None:
+    """
+    Ждёт, пока параллельный запрос с тем же ключом (в любом воркере) завершится.
+    Возвращает сохранённый ответ или None, если исходный запрос упал
+    и ключ освободился — тогда обработчик выполняется заново.
+    """
+    deadline = asyncio.get_running_loop().time() + settings.IDEMPOTENCY_WAIT_SECONDS
+    interval = POLL_INTERVAL_SECONDS
+    while True:
+        result = await db.execute(
+            text("""
+                SELECT request_hash, status, response_code, response_body
+                FROM idempotency_keys WHERE user_id = :user_id AND key = :key
+            """),
+            {"user_id": user_id, "key": key},
+        )
+        row = result.fetchone()
+        await db.commit()
+
+        if row is None:
+            return None
+        if row.request_hash != request_hash:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used with different request parameters",
+            )
+        if row.status == "done":
+            return JSONResponse(
+                status_code=row.response_code,
+                content=json.loads(row.response_body),
+                headers={"Idempotent-Replayed": "true"},
+            )
+        if asyncio.get_running_loop().time() >= deadline:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still in progress",
+                headers={"Retry-After": "1"},
+            )
+        await asyncio.sleep(interval)
+        interval = min(interval * 2, MAX_POLL_INTERVAL_SECONDS)
+
+
+async def run_idempotent(
+    db: AsyncSession,
+    user_id: int,
+    key: str | None,
+    request_hash: str,
+    handler: Callable[[], Awaitable[Any]],
+    status_code: int = status.HTTP_200_OK,
+) -> Any:
+    """
+    Выполняет handler не более одного раза на пару (пользователь, Idempotency-Key).
+    Повтор получает сохранённый ответ, не выполняя handler; параллельный
+    дубликат ждёт завершения первого запроса. Неуспешные ответы не кэшируются:
+    если handler бросил исключение, ключ освобождается для повторной попытки.
+
+    handler пишет в сессию запроса db и не коммитит: ответ сохраняется в
+    idempotency_keys той же транзакцией, что и изменения handler, поэтому
+    после сбоя не бывает мутации без сохранённого ответа. Без ключа
+    run_idempotent просто коммитит то, что сделал handler.
+    """
+    if not key:
+        body = await handler()
+        await db.commit()
+        return body
+
+    # Захват ключа коммитится отдельно: параллельные дубликаты должны его видеть
+    async with async_session() as claim_db:
+        while not await _claim(claim_db, user_id, key, request_hash):
+            replay = await _wait_for_result(claim_db, user_id, key, request_hash)
+            if replay is not None:
+                return replay
+
+        try:
+            body = await handler()
+            await db.execute(
+                text("""
+                    UPDATE idempotency_keys
+                    SET status = 'done', response_code = :code, response_body = :body
+                    WHERE user_id = :user_id AND key = :key
+                """),
+                {
+                    "code": status_code,
+                    "body": json.dumps(jsonable_encoder(body)),
+                    "user_id": user_id,
+                    "key": key,
+                },
+            )
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            await claim_db.execute(
+                text("DELETE FROM idempotency_keys WHERE user_id = :user_id AND key = :key"),
+                {"user_id": user_id, "key": key},
+            )
+            await claim_db.commit()
+            raise
+        return body
+
+
+async def cleanup_idempotency_keys(db: AsyncSession) -> None:
+    """Удаляет просроченные ключи и держит таблицу в пределах IDEMPOTENCY_MAX_ROWS."""
+    expired = await db.execute(
+        text("DELETE FROM idempotency_keys WHERE expires_at < :now"),
+        {"now": datetime.utcnow()},
+    )
+    overflow = await db.execute(
+        text("""
+            DELETE FROM idempotency_keys WHERE id IN (
+                SELECT id FROM idempotency_keys
+                WHERE status = 'done'
+                ORDER BY created_at DESC
+                OFFSET :max_rows
+            )
+        """),
+        {"max_rows": settings.IDEMPOTENCY_MAX_ROWS},
+    )
+    await db.commit()
+    if expired.rowcount or overflow.rowcount:
+        logger.info("Idempotency keys removed: %d expired, %d over limit", expired.rowcount, overflow.rowcount)
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import signal
+from typing import Awaitable, Callable
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DRAIN_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+class Lifecycle:
+    """
+    Жизненный цикл воркера: периодические задачи и фоновая работа
+    (конвертации, локальная печать), которую нельзя бросить на полпути.
+
+    По SIGTERM воркер перестаёт брать новую работу (draining), а при
+    остановке ждёт начатую не дольше SHUTDOWN_DRAIN_SECONDS. Что не успело
+    завершиться, отменяется: задачи ловят CancelledError и сохраняют
+    точку продолжения в БД, а следующий старт подхватывает их.
+    """
+
+    def __init__(self):
+        self.draining = False
+        self._periodic: list[tuple[float, Callable[[], Awaitable[None]]]] = []
+        self._periodic_tasks: list[asyncio.Task] = []
+        self._work: set[asyncio.Task] = set()
+
+    def periodic(self, seconds: float):
+        """Регистрирует периодическую задачу; первый запуск — сразу при старте воркера."""
+        def decorator(func: Callable[[], Awaitable[None]]):
+            self._periodic.append((seconds, func))
+            return func
+        return decorator
+
+    def spawn(self, coro: Awaitable) -> asyncio.Task:
+        """Запускает фоновую работу, которую остановка воркера дождётся."""
+        task = asyncio.ensure_future(coro)
+        self._work.add(task)
+        task.add_done_callback(self._work.discard)
+        return task
+
+    def in_flight(self) -> int:
+        return len(self._work)
+
+    def start_draining(self) -> None:
+        if not self.draining:
+            self.draining = True
+            logger.info("Draining: new conversions and prints are no longer accepted")
+
+    def install_signal_handlers(self) -> None:
+        """
+        Ставит draining по SIGTERM/SIGINT до того, как uvicorn начнёт ждать
+        открытые запросы. Обработчик uvicorn вызывается следом, как и раньше.
+        """
+        for sig in DRAIN_SIGNALS:
+            previous = signal.getsignal(sig)
+
+            def handler(signum, frame, previous=previous):
+                self.start_draining()
+                if callable(previous):
+                    previous(signum, frame)
+
+            try:
+                signal.signal(sig, handler)
+            except ValueError:
+                # Не главный поток (например, тестовый клиент): draining включит shutdown()
+                return
+
+    async def start(self) -> None:
+        self.draining = False
+        self._periodic_tasks = [
+            asyncio.create_task(self._run_periodic(seconds, func), name=f"periodic:{func.__name__}")
+            for seconds, func in self._periodic
+        ]
+
+    async def _run_periodic(self, seconds: float, func: Callable[[], Awaitable[None]]) -> None:
+        while not self.draining:
+            try:
+                await func()
+            except Exception:
+                logger.exception("Periodic task %s failed", func.__name__)
+            await asyncio.sleep(seconds)
+
+    async def shutdown(self) -> None:
+        self.start_draining()
+        # Периодические задачи — идемпотентные проходы, их можно прервать сразу
+        for task in self._periodic_tasks:
+            task.cancel()
+        await asyncio.gather(*self._periodic_tasks, return_exceptions=True)
+        self._periodic_tasks = []
+
+        if not self._work:
+            return
+        logger.info("Waiting up to %ss for %d in-flight task(s)", settings.SHUTDOWN_DRAIN_SECONDS, len(self._work))
+        _, pending = await asyncio.wait(set(self._work), timeout=settings.SHUTDOWN_DRAIN_SECONDS)
+        if pending:
+            logger.warning("Checkpointing %d unfinished task(s) for the next start", len(pending))
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+lifecycle = Lifecycle()
@@ -0,0 +1,220 @@
+import atexit
+import contextvars
+import copy
+import logging
+import queue
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+import orjson
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("app.access")
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+# Id текущего запроса. Фоновые задачи, запущенные из запроса (конвертация,
+# печать), наследуют контекст и пишут в лог тот же id.
+request_id_var: contextvars.ContextVar[str | None] = contextvars.ContextVar("request_id", default=None)
+
+# Атрибуты, которые есть у любой LogRecord; всё остальное пришло через extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна JSON-строка; поля из extra= попадают в запись как есть."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return orjson.dumps(entry, default=str).decode()
+
+
+class ContextFilter(logging.Filter):
+    """Дописывает request_id в запись в потоке, где она создана (до очереди)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает заданную долю записей шумных логгеров (по префиксу имени).
+    WARNING и выше не отбрасываются никогда.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        # Длинные префиксы проверяются первыми: "sqlalchemy.engine" важнее "sqlalchemy"
+        self.rates = sorted(rates.items(), key=lambda item: -len(item[0]))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                return random.random() < rate
+        return True
+
+
+def parse_sampling(spec: str) -> dict[str, float]:
+    """"sqlalchemy.engine=0.01,app.access=0.1" -> {"sqlalchemy.engine": 0.01, "app.access": 0.1}"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Кладёт запись в ограниченную очередь и сразу возвращается; форматирование
+    и вывод делает поток QueueListener. Если вывод не успевает, записи
+    отбрасываются, а не блокируют event loop; число потерь попадает в лог.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Стандартный prepare вклеивает traceback в message; нам он нужен отдельным полем
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            notice = logging.LogRecord(logger.name, logging.WARNING, __file__, 0,
+                                       "Log queue overflow: %d record(s) dropped", (dropped,), None)
+            notice.request_id = None
+            try:
+                self.queue.put_nowait(self.prepare(notice))
+            except queue.Full:
+                self.dropped += dropped
+
+
+_listener: QueueListener | None = None
+
+
+def setup_logging() -> None:
+    """
+    Единая настройка логов процесса: все логгеры пишут в очередь, вывод в
+    stderr (и LOG_FILE) — в отдельном потоке. Повторный вызов ничего не делает.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter() if settings.LOG_FORMAT == "json" else logging.Formatter(
+        "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+    )
+    handlers: list[logging.Handler] = [logging.StreamHandler(sys.stderr)]
+    if settings.LOG_FILE:
+        # WatchedFileHandler переоткрывает файл после logrotate
+        handlers.append(WatchedFileHandler(settings.LOG_FILE, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE))
+    queue_handler.addFilter(ContextFilter())
+    sampling = parse_sampling(settings.LOG_SAMPLING)
+    if sampling:
+        queue_handler.addFilter(SamplingFilter(sampling))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(settings.LOG_LEVEL)
+
+    # Логи uvicorn идут через ту же очередь; access-лог заменяет app.access
+    # (с request id и длительностью)
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+    logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
+    # SQL пишется тем же неблокирующим путём, а не через обработчик echo=True
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO if settings.SQL_ECHO else logging.WARNING)
+
+    _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Дописывает очередь и останавливает поток вывода."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestLogMiddleware:
+    """
+    Присваивает запросу id (из X-Request-Id или новый), возвращает его в
+    ответе и пишет по запросу одну запись app.access: метод, путь, статус, время.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        incoming = dict(scope["headers"]).get(REQUEST_ID_HEADER)
+        request_id = incoming.decode("latin-1")[:64] if incoming else uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [(REQUEST_ID_HEADER, request_id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            access_logger.info(
+                "%s %s %d", scope["method"], scope["path"], status_code,
+                extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status_code,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                },
+            )
+            request_id_var.reset(token)
@@ -0,0 +1,16 @@
+import hashlib
+import hmac
+
+
+def notification_signature(secret: str, notification_id: str, order_id: int, amount: int) -> str:
+    """
+    HMAC-SHA256 подпись уведомления платёжного провайдера.
+    Подписывается строка "<notification_id>:<order_id>:<amount>".
+    """
+    message = f"{notification_id}:{order_id}:{amount}".encode("utf-8")
+    return hmac.new(secret.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+
+def verify_notification(secret: str, notification_id: str, order_id: int, amount: int, signature: str) -> bool:
+    expected = notification_signature(secret, notification_id, order_id, amount)
+    return hmac.compare_digest(expected, signature)
@@ -0,0 +1,85 @@
+import logging
+import time
+from typing import AsyncIterator
+from fastapi import Depends
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import text
+from app.core.config import settings
+from app.core.bus import bus
+from app.core.cache import add_invalidation_listener, files_listing_cache, orders_listing_cache
+from app.core.security import decode_access_token
+from app.db.session import async_session, replica_session
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACKED_USERS = 10000
+
+
+class RecentWriters:
+    """
+    Пользователи, чьи данные менялись последние READ_YOUR_WRITES_SECONDS.
+    Их чтения идут в primary, чтобы не увидеть на отстающей реплике
+    собственный только что загруженный файл или созданный заказ в старом виде.
+
+    Источник — инвалидации кэшей списков: их вызывает каждая запись в файлы
+    и заказы, а шина доставляет их во все воркеры.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._until: dict[int, float] = {}
+        self._all_until = 0.0
+
+    def mark(self, user_id: int) -> None:
+        now = time.monotonic()
+        self._until[user_id] = now + self.window
+        if len(self._until) > MAX_TRACKED_USERS:
+            self._until = {key: until for key, until in self._until.items() if until > now}
+
+    def mark_all(self) -> None:
+        # Шина переподключилась: уведомления о записях могли потеряться
+        self._all_until = time.monotonic() + self.window
+
+    def wrote_recently(self, user_id: int) -> bool:
+        now = time.monotonic()
+        return self._all_until > now or self._until.get(user_id, 0) > now
+
+
+recent_writers = RecentWriters(settings.READ_YOUR_WRITES_SECONDS)
+_USER_CACHES = {files_listing_cache.name, orders_listing_cache.name}
+
+
+def _on_invalidation(cache_name: str, keys: list) -> None:
+    if cache_name in _USER_CACHES:
+        for user_id in keys:
+            recent_writers.mark(user_id)
+
+
+add_invalidation_listener(_on_invalidation)
+bus.on_reset(recent_writers.mark_all)
+
+
+async def get_read_db(token: dict = Depends(decode_access_token)) -> AsyncIterator[AsyncSession]:
+    """
+    Сессия для эндпоинтов, которые только читают. Идёт в реплику, если она
+    настроена и пользователь ничего не менял последние READ_YOUR_WRITES_SECONDS;
+    иначе (и если реплика недоступна или ещё не знает пользователя) — в primary.
+    Писать через эту сессию нельзя.
+    """
+    if replica_session is not None:
+        async with replica_session() as session:
+            try:
+                result = await session.execute(
+                    text("SELECT id FROM users WHERE email = :email"), {"email": token.get("sub")}
+                )
+                user_id = result.scalar_one_or_none()
+            except (OSError, DBAPIError) as e:
+                logger.warning("Replica unavailable, reading from primary: %s", e)
+                user_id = None
+            if user_id is not None and not recent_writers.wrote_recently(user_id):
+                yield session
+                return
+
+    async with async_session() as session:
+        yield session
@@ -0,0 +1,46 @@
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+
+# Клиент может хранить ответ, но обязан перепроверять его через If-None-Match
+LISTING_CACHE_CONTROL = "private, no-cache"
+
+
+def fast_json_response(content, status_code: int = 200, headers: dict | None = None) -> ORJSONResponse:
+    """
+    Быстрый путь для списков: content — уже готовые словари ровно с полями
+    response_model (колонки выбраны в SQL), orjson рендерит их сам, включая
+    datetime. Возвращая Response, эндпоинт минует и валидацию response_model,
+    и jsonable_encoder FastAPI; response_model остаётся контрактом для OpenAPI.
+    """
+    return ORJSONResponse(content, status_code=status_code, headers=headers)
+
+
+def json_bytes_response(body: bytes, status_code: int = 200, headers: dict | None = None) -> Response:
+    """Ответ из заранее отрендеренного JSON (например, из кэша)."""
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+def listing_etag(cache_name: str, user_id: int, version: int) -> str:
+    """Слабый ETag списка: тело определяется версией, но байты могут отличаться (порядок ключей и т.п.)."""
+    return f'W/"{cache_name}-{user_id}-{version}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Для If-None-Match сравнение слабое: префикс W/ не учитывается
+    weak = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == weak for tag in if_none_match.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": LISTING_CACHE_CONTROL})
+
+
+def listing_response(body: bytes, etag: str, if_none_match: str | None = None) -> Response:
+    """Ответ списка из отрендеренного тела: 304 без тела, если у клиента та же версия."""
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    return json_bytes_response(body, headers={"ETag": etag, "Cache-Control": LISTING_CACHE_CONTROL})
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+import signal
+import time
+from dataclasses import dataclass, field
+from app.core.config import settings
+from app.core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class ToolError(RuntimeError):
+    """Внешняя утилита завершилась с ненулевым кодом."""
+
+    def __init__(self, tool: str, returncode: int, stderr: bytes):
+        self.tool = tool
+        self.returncode = returncode
+        self.stderr = stderr
+        super().__init__(f"{tool} exited with code {returncode}: {stderr.decode(errors='replace').strip()[:500]}")
+
+
+class ToolTimeout(RuntimeError):
+    """Утилита не уложилась в таймаут и была убита вместе с группой процессов."""
+
+
+class ToolUnavailable(RuntimeError):
+    """Circuit breaker разомкнут: утилита недавно раз за разом зависала."""
+
+
+@dataclass
+class ToolStats:
+    calls: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    cancelled: int = 0
+    rejected: int = 0  # Отказы из-за разомкнутого breaker
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    # Состояние circuit breaker
+    consecutive_timeouts: int = 0
+    open_until: float = 0.0
+    half_open_probe: bool = field(default=False, repr=False)
+
+    def as_dict(self) -> dict:
+        now = time.monotonic()
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+            "avg_seconds": round(self.total_seconds / self.calls, 3) if self.calls else 0.0,
+            "max_seconds": round(self.max_seconds, 3),
+            "circuit": "open" if self.open_until > now else ("half-open" if self.half_open_probe else "closed"),
+        }
+
+
+_stats: dict[str, ToolStats] = {}
+
+
+def tool_stats() -> dict[str, dict]:
+    """Метрики по утилитам для /admin/debug/tools (в пределах воркера)."""
+    return {tool: stats.as_dict() for tool, stats in _stats.items()}
+
+
+def _timeout_for(tool: str) -> float:
+    return {
+        "libreoffice": settings.TOOL_TIMEOUT_LIBREOFFICE,
+        "pdfinfo": settings.TOOL_TIMEOUT_PDFINFO,
+        "lp": settings.TOOL_TIMEOUT_LP,
+        "gs": settings.TOOL_TIMEOUT_PDF_OPTIMIZE,
+        "qpdf": settings.TOOL_TIMEOUT_PDF_OPTIMIZE,
+    }.get(tool, settings.TOOL_TIMEOUT_DEFAULT)
+
+
+def _admit(tool: str, stats: ToolStats) -> bool:
+    """Пропускает вызов или бросает ToolUnavailable. True — это пробный вызов half-open."""
+    now = time.monotonic()
+    if stats.open_until > now:
+        stats.rejected += 1
+        raise ToolUnavailable(f"{tool} is temporarily disabled after repeated timeouts")
+    if stats.open_until and not stats.half_open_probe:
+        # Пауза истекла: пропускаем один пробный вызов, остальные ждут его исхода
+        stats.half_open_probe = True
+        return True
+    if stats.half_open_probe:
+        stats.rejected += 1
+        raise ToolUnavailable(f"{tool} is being probed after repeated timeouts")
+    return False
+
+
+def _record_timeout(tool: str, stats: ToolStats) -> None:
+    stats.timeouts += 1
+    stats.consecutive_timeouts += 1
+    stats.half_open_probe = False
+    if stats.consecutive_timeouts >= settings.TOOL_BREAKER_THRESHOLD:
+        stats.open_until = time.monotonic() + settings.TOOL_BREAKER_COOLDOWN_SECONDS
+        logger.error("Circuit for %s opened for %ss", tool, settings.TOOL_BREAKER_COOLDOWN_SECONDS)
+
+
+def _record_completion(stats: ToolStats) -> None:
+    stats.consecutive_timeouts = 0
+    stats.open_until = 0.0
+    stats.half_open_probe = False
+
+
+def _kill_group(proc: asyncio.subprocess.Process) -> None:
+    # start_new_session=True: pid процесса совпадает с id его группы,
+    # так убиваются и дочерние процессы (soffice.bin у LibreOffice)
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+async def run_tool(tool: str, args: list[str], timeout: float | None = None) -> bytes:
+    """
+    Запускает внешнюю утилиту без блокировки event loop.
+
+    - таймаут по утилите (TOOL_TIMEOUT_*), по истечении убивается вся группа процессов;
+    - отмена вызывающей задачи (остановка воркера) тоже убивает группу процессов;
+    - circuit breaker: после TOOL_BREAKER_THRESHOLD таймаутов подряд утилита
+      на TOOL_BREAKER_COOLDOWN_SECONDS отклоняется сразу (ToolUnavailable).
+
+    Возвращает stdout; при ненулевом коде выхода бросает ToolError.
+    """
+    stats = _stats.setdefault(tool, ToolStats())
+    probing = _admit(tool, stats)
+    timeout = timeout or _timeout_for(tool)
+
+    started = time.monotonic()
+    stats.calls += 1
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+        )
+    except OSError:
+        # Утилита не установлена или не запускается
+        stats.failures += 1
+        if probing:
+            stats.half_open_probe = False
+        raise
+    communicate = asyncio.ensure_future(proc.communicate())
+
+    try:
+        with span(tool):
+            done, _ = await asyncio.wait({communicate}, timeout=timeout)
+        if communicate not in done:
+            _kill_group(proc)
+            await communicate
+            _record_timeout(tool, stats)
+            raise ToolTimeout(f"{tool} timed out after {timeout}s")
+
+        stdout, stderr = communicate.result()
+        _record_completion(stats)
+        if proc.returncode != 0:
+            stats.failures += 1
+            raise ToolError(tool, proc.returncode, stderr)
+        return stdout
+    except asyncio.CancelledError:
+        stats.cancelled += 1
+        _kill_group(proc)
+        raise
+    finally:
+        if probing and stats.half_open_probe:
+            # Проба прервана без результата (отмена) — следующий вызов станет пробой
+            stats.half_open_probe = False
+        if not communicate.done():
+            communicate.cancel()
+        elapsed = time.monotonic() - started
+        stats.total_seconds += elapsed
+        stats.max_seconds = max(stats.max_seconds, elapsed)
@@ -1,8 +1,13 @@
+import hmac
 from datetime import datetime, timedelta
-from fastapi import HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import text
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from app.core.config import settings
+from app.db.session import get_db
+from app.core.tracing import span
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -20,7 +25,8 @@ def create_access_token(data: dict):
 
 def decode_access_token(token: str):
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        with span("jwt"):
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(
@@ -31,4 +37,35 @@ def decode_access_token(token: str):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token. Please log in again."
-        )
\ No newline at end of file
+        )
+
+async def require_admin(
+    token: dict = Depends(decode_access_token),
+    db: AsyncSession = Depends(get_db)
+) -> int:
+    """Зависимость для /admin-эндпоинтов: возвращает id администратора или 403."""
+    user_email = token.get("sub")
+    if not user_email:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+    query = text("SELECT id, is_admin FROM users WHERE email = :email")
+    result = await db.execute(query, {"email": user_email})
+    user = result.fetchone()
+    if not user or not user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return user.id
+
+async def authenticate_device(
+    x_device_id: str = Header(...),
+    x_device_secret: str = Header(...),
+    db: AsyncSession = Depends(get_db)
+) -> str:
+    """Зависимость для эндпоинтов агента печати: проверяет secret_key устройства, возвращает его id."""
+    query = text("SELECT secret_key, is_active FROM devices WHERE id = :device_id")
+    result = await db.execute(query, {"device_id": x_device_id})
+    device = result.fetchone()
+    if not device or not hmac.compare_digest(device.secret_key.encode(), x_device_secret.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid device credentials")
+    if not device.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Device is disabled")
+    return x_device_id
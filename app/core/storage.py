@@ -0,0 +1,183 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from app.core.config import settings
+
+CHUNK_SIZE = 1024 * 1024  # Размер чанка при потоковом чтении
+
+
+class StorageBackend(ABC):
+    """
+    Хранилище файлов пользователей. Файлы адресуются ключами вида
+    "<email>/<timestamp>_<имя файла>", физическое расположение решает бэкенд.
+    """
+
+    @abstractmethod
+    async def save_file(self, key: str, src_path: str) -> None:
+        """Кладёт локальный файл под ключ. Исходный файл удаляется."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def open_stream(self, key: str, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """Потоковое чтение содержимого по ключу."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def size(self, key: str) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Удаляет объект. Отсутствие объекта ошибкой не считается."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def local_copy(self, key: str):
+        """
+        Асинхронный контекстный менеджер, отдающий путь к локальному файлу
+        с содержимым ключа (нужно для lp, pdfinfo и т.п.).
+        """
+        raise NotImplementedError
+
+
+class LocalStorage(StorageBackend):
+    """
+    Локальный диск с шардированной раскладкой: <root>/ab/cd/<ключ>, где
+    ab/cd — первые байты sha1 от ключа. Так ни один каталог не разрастается.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, key: str) -> Path:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return self.root / digest[:2] / digest[2:4] / key.replace("/", "__")
+
+    async def save_file(self, key: str, src_path: str) -> None:
+        target = self.path_for(key)
+
+        def _move():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(src_path, target)
+
+        await run_in_threadpool(_move)
+
+    async def open_stream(self, key: str, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        f = await run_in_threadpool(open, self.path_for(key), "rb")
+        try:
+            while chunk := await run_in_threadpool(f.read, chunk_size):
+                yield chunk
+        finally:
+            f.close()
+
+    async def exists(self, key: str) -> bool:
+        return await run_in_threadpool(self.path_for(key).exists)
+
+    async def size(self, key: str) -> int:
+        stat = await run_in_threadpool(self.path_for(key).stat)
+        return stat.st_size
+
+    async def delete(self, key: str) -> None:
+        await run_in_threadpool(self.path_for(key).unlink, True)
+
+    @asynccontextmanager
+    async def local_copy(self, key: str):
+        yield str(self.path_for(key))
+
+
+class S3Storage(StorageBackend):
+    """
+    S3-совместимое хранилище (AWS S3, MinIO и т.п.). boto3 — необязательная
+    зависимость и нужна только при STORAGE_BACKEND=s3.
+    """
+
+    def __init__(self, bucket: str, endpoint_url: str | None = None,
+                 access_key: str | None = None, secret_key: str | None = None,
+                 region: str | None = None):
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError as e:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 to be installed") from e
+
+        self.bucket = bucket
+        self._client_error = ClientError
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            aws_access_key_id=access_key or None,
+            aws_secret_access_key=secret_key or None,
+            region_name=region or None,
+        )
+
+    async def save_file(self, key: str, src_path: str) -> None:
+        # upload_file сам режет большие файлы на multipart-части и читает их с диска
+        await run_in_threadpool(self.client.upload_file, src_path, self.bucket, key)
+        os.remove(src_path)
+
+    async def open_stream(self, key: str, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        obj = await run_in_threadpool(self.client.get_object, Bucket=self.bucket, Key=key)
+        body = obj["Body"]
+        try:
+            async for chunk in iterate_in_threadpool(body.iter_chunks(chunk_size)):
+                yield chunk
+        finally:
+            body.close()
+
+    async def _head(self, key: str) -> dict | None:
+        try:
+            return await run_in_threadpool(self.client.head_object, Bucket=self.bucket, Key=key)
+        except self._client_error as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    async def exists(self, key: str) -> bool:
+        return await self._head(key) is not None
+
+    async def size(self, key: str) -> int:
+        head = await self._head(key)
+        if head is None:
+            raise FileNotFoundError(key)
+        return head["ContentLength"]
+
+    async def delete(self, key: str) -> None:
+        await run_in_threadpool(self.client.delete_object, Bucket=self.bucket, Key=key)
+
+    @asynccontextmanager
+    async def local_copy(self, key: str):
+        fd, path = tempfile.mkstemp(suffix=Path(key).suffix)
+        os.close(fd)
+        try:
+            await run_in_threadpool(self.client.download_file, self.bucket, key, path)
+            yield path
+        finally:
+            os.remove(path)
+
+
+def build_storage() -> StorageBackend:
+    if settings.STORAGE_BACKEND == "local":
+        return LocalStorage(settings.STORAGE_LOCAL_ROOT)
+    if settings.STORAGE_BACKEND == "s3":
+        return S3Storage(
+            bucket=settings.STORAGE_S3_BUCKET,
+            endpoint_url=settings.STORAGE_S3_ENDPOINT_URL,
+            access_key=settings.STORAGE_S3_ACCESS_KEY,
+            secret_key=settings.STORAGE_S3_SECRET_KEY,
+            region=settings.STORAGE_S3_REGION,
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
+
+
+storage = build_storage()
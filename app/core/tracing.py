@@ -0,0 +1,188 @@
+import contextvars
+import functools
+import logging
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from urllib.parse import parse_qs
+from jose import jwt, JWTError
+from sqlalchemy import event
+from sqlalchemy.sql import text
+from app.core.config import settings
+from app.db.session import async_session
+
+logger = logging.getLogger(__name__)
+
+TRACE_HEADER = b"x-debug-trace"  # "1" — вернуть тайминги этапов в Server-Timing
+PROFILE_HEADER = b"x-debug-profile"  # "1" — дополнительно снять профиль запроса
+
+_current_trace: contextvars.ContextVar["Trace | None"] = contextvars.ContextVar("trace", default=None)
+_NOOP = nullcontext()
+
+
+class Trace:
+    """Накопленные спаны одного запроса: имя -> (суммарное время, число вызовов)."""
+
+    def __init__(self):
+        self.spans: dict[str, list[float]] = {}
+
+    def add(self, name: str, duration: float) -> None:
+        total = self.spans.setdefault(name, [0.0, 0])
+        total[0] += duration
+        total[1] += 1
+
+    def server_timing(self) -> str:
+        return ", ".join(
+            f'{name};dur={total * 1000:.1f};desc="x{count}"'
+            for name, (total, count) in self.spans.items()
+        )
+
+
+@contextmanager
+def _timed(trace: Trace, name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - started)
+
+
+def span(name: str):
+    """
+    Контекстный менеджер вокруг этапа запроса (jwt, libreoffice, pdfinfo, lp, ...).
+    Если трассировка для запроса не включена, возвращает общий no-op
+    менеджер — стоимость сводится к чтению contextvar.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP
+    return _timed(trace, name)
+
+
+def traced(name: str):
+    """Декоратор для async-функций репозиториев: оборачивает вызов в span(name)."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_engine(engine) -> None:
+    """Считает время каждого SQL-запроса в спан "db", когда трассировка включена."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current_trace.get() is not None:
+            conn.info.setdefault("trace_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        trace = _current_trace.get()
+        started = conn.info.get("trace_started")
+        if trace is not None and started:
+            trace.add("db", time.perf_counter() - started.pop())
+
+
+class _Profiler:
+    """
+    Сэмплирующий профилировщик pyinstrument (необязательная зависимость),
+    при его отсутствии — cProfile. cProfile детерминированный и видит весь
+    поток, включая чужие запросы во время await, так что это запасной вариант.
+    """
+
+    def __init__(self):
+        try:
+            from pyinstrument import Profiler
+            self._impl = Profiler(async_mode="enabled")
+            self.suffix = ".html"
+        except ImportError:
+            import cProfile
+            self._impl = cProfile.Profile()
+            self.suffix = ".prof"
+
+    def start(self) -> None:
+        if self.suffix == ".html":
+            self._impl.start()
+        else:
+            self._impl.enable()
+
+    def stop_and_save(self, path: Path) -> None:
+        if self.suffix == ".html":
+            self._impl.stop()
+            path.write_text(self._impl.output_html(), encoding="utf-8")
+        else:
+            self._impl.disable()
+            self._impl.dump_stats(str(path))
+
+
+class TracingMiddleware:
+    """
+    Включает трассировку и профилирование одного запроса по заголовкам
+    X-Debug-Trace / X-Debug-Profile. Заголовки учитываются только для
+    администраторов; для остальных запросов middleware ничего не делает.
+
+    Спаны возвращаются в заголовке Server-Timing, профиль сохраняется
+    в PROFILE_DIR, его id — в заголовке X-Profile-Id
+    (скачать: GET /admin/debug/profiles/{id}).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        want_trace = headers.get(TRACE_HEADER) == b"1"
+        want_profile = headers.get(PROFILE_HEADER) == b"1"
+        if not (want_trace or want_profile) or not await self._is_admin(scope):
+            return await self.app(scope, receive, send)
+
+        trace = Trace()
+        token = _current_trace.set(trace)
+        profiler = None
+        profile_id = None
+        if want_profile:
+            profiler = _Profiler()
+            profile_id = uuid.uuid4().hex
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                extra = [(b"server-timing", trace.server_timing().encode())]
+                if profile_id:
+                    extra.append((b"x-profile-id", f"{profile_id}{profiler.suffix}".encode()))
+                message = {**message, "headers": list(message.get("headers", [])) + extra}
+            await send(message)
+
+        if profiler:
+            profiler.start()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if profiler:
+                profile_dir = Path(settings.PROFILE_DIR)
+                profile_dir.mkdir(parents=True, exist_ok=True)
+                profiler.stop_and_save(profile_dir / f"{profile_id}{profiler.suffix}")
+            _current_trace.reset(token)
+
+    @staticmethod
+    async def _is_admin(scope) -> bool:
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        token = query.get("token", [None])[0]
+        if not token:
+            return False
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except JWTError:
+            return False
+        async with async_session() as db:
+            result = await db.execute(
+                text("SELECT is_admin FROM users WHERE email = :email"), {"email": payload.get("sub")}
+            )
+            return bool(result.scalar_one_or_none())
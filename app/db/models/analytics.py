@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, Date, BigInteger
+from app.db.session import Base
+
+class DailyPrinterStats(Base):
+    """
+    Дневной срез по принтеру. Обновляется инкрементально при закрытии заказа
+    (см. app/db/repositories/analytics.py) и сверяется периодической задачей.
+    Отчёты читают только эту таблицу, не трогая orders/order_files/files.
+    """
+    __tablename__ = "daily_printer_stats"
+
+    day = Column(Date, primary_key=True)
+    printer = Column(String, primary_key=True)
+    orders_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(BigInteger, nullable=False, default=0)  # Выручка по напечатанным заказам
+    pages = Column(BigInteger, nullable=False, default=0)  # Страниц с учётом копий
+    duplex_pages = Column(BigInteger, nullable=False, default=0)  # Из них напечатано двусторонне
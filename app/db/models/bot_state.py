@@ -0,0 +1,12 @@
+from datetime import datetime
+from sqlalchemy import Column, String, DateTime, Text
+from app.db.session import Base
+
+class BotState(Base):
+    """Состояние FSM Telegram-бота: общее для всех процессов бота, переживает перезапуск."""
+    __tablename__ = "bot_fsm_states"
+
+    key = Column(String, primary_key=True)  # bot_id:chat_id:user_id:thread_id:business_connection_id:destiny
+    state = Column(String, nullable=True)
+    data = Column(Text, nullable=True)  # JSON данных FSM
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean
+from sqlalchemy import Column, String, Boolean, DateTime
 from app.db.session import Base
 
 class Device(Base):
@@ -9,3 +9,4 @@ class Device(Base):
     ip_address = Column(String, nullable=False, unique=True)
     secret_key = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
+    last_seen_at = Column(DateTime, nullable=True)  # Последний heartbeat или опрос агента печати
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from app.db.session import Base
 
@@ -12,7 +12,27 @@ class File(Base):
     pages_count = Column(Integer, default=0)  # Количество страниц
     filepath = Column(String, nullable=False)
     temp_pdf_path = Column(String, nullable=True)
+    optimized_pdf_path = Column(String, nullable=True)  # Сжатый/линеаризованный PDF для печати
+    optimized_saved_bytes = Column(Integer, nullable=True)  # Сколько байт сэкономила оптимизация
     size = Column(Integer, nullable=False)
     uploaded_at = Column(DateTime, nullable=False)
+    status = Column(String, nullable=False, default="ready", server_default="ready")  # processing | ready | failed
+    processing_started_at = Column(DateTime, nullable=True)  # Аренда фоновой конвертации
+    error = Column(String, nullable=True)  # Причина статуса failed
+    deleted_at = Column(DateTime, nullable=True)  # Мягкое удаление; физически файл удаляет reclaim_deleted
+    compression = Column(String, nullable=True)  # NULL — не сжимался, "zstd", "none" — сжатие не окупилось
+    stored_size = Column(BigInteger, nullable=True)  # Сколько оригинал занимает в хранилище после сжатия
+    superseded_path = Column(String, nullable=True)  # Несжатый оригинал; удаляется reclaim_deleted после грейс-периода
+    superseded_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Частичный индекс для sweep незавершённых конвертаций
+        Index("ix_files_processing", "uploaded_at", postgresql_where=(status == "processing")),
+        # Все пользовательские запросы идут только по неудалённым файлам
+        Index("ix_files_user_live", "user_id", postgresql_where=deleted_at.is_(None)),
+        Index("ix_files_deleted", "deleted_at", postgresql_where=deleted_at.isnot(None)),
+        Index("ix_files_uncompressed", "id", postgresql_where=compression.is_(None)),
+        Index("ix_files_superseded", "superseded_at", postgresql_where=superseded_at.isnot(None)),
+    )
 
     user = relationship("User", back_populates="files")
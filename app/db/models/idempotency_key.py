@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, UniqueConstraint
+from app.db.session import Base
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("user_id", "key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    key = Column(String, nullable=False)  # Значение заголовка Idempotency-Key
+    request_hash = Column(String, nullable=False)  # Отпечаток запроса: метод, путь, параметры
+    status = Column(String, nullable=False, default="in_progress")  # in_progress, done
+    response_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)  # JSON первого успешного ответа
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
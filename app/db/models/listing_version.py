@@ -0,0 +1,10 @@
+from sqlalchemy import Column, Integer, String, BigInteger, ForeignKey
+from app.db.session import Base
+
+class ListingVersion(Base):
+    """Версия списка пользователя; растёт с каждой мутацией, из неё строится ETag."""
+    __tablename__ = "listing_versions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    listing = Column(String, primary_key=True)  # Имя кэша списка: files_listing, orders_listing
+    version = Column(BigInteger, nullable=False, default=0)
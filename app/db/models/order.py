@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime, Index
 from sqlalchemy.orm import relationship
 from app.db.session import Base
 from datetime import datetime
@@ -13,6 +13,14 @@ class Order(Base):
     status = Column(String, default="pending")  # Статусы: pending, completed, failed
     total_price = Column(Integer, nullable=False)
     duplex = Column(Boolean, default=False)  # Двухсторонняя печать
+    printer = Column(String, nullable=True)  # Принтер, на котором напечатан заказ
+    printed_at = Column(DateTime, nullable=True, index=True)  # Время закрытия заказа печатью
+    deleted_at = Column(DateTime, nullable=True)  # Мягкое удаление; строки удаляет reclaim_deleted
+
+    __table_args__ = (
+        Index("ix_orders_user_live", "user_id", "created_at", postgresql_where=deleted_at.is_(None)),
+        Index("ix_orders_deleted", "deleted_at", postgresql_where=deleted_at.isnot(None)),
+    )
 
     # Связь с файлами
     order_files = relationship("OrderFile", back_populates="order")
@@ -22,9 +30,10 @@ class OrderFile(Base):
     __tablename__ = "order_files"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
     file_id = Column(Integer, ForeignKey("files.id"), nullable=False)
     copies = Column(Integer, default=1)  # Количество копий
+    printed_at = Column(DateTime, nullable=True)  # Файл уже ушёл на локальный принтер; прерванная печать его пропустит
 
     # Связь с заказами
     order = relationship("Order", back_populates="order_files")
@@ -0,0 +1,22 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index
+from app.db.session import Base
+
+class PrintJob(Base):
+    __tablename__ = "print_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
+    device_id = Column(String, ForeignKey("devices.id"), nullable=False)
+    status = Column(String, nullable=False, default="queued")  # queued, leased, done, failed
+    attempts = Column(Integer, nullable=False, default=0)  # Сколько раз задание выдавалось агенту
+    lease_expires_at = Column(DateTime, nullable=True)  # До какого момента задание закреплено за агентом
+    error = Column(String, nullable=True)  # Последняя ошибка от агента
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Очередь устройства: агент берёт самое старое незавершённое задание
+        Index("ix_print_jobs_device_pending", "device_id", "created_at",
+              postgresql_where=(status.in_(["queued", "leased"]))),
+    )
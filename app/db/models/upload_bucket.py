@@ -0,0 +1,10 @@
+from sqlalchemy import Column, String, Float, DateTime
+from app.db.session import Base
+
+class UploadBucket(Base):
+    """Токен-бакет загрузок пользователя, общий для всех воркеров (app/core/admission.py)."""
+    __tablename__ = "upload_buckets"
+
+    user_key = Column(String, primary_key=True)  # sub из JWT
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(DateTime, nullable=False, index=True)
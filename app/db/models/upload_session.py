@@ -0,0 +1,15 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, BigInteger
+from app.db.session import Base
+
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+
+    id = Column(String, primary_key=True, index=True)  # Непрозрачный идентификатор сессии (uuid4)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    original_filename = Column(String, nullable=False)
+    upload_length = Column(BigInteger, nullable=False)  # Заявленный полный размер файла
+    upload_offset = Column(BigInteger, nullable=False, default=0)  # Сколько байт уже получено
+    staging_path = Column(String, nullable=False)  # Файл, в который дописываются чанки
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, Boolean
 from sqlalchemy.orm import relationship
 from app.db.session import Base
 
@@ -11,5 +11,6 @@ class User(Base):
     name = Column(String, nullable=False)
     surname = Column(String, nullable=False)
     phone = Column(String, nullable=True)
+    is_admin = Column(Boolean, nullable=False, default=False)  # Доступ к /admin-эндпоинтам
 
     files = relationship("File", back_populates="user")
@@ -0,0 +1,97 @@
+# app/db/repositories/analytics.py
+
+from datetime import date, datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import text
+from app.db.models.analytics import DailyPrinterStats  # noqa: F401  (регистрирует таблицу)
+from app.core.tracing import traced
+
+# Объём страниц заказа o с учётом копий; общий кусок для инкремента и пересчёта
+_ORDER_PAGES_LATERAL = """
+    LEFT JOIN LATERAL (
+        SELECT COALESCE(SUM(COALESCE(f.pages_count, 0) * COALESCE(of.copies, 1)), 0) AS pages
+        FROM order_files of
+        JOIN files f ON of.file_id = f.id
+        WHERE of.order_id = o.id
+    ) p ON TRUE
+"""
+
+@traced("repo.record_printed_order")
+async def record_printed_order(db: AsyncSession, order_id: int, printer: str, printed_at: datetime) -> None:
+    """
+    Инкрементально добавляет напечатанный заказ в дневной срез.
+    Вызывается в той же транзакции, что переводит заказ в 'closed'.
+    """
+    query = text(f"""
+        INSERT INTO daily_printer_stats AS s (day, printer, orders_count, revenue, pages, duplex_pages)
+        SELECT CAST(:printed_at AS date), :printer, 1, o.total_price,
+               p.pages,
+               CASE WHEN o.duplex THEN p.pages ELSE 0 END
+        FROM orders o
+        {_ORDER_PAGES_LATERAL}
+        WHERE o.id = :order_id
+        ON CONFLICT (day, printer) DO UPDATE SET
+            orders_count = s.orders_count + EXCLUDED.orders_count,
+            revenue = s.revenue + EXCLUDED.revenue,
+            pages = s.pages + EXCLUDED.pages,
+            duplex_pages = s.duplex_pages + EXCLUDED.duplex_pages
+    """)
+    await db.execute(query, {"order_id": order_id, "printer": printer, "printed_at": printed_at})
+
+@traced("repo.refresh_daily_rollups")
+async def refresh_daily_rollups(db: AsyncSession, days: int = 2) -> None:
+    """
+    Пересчитывает срезы за последние `days` дней из исходных таблиц.
+    Страхует инкрементальные обновления (ручные правки, сбои); затрагивает
+    только заказы, закрытые за эти дни, поэтому не зависит от длины истории.
+    """
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    # Блокируем инкременты из print.py на время пересчёта, чтобы не потерять их
+    await db.execute(text("LOCK TABLE daily_printer_stats IN SHARE ROW EXCLUSIVE MODE"))
+    await db.execute(text("DELETE FROM daily_printer_stats WHERE day >= :since"), {"since": since})
+    await db.execute(text(f"""
+        INSERT INTO daily_printer_stats (day, printer, orders_count, revenue, pages, duplex_pages)
+        SELECT CAST(o.printed_at AS date), o.printer, COUNT(*), SUM(o.total_price),
+               SUM(p.pages),
+               SUM(CASE WHEN o.duplex THEN p.pages ELSE 0 END)
+        FROM orders o
+        {_ORDER_PAGES_LATERAL}
+        WHERE o.status = 'closed' AND o.printed_at >= :since AND o.printer IS NOT NULL
+        GROUP BY CAST(o.printed_at AS date), o.printer
+    """), {"since": since})
+    await db.commit()
+
+
+@traced("repo.get_storage_stats")
+async def get_storage_stats(db: AsyncSession) -> dict:
+    """Сколько места занимают оригиналы неудалённых файлов до и после сжатия."""
+    result = await db.execute(text("""
+        SELECT COUNT(*) AS files_count,
+               COUNT(*) FILTER (WHERE compression = 'zstd') AS compressed_count,
+               COUNT(*) FILTER (WHERE compression = 'none') AS skipped_count,
+               COUNT(*) FILTER (WHERE compression IS NULL) AS pending_count,
+               COALESCE(SUM(size), 0) AS original_bytes,
+               COALESCE(SUM(COALESCE(stored_size, size)), 0) AS stored_bytes
+        FROM files
+        WHERE deleted_at IS NULL
+    """))
+    row = dict(result.mappings().one())
+    row["saved_bytes"] = row["original_bytes"] - row["stored_bytes"]
+    return row
+
+
+@traced("repo.get_daily_stats")
+async def get_daily_stats(db: AsyncSession, date_from: date, date_to: date, printer: str | None = None) -> list[dict]:
+    """Строки среза за период (включительно), по дням и принтерам."""
+    query = """
+        SELECT day, printer, orders_count, revenue, pages, duplex_pages
+        FROM daily_printer_stats
+        WHERE day BETWEEN :date_from AND :date_to
+    """
+    params = {"date_from": date_from, "date_to": date_to}
+    if printer:
+        query += " AND printer = :printer"
+        params["printer"] = printer
+    query += " ORDER BY day, printer"
+    result = await db.execute(text(query), params)
+    return [dict(row) for row in result.mappings()]
@@ -4,7 +4,9 @@ from datetime import datetime, timedelta
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.models.login_code import LoginCode
+from app.core.tracing import traced
 
+@traced("repo.create_login_code")
 async def create_login_code(db: AsyncSession, phone: str, code: str, ttl_minutes: int = 5) -> LoginCode:
     """
     Создаёт запись в БД с одноразовым кодом.
@@ -28,6 +30,7 @@ async def create_login_code(db: AsyncSession, phone: str, code: str, ttl_minutes
     await db.refresh(login_code)
     return login_code
 
+@traced("repo.get_valid_login_code")
 async def get_valid_login_code(db: AsyncSession, phone: str, code: str) -> LoginCode | None:
     """
     Ищет неиспользованный код, ещё не истёкший и соответствующий телефону.
@@ -43,6 +46,7 @@ async def get_valid_login_code(db: AsyncSession, phone: str, code: str) -> Login
     result = await db.execute(query)
     return result.scalars().first()
 
+@traced("repo.mark_code_as_used")
 async def mark_code_as_used(db: AsyncSession, code_instance: LoginCode) -> None:
     """Помечаем код как использованный (чтобы нельзя было использовать повторно)."""
     code_instance.is_used = True
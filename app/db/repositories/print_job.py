@@ -0,0 +1,177 @@
+# app/db/repositories/print_job.py
+
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import text
+from app.db.models.device import Device  # noqa: F401  (регистрирует таблицу)
+from app.db.models.print_job import PrintJob  # noqa: F401  (регистрирует таблицу)
+from app.db.repositories.analytics import record_printed_order
+from app.core.config import settings
+from app.core.events import publish_order_event, publish_print_job
+from app.core.cache import orders_listing_cache, invalidate
+from app.core.tracing import traced
+
+# Файлы заказа в том виде, в каком они уходят на принтер
+ORDER_PRINT_FILES = text("""
+    SELECT f.id AS file_id, of.id AS order_file_id, of.copies, of.printed_at,
+           f.temp_pdf_path, f.optimized_pdf_path, f.size,
+           COALESCE(f.optimized_pdf_path, f.temp_pdf_path, f.filepath) AS print_path
+    FROM order_files of JOIN files f ON of.file_id = f.id
+    WHERE of.order_id = :order_id
+    ORDER BY of.id
+""")
+
+@traced("repo.close_printed_order")
+async def close_printed_order(db: AsyncSession, order_id: int, user_id: int, printer: str) -> None:
+    """Переводит заказ в 'closed' и учитывает его в аналитике. Коммитит вызывающий код."""
+    printed_at = datetime.utcnow()
+    query_update = text("""
+        UPDATE orders SET status = :status, updated_at = :updated_at, printer = :printer, printed_at = :updated_at
+        WHERE id = :order_id
+    """)
+    await db.execute(query_update, {
+        "status": "closed",
+        "updated_at": printed_at,
+        "printer": printer,
+        "order_id": order_id
+    })
+    await record_printed_order(db, order_id, printer, printed_at)
+    await publish_order_event(db, order_id, user_id, "closed")
+    await invalidate(db, orders_listing_cache, user_id)
+
+@traced("repo.enqueue_print_job")
+async def enqueue_print_job(db: AsyncSession, order_id: int, user_id: int, device_id: str) -> int:
+    """
+    Ставит оплаченный заказ в очередь устройства и переводит его в 'printing',
+    чтобы заказ не напечатали второй раз. Коммитит вызывающий код.
+    """
+    result = await db.execute(text("""
+        INSERT INTO print_jobs (order_id, device_id, status, attempts, created_at)
+        VALUES (:order_id, :device_id, 'queued', 0, :now)
+        RETURNING id
+    """), {"order_id": order_id, "device_id": device_id, "now": datetime.utcnow()})
+    job_id = result.scalar_one()
+    await db.execute(
+        text("UPDATE orders SET status = 'printing', updated_at = :now WHERE id = :order_id"),
+        {"order_id": order_id, "now": datetime.utcnow()}
+    )
+    await publish_order_event(db, order_id, user_id, "printing", device_id=device_id)
+    await invalidate(db, orders_listing_cache, user_id)
+    await publish_print_job(db, device_id)
+    return job_id
+
+@traced("repo.claim_next_print_job")
+async def claim_next_print_job(db: AsyncSession, device_id: str):
+    """
+    Выдаёт агенту самое старое задание устройства: новое или с истёкшей арендой
+    (агент пропал, не ответив). SKIP LOCKED — два опроса одного устройства
+    не получат одно задание. Возвращает строку задания или None.
+    """
+    now = datetime.utcnow()
+    result = await db.execute(text("""
+        UPDATE print_jobs j
+        SET status = 'leased', attempts = j.attempts + 1, lease_expires_at = :lease_expires_at
+        FROM orders o
+        WHERE j.id = (
+            SELECT id FROM print_jobs
+            WHERE device_id = :device_id
+              AND (status = 'queued' OR (status = 'leased' AND lease_expires_at < :now))
+              AND attempts < :max_attempts
+            ORDER BY created_at
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        ) AND o.id = j.order_id
+        RETURNING j.id, j.order_id, j.attempts, j.lease_expires_at, o.duplex
+    """), {
+        "device_id": device_id,
+        "now": now,
+        "lease_expires_at": now + timedelta(seconds=settings.PRINT_JOB_LEASE_SECONDS),
+        "max_attempts": settings.PRINT_JOB_MAX_ATTEMPTS,
+    })
+    job = result.fetchone()
+    await db.commit()
+    return job
+
+async def get_leased_job(db: AsyncSession, job_id: int, device_id: str):
+    """Задание, которое сейчас закреплено за этим устройством, или None."""
+    result = await db.execute(text("""
+        SELECT j.id, j.order_id, o.user_id
+        FROM print_jobs j JOIN orders o ON o.id = j.order_id
+        WHERE j.id = :job_id AND j.device_id = :device_id AND j.status = 'leased'
+    """), {"job_id": job_id, "device_id": device_id})
+    return result.fetchone()
+
+@traced("repo.finish_print_job")
+async def finish_print_job(db: AsyncSession, job_id: int, device_id: str, error: str | None = None, retry: bool = False) -> str | None:
+    """
+    Завершает задание по ответу агента: done при error=None, иначе снова в
+    очередь (retry и попытки не исчерпаны) или failed — тогда заказ
+    возвращается в 'paid' и его можно отправить на печать снова.
+    Возвращает новый статус или None, если задание не закреплено за устройством.
+    """
+    job = await get_leased_job(db, job_id, device_id)
+    if job is None:
+        return None
+
+    now = datetime.utcnow()
+    if error is None:
+        new_status = "done"
+    elif retry:
+        attempts = await db.execute(text("SELECT attempts FROM print_jobs WHERE id = :job_id"), {"job_id": job_id})
+        new_status = "queued" if attempts.scalar_one() < settings.PRINT_JOB_MAX_ATTEMPTS else "failed"
+    else:
+        new_status = "failed"
+
+    result = await db.execute(text("""
+        UPDATE print_jobs
+        SET status = :status, error = :error, lease_expires_at = NULL,
+            finished_at = CASE WHEN :status IN ('done', 'failed') THEN CAST(:now AS timestamp) END
+        WHERE id = :job_id AND status = 'leased'
+        RETURNING id
+    """), {"status": new_status, "error": error, "now": now, "job_id": job_id})
+    if result.scalar_one_or_none() is None:
+        # Параллельный ответ по тому же заданию успел раньше
+        await db.rollback()
+        return None
+
+    if new_status == "done":
+        device_name = await db.execute(text("SELECT name FROM devices WHERE id = :device_id"), {"device_id": device_id})
+        await close_printed_order(db, job.order_id, job.user_id, device_name.scalar_one())
+    elif new_status == "queued":
+        await publish_print_job(db, device_id)
+    else:
+        await return_order_to_paid(db, job.order_id, job.user_id, error)
+    await db.commit()
+    return new_status
+
+async def return_order_to_paid(db: AsyncSession, order_id: int, user_id: int, error: str | None) -> None:
+    """Неудачная печать: заказ снова 'paid', клиент узнаёт о сбое из потока событий."""
+    await db.execute(
+        text("UPDATE orders SET status = 'paid', updated_at = :now WHERE id = :order_id AND status = 'printing'"),
+        {"order_id": order_id, "now": datetime.utcnow()}
+    )
+    await publish_order_event(db, order_id, user_id, "failed", detail=f"Print error: {error}")
+    await invalidate(db, orders_listing_cache, user_id)
+
+async def expire_print_jobs(db: AsyncSession) -> None:
+    """
+    Закрывает задания, которые агенты так и не подтвердили за все попытки.
+    Вызывается периодически ведущим воркером.
+    """
+    result = await db.execute(text("""
+        UPDATE print_jobs j
+        SET status = 'failed', error = 'Lease expired', finished_at = :now, lease_expires_at = NULL
+        FROM orders o
+        WHERE o.id = j.order_id AND j.status = 'leased'
+          AND j.lease_expires_at < :now AND j.attempts >= :max_attempts
+        RETURNING j.order_id, o.user_id
+    """), {"now": datetime.utcnow(), "max_attempts": settings.PRINT_JOB_MAX_ATTEMPTS})
+    for order_id, user_id in result.fetchall():
+        await return_order_to_paid(db, order_id, user_id, "Lease expired")
+    await db.commit()
+
+async def touch_device(db: AsyncSession, device_id: str) -> None:
+    await db.execute(
+        text("UPDATE devices SET last_seen_at = :now WHERE id = :device_id"),
+        {"now": datetime.utcnow(), "device_id": device_id}
+    )
@@ -1,15 +1,19 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.db.models.user import User
+from app.core.tracing import traced
 
+@traced("repo.get_user_by_email")
 async def get_user_by_email(db: AsyncSession, email: str):
     result = await db.execute(select(User).filter(User.email == email))
     return result.scalars().first()
 
+@traced("repo.get_user_by_phone")
 async def get_user_by_phone(db: AsyncSession, phone: str) -> User | None:
     result = await db.execute(select(User).filter(User.phone == phone))
     return result.scalars().first()
 
+@traced("repo.create_user")
 async def create_user(db: AsyncSession, user_data: dict) -> User:
     # Перед созданием нужно убедиться, что email или phone не заняты
     phone = user_data.get("phone")
@@ -5,10 +5,9 @@ from app.core.config import settings
 Base = declarative_base()
 
 # Создаем движок для PostgreSQL
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=True,  # Лог SQL-запросов, можно отключить в продакшене
-)
+# SQL в лог — через SQL_ECHO (app/core/log.py); echo=True писал бы в stdout
+# синхронно с event loop, в обход очереди логов
+engine = create_async_engine(settings.DATABASE_URL)
 
 async_session = sessionmaker(
     engine,
@@ -16,6 +15,17 @@ async_session = sessionmaker(
     class_=AsyncSession,
 )
 
+# Необязательная реплика только для чтения (см. app/core/replica.py)
+replica_engine = create_async_engine(
+    settings.DATABASE_REPLICA_URL,
+) if settings.DATABASE_REPLICA_URL else None
+
+replica_session = sessionmaker(
+    replica_engine,
+    expire_on_commit=False,
+    class_=AsyncSession,
+) if replica_engine is not None else None
+
 # Генератор для получения сессий
 async def get_db():
     async with async_session() as session:
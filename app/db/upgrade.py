@@ -0,0 +1,54 @@
+"""
+Доводит схему существующей базы до текущих моделей.
+
+create_all создаёт только недостающие таблицы (вместе с их индексами), а
+в уже существующие колонки и индексы не добавляет. Здесь перечислены
+колонки и индексы, появившиеся в старых таблицах; каждая команда
+идемпотентна, поэтому upgrade_schema безопасно вызывать при каждом старте.
+Новую колонку в существующей таблице нужно дописать сюда же.
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.sql import text
+
+# Ключ advisory-блокировки: воркеры, стартующие одновременно, меняют схему по очереди
+SCHEMA_LOCK_KEY = 7_241_001
+
+SCHEMA_UPGRADES = [
+    # users
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS is_admin BOOLEAN NOT NULL DEFAULT false",
+    # devices
+    "ALTER TABLE devices ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMP WITHOUT TIME ZONE",
+    # files
+    "ALTER TABLE files ADD COLUMN IF NOT EXISTS optimized_pdf_path VARCHAR",
+    "ALTER TABLE files ADD COLUMN IF NOT EXISTS optimized_saved_bytes INTEGER",
+    "ALTER TABLE files ADD COLUMN IF NOT EXISTS status VARCHAR NOT NULL DEFAULT 'ready'",
+    "ALTER TABLE files ADD COLUMN IF NOT EXISTS processing_started_at TIMESTAMP WITHOUT TIME ZONE",
+    "ALTER TABLE files ADD COLUMN IF NOT EXISTS error VARCHAR",
+    "ALTER TABLE files ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP WITHOUT TIME ZONE",
+    "ALTER TABLE files ADD COLUMN IF NOT EXISTS compression VARCHAR",
+    "ALTER TABLE files ADD COLUMN IF NOT EXISTS stored_size BIGINT",
+    "ALTER TABLE files ADD COLUMN IF NOT EXISTS superseded_path VARCHAR",
+    "ALTER TABLE files ADD COLUMN IF NOT EXISTS superseded_at TIMESTAMP WITHOUT TIME ZONE",
+    "CREATE INDEX IF NOT EXISTS ix_files_processing ON files (uploaded_at) WHERE status = 'processing'",
+    "CREATE INDEX IF NOT EXISTS ix_files_user_live ON files (user_id) WHERE deleted_at IS NULL",
+    "CREATE INDEX IF NOT EXISTS ix_files_deleted ON files (deleted_at) WHERE deleted_at IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS ix_files_uncompressed ON files (id) WHERE compression IS NULL",
+    "CREATE INDEX IF NOT EXISTS ix_files_superseded ON files (superseded_at) WHERE superseded_at IS NOT NULL",
+    # orders
+    "ALTER TABLE orders ADD COLUMN IF NOT EXISTS printer VARCHAR",
+    "ALTER TABLE orders ADD COLUMN IF NOT EXISTS printed_at TIMESTAMP WITHOUT TIME ZONE",
+    "ALTER TABLE orders ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP WITHOUT TIME ZONE",
+    "CREATE INDEX IF NOT EXISTS ix_orders_printed_at ON orders (printed_at)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_user_live ON orders (user_id, created_at) WHERE deleted_at IS NULL",
+    "CREATE INDEX IF NOT EXISTS ix_orders_deleted ON orders (deleted_at) WHERE deleted_at IS NOT NULL",
+    # order_files
+    "ALTER TABLE order_files ADD COLUMN IF NOT EXISTS printed_at TIMESTAMP WITHOUT TIME ZONE",
+    "CREATE INDEX IF NOT EXISTS ix_order_files_order_id ON order_files (order_id)",
+]
+
+
+async def upgrade_schema(conn: AsyncConnection) -> None:
+    """Выполняет SCHEMA_UPGRADES в транзакции conn (после create_all)."""
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+    for statement in SCHEMA_UPGRADES:
+        await conn.execute(text(statement))
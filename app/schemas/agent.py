@@ -0,0 +1,28 @@
+from datetime import datetime
+from pydantic import BaseModel, Field
+
+class PrintJobFile(BaseModel):
+    file_id: int
+    copies: int
+    url: str  # Относительный путь для скачивания PDF, см. GET /agent/jobs/{id}/files/{file_id}
+
+class PrintJobRead(BaseModel):
+    job_id: int
+    order_id: int
+    attempt: int
+    duplex: bool
+    lease_expires_at: datetime  # Не успел подтвердить до этого времени — задание выдадут снова
+    files: list[PrintJobFile]
+
+class PrintJobFailure(BaseModel):
+    error: str = Field(max_length=500)
+    retry: bool = True  # Временный сбой (нет бумаги, принтер офлайн): выдать задание ещё раз
+
+class PrintJobResult(BaseModel):
+    job_id: int
+    status: str  # done, queued, failed
+
+class HeartbeatResponse(BaseModel):
+    device_id: str
+    server_time: datetime
+    long_poll_seconds: int  # Рекомендованное ожидание для GET /agent/jobs/next
@@ -0,0 +1,23 @@
+from datetime import date
+from pydantic import BaseModel
+
+class DailyStats(BaseModel):
+    day: date
+    printer: str | None = None  # None в сводке по всем принтерам
+    orders_count: int
+    revenue: int
+    pages: int
+    duplex_pages: int
+    duplex_share: float  # Доля страниц, напечатанных двусторонне
+
+class DailyStatsResponse(BaseModel):
+    items: list[DailyStats]
+
+class StorageStats(BaseModel):
+    files_count: int
+    compressed_count: int
+    skipped_count: int  # Сжатие не окупилось, оригинал хранится как есть
+    pending_count: int  # Ещё не обработаны фоновым сжатием
+    original_bytes: int
+    stored_bytes: int
+    saved_bytes: int
@@ -0,0 +1,15 @@
+from pydantic import BaseModel, Field
+
+MAX_BULK_IDS = 500  # Ограничение одного запроса: одна транзакция не должна держать блокировки долго
+
+class BulkDeleteRequest(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=MAX_BULK_IDS)
+
+class BulkItemResult(BaseModel):
+    id: int
+    status: str  # deleted | not_found | conflict
+    detail: str | None = None
+
+class BulkDeleteResponse(BaseModel):
+    deleted: int
+    results: list[BulkItemResult]  # В порядке ids запроса, без повторов
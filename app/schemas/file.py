@@ -1,9 +1,26 @@
-from pydantic import BaseModel
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict
 
 class FileUploadResponse(BaseModel):
     id: int
     filename: str
     size: int
+    status: str  # processing — конвертация идёт в фоне, см. FileStatusResponse
+
+class SkippedArchiveEntry(BaseModel):
+    name: str
+    reason: str
+
+class FileBatchUploadResponse(BaseModel):
+    """Ответ на загрузку zip: по файлу на каждый принятый документ архива."""
+    files: list[FileUploadResponse]
+    skipped: list[SkippedArchiveEntry]
+
+class FileStatusResponse(BaseModel):
+    id: int
+    status: str  # processing | ready | failed
+    pages: int | None
+    error: str | None
 
 class FileRead(BaseModel):
     id: int
@@ -11,7 +28,26 @@ class FileRead(BaseModel):
     filename: str
     filepath: str
     size: int
-    uploaded_at: str
+    uploaded_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+class FileListItem(BaseModel):
+    """Строка списка файлов: только то, что нужно клиенту, без путей на диске."""
+    id: int
+    original_filename: str
+    filename: str
+    pages_count: int | None
+    size: str  # Человекочитаемый размер, см. format_size
+    uploaded_at: datetime
+    status: str
+
+class FileListResponse(BaseModel):
+    files: list[FileListItem]
+    remaining_storage_mb: float
 
-    class Config:
-        orm_mode = True
+class UploadSessionRead(BaseModel):
+    upload_id: str
+    offset: int
+    length: int
+    expires_at: datetime
@@ -0,0 +1,13 @@
+from datetime import datetime
+from pydantic import BaseModel
+
+class OrderListItem(BaseModel):
+    id: int
+    created_at: datetime | None
+    updated_at: datetime | None
+    status: str
+    total_price: int
+    duplex: bool | None
+
+class OrderListResponse(BaseModel):
+    orders: list[OrderListItem]
@@ -0,0 +1,18 @@
+from pydantic import BaseModel, Field
+
+class PaymentNotification(BaseModel):
+    notification_id: str
+    order_id: int
+    amount: int  # Сумма платежа, должна совпадать с orders.total_price
+    signature: str
+
+class PaymentWebhookBatch(BaseModel):
+    notifications: list[PaymentNotification] = Field(max_length=1000)
+
+class PaymentNotificationResult(BaseModel):
+    notification_id: str
+    order_id: int
+    outcome: str  # paid, duplicate, invalid_signature, not_found, already_paid, amount_mismatch
+
+class PaymentWebhookResponse(BaseModel):
+    results: list[PaymentNotificationResult]
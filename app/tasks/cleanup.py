@@ -3,50 +3,167 @@ from pathlib import Path
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import text
 from sqlalchemy.future import select
-from app.db.models.file import File
-from app.db.session import get_db
+from app.db.models.upload_session import UploadSession
+from app.core.config import settings
+from app.core.storage import storage
+from app.core.cache import files_listing_cache, invalidate
 import logging
 
-# Настраиваем логирование
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("cleanup.log", encoding="utf-8"),
-        # logging.StreamHandler(),            # Лог в консоль
-    ],
-)
+# Логи настраивает app/core/log.py; отдельный файл — через LOG_FILE
 logger = logging.getLogger(__name__)
 
-UPLOAD_DIR = Path("./uploads")
-
 async def cleanup_old_files(db: AsyncSession):
     one_month_ago = datetime.utcnow() - timedelta(days=30)
     logger.info("Начало очистки старых файлов. Проверяем файлы старше %s", one_month_ago)
 
-    result = await db.execute(
-        select(File).where(File.uploaded_at < one_month_ago)
-    )
-    old_files = result.scalars().all()
+    # Старые файлы помечаются удалёнными, как при удалении пользователем;
+    # физически их уберёт reclaim_deleted, когда на них не останется ссылок
+    result = await db.execute(text("""
+        UPDATE files SET deleted_at = :now
+        WHERE uploaded_at < :one_month_ago AND deleted_at IS NULL
+        RETURNING user_id
+    """), {"now": datetime.utcnow(), "one_month_ago": one_month_ago})
+    user_ids = result.scalars().all()
 
-    if not old_files:
+    if not user_ids:
         logger.info("Нет файлов для удаления.")
         return
 
-    for file in old_files:
-        file_path = Path(file.filepath)
+    await invalidate(db, files_listing_cache, *set(user_ids))
+    await db.commit()
+    logger.info("Очистка завершена. Помечено удалёнными файлов: %d", len(user_ids))
+
+async def _reclaim_orders_batch(db: AsyncSession, cutoff: datetime) -> int:
+    # Заказы с незавершёнными заданиями печати не трогаем
+    result = await db.execute(text("""
+        SELECT id FROM orders o
+        WHERE o.deleted_at < :cutoff
+          AND NOT EXISTS (
+              SELECT 1 FROM print_jobs j WHERE j.order_id = o.id AND j.status IN ('queued', 'leased')
+          )
+        LIMIT :batch
+        FOR UPDATE SKIP LOCKED
+    """), {"cutoff": cutoff, "batch": settings.RECLAIM_BATCH_SIZE})
+    order_ids = result.scalars().all()
+    if not order_ids:
+        return 0
+
+    for table in ("print_jobs", "order_files"):
+        await db.execute(text(f"DELETE FROM {table} WHERE order_id = ANY(:order_ids)"), {"order_ids": order_ids})
+    await db.execute(text("DELETE FROM orders WHERE id = ANY(:order_ids)"), {"order_ids": order_ids})
+    await db.commit()
+    return len(order_ids)
+
+async def _reclaim_files_batch(db: AsyncSession, cutoff: datetime) -> tuple[int, int]:
+    # Файл удаляется только когда на него не ссылается ни один заказ
+    # (удалённые заказы к этому моменту уже убраны _reclaim_orders_batch)
+    result = await db.execute(text("""
+        SELECT id, filepath, temp_pdf_path, optimized_pdf_path, superseded_path FROM files f
+        WHERE f.deleted_at < :cutoff
+          AND NOT EXISTS (SELECT 1 FROM order_files of WHERE of.file_id = f.id)
+        LIMIT :batch
+        FOR UPDATE SKIP LOCKED
+    """), {"cutoff": cutoff, "batch": settings.RECLAIM_BATCH_SIZE})
+    files = result.fetchall()
+    if not files:
+        return 0, 0
+
+    reclaimed = []
+    for file in files:
+        try:
+            for key in (file.filepath, file.temp_pdf_path, file.optimized_pdf_path, file.superseded_path):
+                if key:
+                    await storage.delete(key)
+            reclaimed.append(file.id)
+        except Exception as e:
+            # Строку оставляем: следующий проход попробует ещё раз
+            logger.error("Ошибка при удалении файла %s: %s", file.filepath, str(e))
+
+    if reclaimed:
+        await db.execute(text("DELETE FROM files WHERE id = ANY(:file_ids)"), {"file_ids": reclaimed})
+    await db.commit()
+    return len(files), len(reclaimed)
+
+async def _reclaim_superseded_batch(db: AsyncSession, cutoff: datetime) -> tuple[int, int]:
+    # Несжатые оригиналы, заменённые сжатыми (см. compress_file_original)
+    result = await db.execute(text("""
+        SELECT id, superseded_path FROM files
+        WHERE superseded_at < :cutoff
+        LIMIT :batch
+        FOR UPDATE SKIP LOCKED
+    """), {"cutoff": cutoff, "batch": settings.RECLAIM_BATCH_SIZE})
+    files = result.fetchall()
+    if not files:
+        return 0, 0
+
+    reclaimed = []
+    for file in files:
         try:
-            if file_path.exists():
-                file_path.unlink()
-                logger.info("Файл %s успешно удален.", file_path)
-            else:
-                logger.warning("Файл %s не найден.", file_path)
+            await storage.delete(file.superseded_path)
+            reclaimed.append(file.id)
+        except Exception as e:
+            logger.error("Ошибка при удалении несжатого оригинала %s: %s", file.superseded_path, str(e))
+
+    if reclaimed:
+        await db.execute(
+            text("UPDATE files SET superseded_path = NULL, superseded_at = NULL WHERE id = ANY(:file_ids)"),
+            {"file_ids": reclaimed}
+        )
+    await db.commit()
+    return len(files), len(reclaimed)
+
+async def reclaim_deleted(db: AsyncSession):
+    """
+    Физически удаляет помеченные удалёнными заказы и файлы старше
+    DELETED_RETENTION_HOURS пачками по RECLAIM_BATCH_SIZE, каждая пачка —
+    отдельная транзакция. Сначала заказы, потом освободившиеся файлы, затем
+    несжатые оригиналы старше SUPERSEDED_GRACE_MINUTES.
+    """
+    cutoff = datetime.utcnow() - timedelta(hours=settings.DELETED_RETENTION_HOURS)
+
+    orders_total = 0
+    while batch := await _reclaim_orders_batch(db, cutoff):
+        orders_total += batch
+        if batch < settings.RECLAIM_BATCH_SIZE:
+            break
+
+    files_total = 0
+    while True:
+        selected, reclaimed = await _reclaim_files_batch(db, cutoff)
+        files_total += reclaimed
+        # Пачка целиком из ошибок хранилища — не крутимся на ней, ждём следующего запуска
+        if selected < settings.RECLAIM_BATCH_SIZE or not reclaimed:
+            break
 
-            await db.delete(file)
-            logger.info("Запись о файле %s удалена из базы данных.", file.filename)
+    superseded_cutoff = datetime.utcnow() - timedelta(minutes=settings.SUPERSEDED_GRACE_MINUTES)
+    superseded_total = 0
+    while True:
+        selected, reclaimed = await _reclaim_superseded_batch(db, superseded_cutoff)
+        superseded_total += reclaimed
+        if selected < settings.RECLAIM_BATCH_SIZE or not reclaimed:
+            break
 
+    if orders_total or files_total or superseded_total:
+        logger.info("Удалено заказов: %d, файлов: %d, несжатых оригиналов: %d",
+                    orders_total, files_total, superseded_total)
+
+async def cleanup_expired_uploads(db: AsyncSession):
+    """Удаляет брошенные сессии резюмируемой загрузки и их staging-файлы."""
+    now = datetime.utcnow()
+    result = await db.execute(
+        select(UploadSession).where(UploadSession.expires_at < now)
+    )
+    expired = result.scalars().all()
+
+    if not expired:
+        return
+
+    for session in expired:
+        try:
+            Path(session.staging_path).unlink(missing_ok=True)
+            await db.delete(session)
         except Exception as e:
-            logger.error("Ошибка при удалении файла %s: %s", file_path, str(e))
+            logger.error("Ошибка при удалении сессии загрузки %s: %s", session.id, str(e))
 
     await db.commit()
-    logger.info("Очистка завершена. Удалено файлов: %d", len(old_files))
\ No newline at end of file
+    logger.info("Удалено просроченных сессий загрузки: %d", len(expired))
@@ -0,0 +1,101 @@
+import logging
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import text
+from app.core.config import settings
+from app.core.storage import storage
+from app.core.lifecycle import lifecycle
+from app.db.session import async_session
+from app.core.compression import COMPRESSION_SKIPPED, COMPRESSION_ZSTD, compress_original
+
+logger = logging.getLogger(__name__)
+
+COMPRESS_BATCH_SIZE = 200  # Файлов за один проход compress_pending_originals
+
+
+async def compress_file_original(db: AsyncSession, file_id: int) -> None:
+    """
+    Сжимает оригинал обработанного файла (ORIGINALS_COMPRESSION=zstd).
+    API не меняется: download_file и печать распаковывают его на лету.
+    """
+    result = await db.execute(text("""
+        SELECT filepath, size FROM files
+        WHERE id = :file_id AND status = 'ready' AND compression IS NULL AND deleted_at IS NULL
+    """), {"file_id": file_id})
+    file = result.fetchone()
+    await db.commit()
+    if file is None:
+        return
+
+    try:
+        compressed = await compress_original(file.filepath, file.size)
+    except Exception as e:
+        # compression остаётся NULL, следующий проход попробует снова
+        logger.error("Не удалось сжать оригинал %s: %s", file.filepath, e)
+        return
+
+    if compressed is None:
+        await db.execute(
+            text("UPDATE files SET compression = :skipped, stored_size = size WHERE id = :file_id AND compression IS NULL"),
+            {"skipped": COMPRESSION_SKIPPED, "file_id": file_id}
+        )
+        await db.commit()
+        return
+
+    new_key, stored_size = compressed
+    # Условие на filepath: если файл успели изменить или сжать параллельно, наша копия лишняя
+    # Несжатый объект могут ещё читать начатые скачивания и печать, поэтому он
+    # не удаляется сразу, а остаётся в superseded_path до reclaim_deleted
+    result = await db.execute(text("""
+        UPDATE files
+        SET filepath = :new_key, compression = :zstd, stored_size = :stored_size,
+            superseded_path = :old_key, superseded_at = :now
+        WHERE id = :file_id AND filepath = :old_key AND compression IS NULL
+        RETURNING id
+    """), {
+        "new_key": new_key,
+        "zstd": COMPRESSION_ZSTD,
+        "stored_size": stored_size,
+        "now": datetime.utcnow(),
+        "file_id": file_id,
+        "old_key": file.filepath,
+    })
+    updated = result.scalar_one_or_none() is not None
+    await db.commit()
+    if updated:
+        logger.info("Оригинал %s сжат: %d -> %d байт", file.filepath, file.size, stored_size)
+    else:
+        # На сжатую копию никто не ссылается
+        await storage.delete(new_key)
+
+
+async def _compress_in_background(file_id: int) -> None:
+    async with async_session() as db:
+        await compress_file_original(db, file_id)
+
+
+def schedule_compression(file_id: int) -> None:
+    """
+    Сжимает оригинал в отдельной фоновой задаче со своим сеансом БД, не
+    занимая слот конвертации. Во время остановки не ставит: файл досожмёт
+    compress_pending_originals.
+    """
+    if settings.ORIGINALS_COMPRESSION != COMPRESSION_ZSTD or lifecycle.draining:
+        return
+    lifecycle.spawn(_compress_in_background(file_id))
+
+
+async def compress_pending_originals(db: AsyncSession) -> None:
+    """Досжимает оригиналы, пропущенные фоновой обработкой (включение опции, сбои)."""
+    if settings.ORIGINALS_COMPRESSION != COMPRESSION_ZSTD:
+        return
+    result = await db.execute(text("""
+        SELECT id FROM files
+        WHERE compression IS NULL AND status = 'ready' AND deleted_at IS NULL
+        ORDER BY id
+        LIMIT :batch
+    """), {"batch": COMPRESS_BATCH_SIZE})
+    file_ids = result.scalars().all()
+    await db.commit()
+    for file_id in file_ids:
+        await compress_file_original(db, file_id)
@@ -0,0 +1,314 @@
+import asyncio
+import logging
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path, PurePosixPath
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.sql import text
+from app.db.session import async_session
+from app.core.config import settings
+from app.core.storage import storage
+from app.core.cache import files_listing_cache, invalidate
+from app.core.runner import run_tool, ToolError, ToolTimeout, ToolUnavailable
+from app.core.lifecycle import lifecycle
+from app.tasks.compression import schedule_compression
+
+logger = logging.getLogger(__name__)
+
+# Статусы files.status
+FILE_PROCESSING = "processing"
+FILE_READY = "ready"
+FILE_FAILED = "failed"
+
+# Конвертация идёт в фоне: не больше MAX_INFLIGHT_CONVERSIONS одновременно на воркер,
+# остальные задачи ждут слота. Ссылки на задачи держим, чтобы их не собрал GC.
+_conversion_slots = asyncio.Semaphore(settings.MAX_INFLIGHT_CONVERSIONS)
+_pending: set[asyncio.Task] = set()
+# Файл без аренды дольше этого времени считается потерянным (воркер перезапустился
+# до начала обработки, либо обработку отложил circuit breaker)
+UNCLAIMED_GRACE = timedelta(minutes=5)
+
+
+async def convert_to_pdf_and_count_pages(input_file: str, output_dir: str) -> tuple[str, int | None]:
+    """Конвертирует файл в PDF с помощью LibreOffice и подсчитывает количество страниц."""
+    try:
+        input_path = Path(input_file)
+        output_path = Path(output_dir)
+        output_path.mkdir(parents=True, exist_ok=True)
+
+        # Если файл уже PDF, возвращаем его путь и подсчитываем страницы
+        if input_path.suffix.lower() == ".pdf":
+            pdf_file = input_file
+        else:
+            # Свой профиль на каждый запуск: параллельные LibreOffice с общим
+            # профилем по умолчанию завершаются, не создав PDF
+            profile_dir = await run_in_threadpool(tempfile.mkdtemp, prefix="lo-profile-")
+            try:
+                await run_tool(
+                    "libreoffice",
+                    [
+                        "libreoffice",
+                        f"-env:UserInstallation={Path(profile_dir).as_uri()}",
+                        "--headless",
+                        "--convert-to",
+                        "pdf",
+                        input_file,
+                        "--outdir",
+                        str(output_path)
+                    ]
+                )
+            finally:
+                await run_in_threadpool(shutil.rmtree, profile_dir, True)
+            pdf_file = str(output_path / f"{input_path.stem}.pdf")
+
+        # Подсчёт страниц с помощью pdfinfo
+        page_info = (await run_tool("pdfinfo", ["pdfinfo", pdf_file])).decode()
+        pages = int([line.split(":")[1].strip() for line in page_info.splitlines() if "Pages" in line][0])
+
+        return pdf_file if input_path.suffix.lower() != ".pdf" else None, pages
+    except (ToolUnavailable, ToolTimeout):
+        raise
+    except ToolError as e:
+        raise RuntimeError(f"Failed to convert {input_file} to PDF: {e}")
+    except Exception as e:
+        raise RuntimeError(f"Error counting pages: {e}")
+
+def _optimizer_command(pdf_file: str, output_file: str) -> tuple[str, list[str]]:
+    dpi = str(settings.PDF_OPTIMIZE_DPI)
+    if settings.PDF_OPTIMIZER == "ghostscript":
+        return "gs", [
+            "gs",
+            "-sDEVICE=pdfwrite",
+            "-dPDFSETTINGS=/printer",
+            "-dCompatibilityLevel=1.5",
+            "-dDownsampleColorImages=true",
+            "-dDownsampleGrayImages=true",
+            "-dDownsampleMonoImages=true",
+            f"-dColorImageResolution={dpi}",
+            f"-dGrayImageResolution={dpi}",
+            f"-dMonoImageResolution={dpi}",
+            "-dDetectDuplicateImages=true",
+            "-dFastWebView=true",  # линеаризация
+            "-dNOPAUSE",
+            "-dBATCH",
+            "-dQUIET",
+            f"-sOutputFile={output_file}",
+            pdf_file,
+        ]
+    if settings.PDF_OPTIMIZER == "qpdf":
+        return "qpdf", [
+            "qpdf",
+            "--linearize",
+            "--object-streams=generate",
+            "--compress-streams=y",
+            "--recompress-flate",
+            "--compression-level=9",
+            pdf_file,
+            output_file,
+        ]
+    raise ValueError(f"Unknown PDF_OPTIMIZER: {settings.PDF_OPTIMIZER}")
+
+async def optimize_pdf(pdf_file: str, output_dir: str) -> tuple[str | None, int]:
+    """
+    Необязательный этап после конвертации: линеаризует и пережимает PDF,
+    чтобы через CUPS на принтер уходило меньше байт.
+    Возвращает путь к оптимизированному файлу и сэкономленные байты,
+    либо (None, 0), если оптимизация выключена, не удалась или не дала выигрыша.
+    """
+    if not settings.PDF_OPTIMIZER:
+        return None, 0
+
+    source = Path(pdf_file)
+    output_file = Path(output_dir) / f"{source.stem}.optimized.pdf"
+    try:
+        tool, command = _optimizer_command(str(source), str(output_file))
+        await run_tool(tool, command)
+    except (ToolError, ToolTimeout, ToolUnavailable, OSError, ValueError) as e:
+        logger.warning("Не удалось оптимизировать %s: %s", pdf_file, e)
+        output_file.unlink(missing_ok=True)
+        return None, 0
+
+    saved = source.stat().st_size - output_file.stat().st_size
+    if saved <= 0:
+        output_file.unlink(missing_ok=True)
+        return None, 0
+
+    logger.info("PDF %s оптимизирован, сэкономлено %d байт", pdf_file, saved)
+    return str(output_file), saved
+
+
+def conversion_backlog() -> int:
+    """Сколько фоновых конвертаций ждёт или выполняется в этом воркере."""
+    return len(_pending)
+
+
+async def queued_conversions(db: AsyncSession) -> int:
+    """
+    Сколько файлов ждёт или проходит конвертацию во всех воркерах
+    (по частичному индексу ix_files_processing).
+    """
+    result = await db.execute(
+        text("SELECT COUNT(*) FROM files WHERE status = :processing AND deleted_at IS NULL"),
+        {"processing": FILE_PROCESSING}
+    )
+    return result.scalar_one()
+
+
+def schedule_processing(file_id: int) -> None:
+    """
+    Ставит обработку файла в фон текущего воркера. Во время остановки не
+    ставит: файл остаётся без аренды и его подхватит следующий старт.
+    """
+    if lifecycle.draining:
+        return
+    task = lifecycle.spawn(process_file(file_id))
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+async def _claim(db: AsyncSession, file_id: int):
+    """
+    Забирает файл в обработку условным UPDATE. Повторный вызов для того же
+    файла (из другого воркера или из sweep) получит None, пока аренда не истекла.
+    """
+    now = datetime.utcnow()
+    result = await db.execute(text("""
+        UPDATE files SET processing_started_at = :now
+        WHERE id = :file_id AND status = :processing AND deleted_at IS NULL
+          AND (processing_started_at IS NULL OR processing_started_at < :stale)
+        RETURNING user_id, filepath
+    """), {
+        "now": now,
+        "file_id": file_id,
+        "processing": FILE_PROCESSING,
+        "stale": now - timedelta(minutes=settings.FILE_PROCESSING_STALE_MINUTES),
+    })
+    row = result.fetchone()
+    await db.commit()
+    return row
+
+
+async def _release(db: AsyncSession, file_id: int) -> None:
+    await db.rollback()
+    await db.execute(
+        text("UPDATE files SET processing_started_at = NULL WHERE id = :file_id"),
+        {"file_id": file_id}
+    )
+    await db.commit()
+
+
+async def _convert(filepath: str) -> tuple[int, str | None, str | None, int]:
+    """Конвертирует оригинал из хранилища, кладёт PDF-артефакты рядом с ним."""
+    key = PurePosixPath(filepath)
+    with tempfile.TemporaryDirectory(prefix="convert-") as workdir:
+        local_path = Path(workdir) / key.name
+        async with storage.local_copy(filepath) as source:
+            await run_in_threadpool(shutil.copyfile, source, local_path)
+
+        temp_pdf_path, pages_count = await convert_to_pdf_and_count_pages(str(local_path), workdir)
+        optimized_pdf_path, saved_bytes = await optimize_pdf(temp_pdf_path or str(local_path), workdir)
+
+        pdf_key = None
+        if temp_pdf_path:
+            pdf_key = str(key.with_suffix(".pdf"))
+            await storage.save_file(pdf_key, temp_pdf_path)
+        optimized_key = None
+        if optimized_pdf_path:
+            optimized_key = str(key.with_suffix(".optimized.pdf"))
+            await storage.save_file(optimized_key, optimized_pdf_path)
+
+    return pages_count, pdf_key, optimized_key, saved_bytes
+
+
+async def process_file(file_id: int) -> None:
+    """
+    Фоновая обработка загруженного файла: конвертация в PDF, подсчёт страниц,
+    оптимизация. Итог — status 'ready' (или 'failed' с текстом ошибки).
+    """
+    async with _conversion_slots:
+        async with async_session() as db:
+            claimed = await _claim(db, file_id)
+            if claimed is None:
+                return
+
+            try:
+                pages_count, pdf_key, optimized_key, saved_bytes = await _convert(claimed.filepath)
+            except ToolUnavailable as e:
+                # Утилита временно отключена breaker'ом: снимаем аренду,
+                # файл подхватит следующий проход resume_pending_conversions
+                logger.warning("Обработка файла %s отложена: %s", file_id, e)
+                await _release(db, file_id)
+                return
+            except asyncio.CancelledError:
+                # Воркер останавливается и не дождался конвертации (runner уже убил
+                # процесс): снимаем аренду, чтобы следующий старт начал заново сразу
+                logger.warning("Обработка файла %s прервана остановкой воркера", file_id)
+                await _release(db, file_id)
+                raise
+            except Exception as e:
+                logger.error("Не удалось обработать файл %s: %s", file_id, e)
+                await db.execute(
+                    text("UPDATE files SET status = :failed, error = :error WHERE id = :file_id AND status = :processing"),
+                    {"failed": FILE_FAILED, "error": str(e)[:500], "file_id": file_id, "processing": FILE_PROCESSING}
+                )
+                await invalidate(db, files_listing_cache, claimed.user_id)
+                await db.commit()
+                return
+
+            result = await db.execute(text("""
+                UPDATE files
+                SET status = :ready, pages_count = :pages_count, temp_pdf_path = :pdf_key,
+                    optimized_pdf_path = :optimized_key, optimized_saved_bytes = :saved_bytes
+                WHERE id = :file_id AND status = :processing AND deleted_at IS NULL
+                RETURNING id
+            """), {
+                "ready": FILE_READY,
+                "pages_count": pages_count,
+                "pdf_key": pdf_key,
+                "optimized_key": optimized_key,
+                "saved_bytes": saved_bytes if optimized_key else None,
+                "file_id": file_id,
+                "processing": FILE_PROCESSING,
+            })
+            if result.scalar_one_or_none() is None:
+                # Файл удалили, пока шла конвертация: артефакты больше не нужны
+                await db.rollback()
+                for key in (pdf_key, optimized_key):
+                    if key:
+                        await storage.delete(key)
+                return
+            await invalidate(db, files_listing_cache, claimed.user_id)
+            await db.commit()
+
+    # Вне слота конвертации: сжатие не задерживает очередь следующих файлов
+    schedule_compression(file_id)
+
+
+async def resume_pending_conversions(db: AsyncSession, unclaimed_grace: timedelta = UNCLAIMED_GRACE) -> None:
+    """
+    Подхватывает файлы, застрявшие в 'processing': воркер упал посреди
+    конвертации или обработка была отложена. Вызывается периодически ведущим
+    воркером и при старте каждого воркера с unclaimed_grace=0 — так сразу
+    продолжаются файлы, прерванные остановкой. Повторная постановка файла,
+    который ещё ждёт слота в другом воркере, безвредна: его заберёт один _claim.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(minutes=settings.FILE_PROCESSING_STALE_MINUTES)
+    room = settings.MAX_QUEUED_CONVERSIONS - conversion_backlog()
+    if room <= 0:
+        return
+    result = await db.execute(text("""
+        SELECT id FROM files
+        WHERE status = :processing AND deleted_at IS NULL
+          AND (processing_started_at < :stale
+               OR (processing_started_at IS NULL AND uploaded_at < :unclaimed))
+        ORDER BY uploaded_at
+        LIMIT :room
+    """), {"processing": FILE_PROCESSING, "stale": stale, "unclaimed": now - unclaimed_grace, "room": room})
+    file_ids = result.scalars().all()
+    for file_id in file_ids:
+        schedule_processing(file_id)
+    if file_ids:
+        logger.info("Возобновлена обработка файлов: %d", len(file_ids))
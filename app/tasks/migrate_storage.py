@@ -0,0 +1,99 @@
+"""
+Перенос файлов из старой плоской раскладки ./uploads/<email>/<файл>
+в текущий бэкенд хранилища (STORAGE_BACKEND).
+
+Запуск:
+    python -m app.tasks.migrate_storage --legacy-root ./uploads [--dry-run]
+
+Скрипт идемпотентен: строки, пути которых уже являются ключами хранилища
+(файла по такому пути на диске нет), пропускаются. Новый ключ коммитится
+по каждому файлу до удаления старого, так что прерванный запуск можно повторить.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.future import select
+from app.db.models.file import File
+from app.db.session import async_session
+from app.core.storage import storage
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+PATH_COLUMNS = ("filepath", "temp_pdf_path", "optimized_pdf_path")
+
+
+def legacy_key(path: str, legacy_root: Path) -> str | None:
+    """Ключ для старого пути или None, если путь уже не указывает на локальный файл."""
+    local = Path(path)
+    if not local.is_file():
+        return None
+    try:
+        relative = local.resolve().relative_to(legacy_root.resolve())
+    except ValueError:
+        return None
+    # <email>/<timestamp>_<имя> — тот же формат, что генерирует upload_file
+    return relative.as_posix()
+
+
+def _copy_to_temp(path: str) -> str:
+    # save_file перемещает исходник, а старый файл нужен до коммита нового ключа
+    fd, tmp_path = tempfile.mkstemp(suffix=Path(path).suffix)
+    os.close(fd)
+    shutil.copyfile(path, tmp_path)
+    return tmp_path
+
+
+async def migrate(legacy_root: Path, dry_run: bool = False) -> int:
+    migrated = 0
+    last_id = 0
+    async with async_session() as db:
+        while True:
+            result = await db.execute(
+                select(File).where(File.id > last_id).order_by(File.id).limit(BATCH_SIZE)
+            )
+            files = result.scalars().all()
+            if not files:
+                break
+
+            for file in files:
+                last_id = file.id
+                for column in PATH_COLUMNS:
+                    path = getattr(file, column)
+                    if not path:
+                        continue
+                    key = legacy_key(path, legacy_root)
+                    if key is None:
+                        continue
+                    logger.info("%s -> %s", path, key)
+                    if dry_run:
+                        continue
+                    # Копия, коммит нового ключа, и только потом удаление старого файла:
+                    # при обрыве строка указывает либо на старый файл, либо на новый ключ
+                    await storage.save_file(key, await run_in_threadpool(_copy_to_temp, path))
+                    setattr(file, column, key)
+                    await db.commit()
+                    Path(path).unlink(missing_ok=True)
+                    migrated += 1
+
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate uploads to the configured storage backend")
+    parser.add_argument("--legacy-root", default="./uploads", help="Old flat uploads directory")
+    parser.add_argument("--dry-run", action="store_true", help="Only print what would be moved")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    migrated = asyncio.run(migrate(Path(args.legacy_root), args.dry_run))
+    logger.info("Перенесено файлов: %d", migrated)
+
+
+if __name__ == "__main__":
+    main()
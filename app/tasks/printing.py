@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import text
+from app.db.session import async_session
+from app.db.repositories.print_job import ORDER_PRINT_FILES, close_printed_order, return_order_to_paid
+from app.core.config import settings
+from app.core.storage import storage
+from app.core.compression import local_original
+from app.core.events import publish_order_event
+from app.core.cache import orders_listing_cache, invalidate
+from app.core.lifecycle import lifecycle
+from app.core.runner import run_tool, ToolError, ToolTimeout, ToolUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Локальная печать обновляет orders.updated_at после каждого файла. Заказ в
+# 'printing' без задания агента, не обновлявшийся дольше этого, брошен упавшим воркером.
+LOCAL_PRINT_STALE = timedelta(seconds=settings.TOOL_TIMEOUT_LP * 4)
+
+
+class PrintFailed(Exception):
+    """lp не смог напечатать файл; заказ уже возвращён в 'paid'."""
+
+    def __init__(self, print_path: str, error: Exception):
+        super().__init__(f"Ошибка печати файла {print_path}: {error}")
+
+
+async def start_local_print(db: AsyncSession, order_id: int, user_id: int) -> bool:
+    """
+    Переводит оплаченный заказ в 'printing' перед локальной печатью. Условный
+    UPDATE не даёт напечатать заказ дважды параллельными запросами.
+    """
+    result = await db.execute(text("""
+        UPDATE orders SET status = 'printing', updated_at = :now
+        WHERE id = :order_id AND status = 'paid'
+        RETURNING id
+    """), {"order_id": order_id, "now": datetime.utcnow()})
+    if result.scalar_one_or_none() is None:
+        await db.rollback()
+        return False
+    await publish_order_event(db, order_id, user_id, "printing", printer=settings.PRINTER_NAME)
+    await invalidate(db, orders_listing_cache, user_id)
+    await db.commit()
+    return True
+
+
+async def print_order_locally(order_id: int, user_id: int) -> None:
+    """
+    Печатает заказ в статусе 'printing' на локальный принтер и закрывает его.
+    Каждый напечатанный файл отмечается в order_files.printed_at, поэтому
+    повтор после сбоя или остановки воркера печатает только оставшиеся.
+    Запускать через lifecycle.spawn: остановка воркера дождётся печати.
+    """
+    async with async_session() as db:
+        files = (await db.execute(ORDER_PRINT_FILES, {"order_id": order_id})).fetchall()
+        for file in files:
+            if file.printed_at is not None:
+                continue
+            print_path = file.print_path
+            try:
+                async with local_original(print_path) as local_path:
+                    await run_tool("lp", ["lp", "-d", settings.PRINTER_NAME, local_path])
+            except asyncio.CancelledError:
+                # Остановка воркера не дождалась печати: сдвигаем отметку так,
+                # чтобы следующий старт сразу продолжил с этого файла
+                await db.rollback()
+                await db.execute(
+                    text("UPDATE orders SET updated_at = :released WHERE id = :order_id AND status = 'printing'"),
+                    {"order_id": order_id, "released": datetime.utcnow() - LOCAL_PRINT_STALE}
+                )
+                await db.commit()
+                logger.warning("Печать заказа %s прервана на файле %s", order_id, file.file_id)
+                raise
+            except ToolUnavailable as e:
+                await db.rollback()
+                await return_order_to_paid(db, order_id, user_id, str(e))
+                await db.commit()
+                raise
+            except (ToolError, ToolTimeout, OSError) as e:
+                # Заказ снова 'paid', печать можно повторить; напечатанные файлы пропустятся
+                await db.rollback()
+                await return_order_to_paid(db, order_id, user_id, print_path)
+                await db.commit()
+                raise PrintFailed(print_path, e) from e
+            logger.info("Файл %s отправлен на принтер %s", print_path, settings.PRINTER_NAME)
+
+            now = datetime.utcnow()
+            await db.execute(
+                text("UPDATE order_files SET printed_at = :now WHERE id = :order_file_id"),
+                {"now": now, "order_file_id": file.order_file_id}
+            )
+            await db.execute(
+                text("UPDATE orders SET updated_at = :now WHERE id = :order_id"),
+                {"now": now, "order_id": order_id}
+            )
+            await db.commit()
+
+            # Удаляем временные файлы после успешной печати
+            for temp_path in (file.temp_pdf_path, file.optimized_pdf_path):
+                if temp_path:
+                    await storage.delete(temp_path)
+                    logger.info("Временный файл %s удалён", temp_path)
+
+        # Обновляем статус заказа и дневной срез для аналитики
+        await close_printed_order(db, order_id, user_id, settings.PRINTER_NAME)
+        await db.commit()
+
+
+async def _print_in_background(order_id: int, user_id: int) -> None:
+    try:
+        await print_order_locally(order_id, user_id)
+    except (PrintFailed, ToolUnavailable) as e:
+        logger.error("Не удалось допечатать заказ %s: %s", order_id, e)
+
+
+async def resume_interrupted_prints(db: AsyncSession) -> None:
+    """
+    Допечатывает заказы, локальная печать которых оборвалась вместе с воркером.
+    Вызывается при старте и периодически ведущим воркером; условный UPDATE
+    отдаёт каждый заказ только одному воркеру.
+    """
+    if lifecycle.draining:
+        return
+    now = datetime.utcnow()
+    result = await db.execute(text("""
+        UPDATE orders o SET updated_at = :now
+        WHERE o.status = 'printing' AND o.deleted_at IS NULL AND o.updated_at < :stale
+          AND NOT EXISTS (
+              SELECT 1 FROM print_jobs j
+              WHERE j.order_id = o.id AND j.status IN ('queued', 'leased')
+          )
+        RETURNING o.id, o.user_id
+    """), {"now": now, "stale": now - LOCAL_PRINT_STALE})
+    orders = result.fetchall()
+    await db.commit()
+    for order_id, user_id in orders:
+        logger.info("Возобновлена печать заказа %s", order_id)
+        lifecycle.spawn(_print_in_background(order_id, user_id))
@@ -0,0 +1,103 @@
+"""
+Микробенчмарк сериализации списков (1000 строк).
+
+Сравнивает старый путь list_files (SELECT *, dict на строку + jsonable_encoder +
+JSONResponse) с текущим быстрым путём (только поля FileListItem + ORJSONResponse).
+Для справки замерен и вариант с model_construct + сериализатором pydantic-core:
+сборка модели на строку обходится дороже, чем экономия на рендеринге.
+
+    python benchmarks/listing_serialization.py [--rows 1000] [--repeat 200]
+"""
+import argparse
+import json
+import sys
+import timeit
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from app.schemas.file import FileListItem, FileListResponse
+
+
+def format_size(size_in_bytes):
+    # Копия из app/api/v1/endpoints/file.py, чтобы не тянуть настройки приложения
+    if size_in_bytes >= 1024 * 1024:
+        return f"{round(size_in_bytes / (1024 * 1024), 2)} MB"
+    else:
+        return f"{round(size_in_bytes / 1024, 2)} KB"
+
+
+def make_rows(n: int) -> list[dict]:
+    now = datetime(2025, 1, 1)
+    return [
+        {
+            "id": i,
+            "user_id": 1,
+            "original_filename": f"document_{i}.docx",
+            "filename": f"document_{i}.docx",
+            "pages_count": i % 40 + 1,
+            "filepath": f"user@example.com/2025-01-01T00-00-00_document_{i}.docx",
+            "temp_pdf_path": f"user@example.com/2025-01-01T00-00-00_document_{i}.pdf",
+            "size": 150_000 + i * 37,
+            "uploaded_at": now - timedelta(minutes=i),
+            "status": "ready",
+        }
+        for i in range(n)
+    ]
+
+
+def old_path(rows: list[dict]) -> bytes:
+    files = [{**row, "size": format_size(row["size"])} for row in rows]
+    content = jsonable_encoder({"files": files, "remaining_storage_mb": 12.5})
+    return JSONResponse(content).body
+
+
+SLIM_FIELDS = tuple(FileListItem.model_fields)
+
+
+def fast_path(rows: list[dict]) -> bytes:
+    # В эндпоинте проекция делается в SQL; здесь эмулируем её словарём
+    files = [{**{k: row[k] for k in SLIM_FIELDS}, "size": format_size(row["size"])} for row in rows]
+    return ORJSONResponse({"files": files, "remaining_storage_mb": 12.5}).body
+
+
+def model_construct_path(rows: list[dict]) -> bytes:
+    files = [
+        FileListItem.model_construct(
+            id=row["id"],
+            original_filename=row["original_filename"],
+            filename=row["filename"],
+            pages_count=row["pages_count"],
+            size=format_size(row["size"]),
+            uploaded_at=row["uploaded_at"],
+            status=row["status"],
+        )
+        for row in rows
+    ]
+    listing = FileListResponse.model_construct(files=files, remaining_storage_mb=12.5)
+    return listing.__pydantic_serializer__.to_json(listing)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    assert json.loads(fast_path(rows)) == json.loads(model_construct_path(rows))
+
+    baseline = None
+    for name, fn in (("jsonable_encoder + JSONResponse", old_path),
+                     ("slim dicts + ORJSONResponse", fast_path),
+                     ("model_construct + pydantic-core", model_construct_path)):
+        best = min(timeit.repeat(lambda: fn(rows), number=args.repeat, repeat=3)) / args.repeat
+        baseline = baseline or best
+        print(f"{name:34s} {best * 1000:8.3f} ms/listing  x{baseline / best:.1f}")
+
+
+if __name__ == "__main__":
+    main()
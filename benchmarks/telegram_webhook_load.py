@@ -0,0 +1,175 @@
+"""
+Нагрузочный тест webhook Telegram-бота против локальной заглушки Bot API.
+
+Заглушка (aiohttp) отвечает на методы Bot API и на {API_V1_STR}/codes/generate,
+так что замеряется только бот: разбор обновления, FSM в Postgres, ответ.
+Каждый пользователь шлёт /start и контакт — как при входе; в конце
+проверяется, что на каждое обновление ушёл ровно один sendMessage.
+
+В одном процессе (webhook_app вызывается напрямую, нужен Postgres из DATABASE_URL):
+
+    python benchmarks/telegram_webhook_load.py --users 2000 --concurrency 100
+
+Против запущенных воркеров (их нужно направить на заглушку):
+
+    TELEGRAM_API_SERVER=http://127.0.0.1:8082 TELEGRAM_WEBHOOK_SECRET=s3cr3t \\
+        uvicorn telegram_bot:webhook_app --port 8081 --workers 4
+    python benchmarks/telegram_webhook_load.py --url http://127.0.0.1:8081/telegram/webhook --secret s3cr3t
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+import httpx
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+DEFAULT_SECRET = "load-test-secret"
+
+
+class FakeBotAPI:
+    """Минимальная заглушка api.telegram.org: считает вызовы методов."""
+
+    def __init__(self, api_prefix: str):
+        self.calls: Counter[str] = Counter()
+        self.app = web.Application()
+        self.app.router.add_post("/bot{token}/{method}", self.bot_method)
+        self.app.router.add_post(f"{api_prefix}/codes/generate", self.generate_code)
+        self._runner: web.AppRunner | None = None
+
+    async def bot_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        if method == "sendMessage":
+            result = {
+                "message_id": self.calls[method],
+                "date": int(time.time()),
+                "chat": {"id": int(params["chat_id"]), "type": "private"},
+                "text": params.get("text", ""),
+            }
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def generate_code(self, request: web.Request) -> web.Response:
+        self.calls["codes/generate"] += 1
+        return web.json_response({"message": "Code saved"})
+
+    async def start(self, port: int) -> None:
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", port).start()
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+def make_updates(user_id: int, update_id: int) -> list[dict]:
+    sender = {"id": user_id, "is_bot": False, "first_name": "Load"}
+    chat = {"id": user_id, "type": "private"}
+    now = int(time.time())
+    return [
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": 1, "date": now, "chat": chat, "from": sender, "text": "/start",
+                "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+            },
+        },
+        {
+            "update_id": update_id + 1,
+            "message": {
+                "message_id": 2, "date": now, "chat": chat, "from": sender,
+                "contact": {"phone_number": f"+7900{user_id:07d}", "first_name": "Load", "user_id": user_id},
+            },
+        },
+    ]
+
+
+async def run_user(client: httpx.AsyncClient, url: str, secret: str, user_id: int,
+                   semaphore: asyncio.Semaphore, latencies: list[float], errors: Counter) -> None:
+    # Обновления одного пользователя идут по порядку, как их доставляет Telegram
+    for update in make_updates(user_id, user_id * 2):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                resp = await client.post(url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": secret})
+            except httpx.HTTPError as e:
+                errors[type(e).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            if resp.status_code != 200:
+                errors[str(resp.status_code)] += 1
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Telegram webhook load test")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--fake-port", type=int, default=8082, help="port of the fake Bot API")
+    parser.add_argument("--url", default=None, help="webhook URL of running workers; default: in-process")
+    parser.add_argument("--secret", default=os.environ.get("TELEGRAM_WEBHOOK_SECRET") or DEFAULT_SECRET)
+    args = parser.parse_args()
+
+    fake_base = f"http://127.0.0.1:{args.fake_port}"
+    if args.url is None:
+        # Бот в этом процессе: направляем его на заглушку до импорта модуля
+        os.environ["TELEGRAM_API_SERVER"] = fake_base
+        os.environ["TELEGRAM_WEBHOOK_SECRET"] = args.secret
+    from app.core.config import settings
+
+    fake = FakeBotAPI(settings.API_V1_STR)
+    await fake.start(args.fake_port)
+
+    if args.url is None:
+        import telegram_bot
+        telegram_bot.api_url = fake_base + settings.API_V1_STR
+        await telegram_bot.start_webhook()
+        transport = httpx.ASGITransport(app=telegram_bot.webhook_app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://bot")
+        url = telegram_bot.WEBHOOK_PATH
+    else:
+        client = httpx.AsyncClient(timeout=30)
+        url = args.url
+
+    latencies: list[float] = []
+    errors: Counter[str] = Counter()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            run_user(client, url, args.secret, user_id, semaphore, latencies, errors)
+            for user_id in range(1, args.users + 1)
+        ))
+    finally:
+        elapsed = time.perf_counter() - started
+        await client.aclose()
+        if args.url is None:
+            await telegram_bot.close_bot()
+        await fake.stop()
+
+    updates = args.users * 2
+    print(f"{updates} updates, concurrency {args.concurrency}: {elapsed:.2f}s ({updates / elapsed:.0f} updates/s)")
+    if latencies:
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(f"latency ms: p50 {quantiles[49] * 1000:.1f}  p95 {quantiles[94] * 1000:.1f}  p99 {quantiles[98] * 1000:.1f}")
+    print(f"sendMessage {fake.calls['sendMessage']}, codes/generate {fake.calls['codes/generate']}")
+    if errors:
+        print("errors:", dict(errors))
+    if fake.calls["sendMessage"] != updates:
+        print(f"MISMATCH: expected {updates} replies")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
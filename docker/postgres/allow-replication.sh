@@ -0,0 +1,4 @@
+#!/bin/bash
+# Выполняется при первой инициализации тома db: разрешает потоковую
+# репликацию для стенда с репликой (docker-compose --profile replica).
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
@@ -1,5 +1,7 @@
+from contextlib import asynccontextmanager
+from datetime import timedelta
 from fastapi import FastAPI
-from fastapi_utils.tasks import repeat_every
+from fastapi.responses import ORJSONResponse
 from app.core.config import settings
 from app.api.v1.endpoints.auth import router as auth_router
 from app.api.v1.endpoints.codes import router as codes_router
@@ -7,17 +9,70 @@ from app.api.v1.endpoints.file import router as file_router
 from app.api.v1.endpoints.order import router as order_router
 from app.api.v1.endpoints.payment import router as payment_router
 from app.api.v1.endpoints.print import router as print_router
+from app.api.v1.endpoints.analytics import router as analytics_router
+from app.api.v1.endpoints.debug import router as debug_router
+from app.api.v1.endpoints.agent import router as agent_router
 from app.db.session import engine, Base, get_db
-from app.tasks.cleanup import cleanup_old_files
+from app.db.upgrade import upgrade_schema
+from app.core.bus import bus
+from app.core.lifecycle import lifecycle
+from app.core.log import RequestLogMiddleware, setup_logging
+from app.core.admission import AdmissionMiddleware, cleanup_upload_buckets
+from app.core.tracing import TracingMiddleware, instrument_engine
+import app.core.events  # noqa: F401  (подписывает SSE-хаб на шину до её старта)
+from app.core.idempotency import cleanup_idempotency_keys
+from app.tasks.cleanup import cleanup_old_files, cleanup_expired_uploads, reclaim_deleted
+from app.tasks.conversion import resume_pending_conversions
+from app.tasks.compression import compress_pending_originals
+from app.tasks.printing import resume_interrupted_prints
+from app.db.repositories.print_job import expire_print_jobs
+from app.db.repositories.analytics import refresh_daily_rollups
 import logging
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
+# Настройка логирования: JSON в отдельном потоке через очередь (app/core/log.py)
+setup_logging()
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title=settings.PROJECT_NAME)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Создаем таблицы в базе данных и добавляем новые колонки в существующие
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await upgrade_schema(conn)
+    logger.info("Startup completed. Database tables created.")
+    # Одно LISTEN-соединение на воркер: события заказов, инвалидация кэшей,
+    # выбор ведущего для периодических задач
+    await bus.start()
+    lifecycle.install_signal_handlers()
+
+    # Продолжаем работу, прерванную остановкой предыдущего воркера
+    async for db in get_db():
+        await resume_pending_conversions(db, unclaimed_grace=timedelta(0))
+        await resume_interrupted_prints(db)
+    await lifecycle.start()
+    if settings.TELEGRAM_WEBHOOK_IN_API:
+        await telegram_bot.start_webhook()
+
+    yield
+
+    if settings.TELEGRAM_WEBHOOK_IN_API:
+        await telegram_bot.close_bot()
+
+    # uvicorn уже дождался открытых запросов; дожидаемся фоновых конвертаций и печати
+    await lifecycle.shutdown()
+    await bus.stop()
+
+app = FastAPI(title=settings.PROJECT_NAME, default_response_class=ORJSONResponse, lifespan=lifespan)
 api_version = settings.API_V1_STR
 
+# Лимиты на загрузку/конвертацию проверяются до чтения тела запроса
+app.add_middleware(AdmissionMiddleware)
+# Трассировка/профилирование одного запроса по заголовкам X-Debug-Trace / X-Debug-Profile (только админы)
+app.add_middleware(TracingMiddleware)
+# Id запроса в логах и заголовке X-Request-Id; добавлен последним — внешний слой, видит все ответы
+app.add_middleware(RequestLogMiddleware)
+instrument_engine(engine)
+
 # Register routers
 app.include_router(auth_router, prefix=f"{api_version}/auth", tags=["auth"])
 app.include_router(codes_router, prefix=f"{api_version}/codes", tags=["codes"])
@@ -25,17 +80,51 @@ app.include_router(file_router, prefix=f"{api_version}/files", tags=["files"])
 app.include_router(order_router, prefix=f"{api_version}/orders", tags=["orders"])
 app.include_router(payment_router, prefix=f"{api_version}", tags=["payments"])
 app.include_router(print_router, prefix=f"{api_version}", tags=["print"])
+app.include_router(analytics_router, prefix=f"{api_version}/admin/analytics", tags=["admin"])
+app.include_router(debug_router, prefix=f"{api_version}/admin/debug", tags=["admin"])
+app.include_router(agent_router, prefix=f"{api_version}/agent", tags=["agent"])
+if settings.TELEGRAM_WEBHOOK_IN_API:
+    # aiogram нужен API только в этом режиме
+    import telegram_bot
+    app.include_router(telegram_bot.webhook_router, prefix=api_version, tags=["telegram"])
 
-@app.on_event("startup")
-async def startup():
-    # Создаем таблицы в базе данных
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    logger.info("Startup event completed. Database tables created.")
-
-# Отдельная регистрация повторяющейся задачи
-@app.on_event("startup")
-@repeat_every(seconds=3600)  # Выполняем раз в час
+# Периодические задачи выполняет только ведущий воркер (advisory-lock шины)
+@lifecycle.periodic(seconds=3600)  # Выполняем раз в час
 async def schedule_cleanup():
+    if not await bus.try_lead():
+        return
     async for db in get_db():  # Используем get_db как генератор
         await cleanup_old_files(db)
+        await reclaim_deleted(db)
+        await compress_pending_originals(db)
+        await cleanup_idempotency_keys(db)
+        await cleanup_upload_buckets(db)
+
+@lifecycle.periodic(seconds=900)  # Раз в 15 минут
+async def schedule_upload_sweep():
+    if not await bus.try_lead():
+        return
+    async for db in get_db():
+        await cleanup_expired_uploads(db)
+
+@lifecycle.periodic(seconds=120)  # Раз в 2 минуты подхватываем зависшие конвертации
+async def schedule_conversion_resume():
+    if not await bus.try_lead():
+        return
+    async for db in get_db():
+        await resume_pending_conversions(db)
+
+@lifecycle.periodic(seconds=60)  # Раз в минуту закрываем задания печати, которые агенты так и не подтвердили
+async def schedule_print_job_sweep():
+    if not await bus.try_lead():
+        return
+    async for db in get_db():
+        await expire_print_jobs(db)
+        await resume_interrupted_prints(db)
+
+@lifecycle.periodic(seconds=3600)  # Раз в час сверяем срезы аналитики за последние сутки
+async def schedule_rollup_refresh():
+    if not await bus.try_lead():
+        return
+    async for db in get_db():
+        await refresh_daily_rollups(db)
@@ -0,0 +1,145 @@
+"""
+Эталонный агент печати для удалённого устройства (киоска).
+
+Опрашивает API в режиме long-poll, скачивает PDF задания потоком во
+временный файл, отправляет его в CUPS через lp и подтверждает задание.
+Между заданиями шлёт heartbeat. Устройство должно быть заведено в таблице
+devices; его id и secret_key передаются в аргументах.
+
+    python print_agent.py --device-id kiosk-1 --secret s3cr3t --printer Kiosk_Printer
+    python print_agent.py --device-id kiosk-1 --secret s3cr3t --dry-run ./printed
+
+С --dry-run файлы не печатаются, а складываются в каталог — так агент
+работает как локальная заглушка принтера.
+"""
+import argparse
+import asyncio
+import logging
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+import httpx
+
+# Агент запускается на устройстве без настроек сервера, всё задаётся аргументами
+DEFAULT_API_URL = "http://127.0.0.1:8000"
+DEFAULT_API_PREFIX = "/api/v1"
+DEFAULT_WAIT_SECONDS = 25
+
+HEARTBEAT_SECONDS = 30
+ERROR_BACKOFF_SECONDS = 5
+
+logger = logging.getLogger("print_agent")
+
+
+class PrintFailed(Exception):
+    """Печать не удалась; retry=True — временный сбой, задание можно выдать снова."""
+
+    def __init__(self, message: str, retry: bool = True):
+        super().__init__(message)
+        self.retry = retry
+
+
+async def heartbeat_loop(client: httpx.AsyncClient, args) -> None:
+    while True:
+        try:
+            resp = await client.post(f"{args.api_prefix}/agent/heartbeat")
+            resp.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning("Heartbeat failed: %s", e)
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+
+
+async def download(client: httpx.AsyncClient, url: str, target: Path) -> None:
+    # Файл пишется на диск по мере получения, целиком в памяти не держится
+    async with client.stream("GET", url) as resp:
+        resp.raise_for_status()
+        with open(target, "wb") as f:
+            async for chunk in resp.aiter_bytes():
+                f.write(chunk)
+
+
+def send_to_printer(pdf: Path, printer: str, copies: int, duplex: bool, dry_run: Path | None) -> None:
+    if dry_run is not None:
+        dry_run.mkdir(parents=True, exist_ok=True)
+        shutil.copy(pdf, dry_run / pdf.name)
+        logger.info("[dry-run] %s x%d%s -> %s", pdf.name, copies, " duplex" if duplex else "", dry_run)
+        return
+
+    command = ["lp", "-n", str(copies)]
+    if printer:
+        command += ["-d", printer]
+    if duplex:
+        command += ["-o", "sides=two-sided-long-edge"]
+    try:
+        subprocess.run(command + [str(pdf)], check=True, capture_output=True, timeout=120)
+    except FileNotFoundError:
+        raise PrintFailed("lp is not installed on the device", retry=False)
+    except subprocess.TimeoutExpired:
+        raise PrintFailed("lp timed out")
+    except subprocess.CalledProcessError as e:
+        raise PrintFailed(f"lp exited with code {e.returncode}: {e.stderr.decode(errors='replace').strip()}")
+
+
+async def handle_job(client: httpx.AsyncClient, job: dict, args) -> None:
+    job_id = job["job_id"]
+    logger.info("Job %s: order %s, %d file(s), attempt %s", job_id, job["order_id"], len(job["files"]), job["attempt"])
+    try:
+        with tempfile.TemporaryDirectory(prefix=f"job-{job_id}-") as workdir:
+            for file in job["files"]:
+                pdf = Path(workdir) / f"{job['order_id']}_{file['file_id']}.pdf"
+                try:
+                    await download(client, file["url"], pdf)
+                except httpx.HTTPError as e:
+                    raise PrintFailed(f"Download of file {file['file_id']} failed: {e}")
+                await asyncio.to_thread(send_to_printer, pdf, args.printer, file["copies"], job["duplex"], args.dry_run)
+    except PrintFailed as e:
+        logger.error("Job %s failed: %s", job_id, e)
+        resp = await client.post(
+            f"{args.api_prefix}/agent/jobs/{job_id}/fail",
+            json={"error": str(e)[:500], "retry": e.retry}
+        )
+    else:
+        resp = await client.post(f"{args.api_prefix}/agent/jobs/{job_id}/ack")
+    if resp.status_code == 409:
+        # Аренда истекла, задание уже выдано заново или закрыто
+        logger.warning("Job %s is no longer leased by this device", job_id)
+        return
+    resp.raise_for_status()
+    logger.info("Job %s -> %s", job_id, resp.json()["status"])
+
+
+async def poll_loop(client: httpx.AsyncClient, args) -> None:
+    while True:
+        try:
+            resp = await client.get(f"{args.api_prefix}/agent/jobs/next", params={"wait": args.wait})
+            if resp.status_code == 204:
+                continue
+            resp.raise_for_status()
+            await handle_job(client, resp.json(), args)
+        except httpx.HTTPError as e:
+            logger.warning("Polling failed: %s", e)
+            await asyncio.sleep(ERROR_BACKOFF_SECONDS)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Reference print agent")
+    parser.add_argument("--api", default=DEFAULT_API_URL, help="API base URL")
+    parser.add_argument("--api-prefix", default=DEFAULT_API_PREFIX, help="API_V1_STR of the server")
+    parser.add_argument("--device-id", required=True)
+    parser.add_argument("--secret", required=True, help="devices.secret_key")
+    parser.add_argument("--printer", default=None, help="CUPS printer name; default: the device's default printer")
+    parser.add_argument("--wait", type=int, default=DEFAULT_WAIT_SECONDS, help="long-poll seconds")
+    parser.add_argument("--dry-run", type=Path, default=None, metavar="DIR", help="save PDFs to DIR instead of printing")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    headers = {"X-Device-Id": args.device_id, "X-Device-Secret": args.secret}
+    # Таймаут чтения больше окна long-poll, иначе пустой опрос считался бы ошибкой
+    timeout = httpx.Timeout(10, read=args.wait + 15)
+    async with httpx.AsyncClient(base_url=args.api, headers=headers, timeout=timeout) as client:
+        await asyncio.gather(heartbeat_loop(client, args), poll_loop(client, args))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""
+Локальная заглушка платёжного провайдера для проверки /payments/webhook.
+
+Подписывает уведомления тем же секретом, что и API (PAYMENT_WEBHOOK_SECRET),
+и шлёт их пачками, как это делает настоящий провайдер при всплеске колбэков.
+
+    python stub_payment_provider.py 12:3200 13:800 --bad-signature 14:400
+    python stub_payment_provider.py --burst 50 --batch-size 200 10:400
+"""
+import argparse
+import asyncio
+import time
+import uuid
+import httpx
+from app.core.config import settings
+from app.core.payments import notification_signature
+
+
+def make_notification(order_id: int, amount: int, valid: bool = True) -> dict:
+    notification_id = uuid.uuid4().hex
+    signature = notification_signature(settings.PAYMENT_WEBHOOK_SECRET, notification_id, order_id, amount)
+    return {
+        "notification_id": notification_id,
+        "order_id": order_id,
+        "amount": amount,
+        "signature": signature if valid else "0" * 64,
+    }
+
+
+def parse_pair(value: str) -> tuple[int, int]:
+    order_id, amount = value.split(":")
+    return int(order_id), int(amount)
+
+
+async def send_batch(client: httpx.AsyncClient, api_url: str, notifications: list[dict]) -> dict:
+    resp = await client.post(f"{api_url}/payments/webhook", json={"notifications": notifications})
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Stub payment provider")
+    parser.add_argument("orders", nargs="*", type=parse_pair, help="order_id:amount pairs to pay")
+    parser.add_argument("--bad-signature", nargs="*", type=parse_pair, default=[], help="pairs sent with a broken signature")
+    parser.add_argument("--api", default="http://127.0.0.1:8000" + settings.API_V1_STR, help="API base URL with API_V1_STR")
+    parser.add_argument("--burst", type=int, default=1, help="repeat the batch N times concurrently")
+    parser.add_argument("--batch-size", type=int, default=0, help="pad the batch with signed notifications for order 0")
+    args = parser.parse_args()
+
+    notifications = [make_notification(o, a) for o, a in args.orders]
+    notifications += [make_notification(o, a, valid=False) for o, a in args.bad_signature]
+    while len(notifications) < args.batch_size:
+        notifications.append(make_notification(0, 0))
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(send_batch(client, args.api, notifications) for _ in range(args.burst)))
+        elapsed = time.perf_counter() - started
+
+    for item in results[0]["results"][:20]:
+        print(f"{item['notification_id']} order={item['order_id']} -> {item['outcome']}")
+    total = args.burst * len(notifications)
+    print(f"{total} notifications in {args.burst} batches, {elapsed:.2f}s ({total / elapsed:.0f}/s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
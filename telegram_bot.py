@@ -1,18 +1,67 @@
-import random
+"""
+Telegram-бот входа по номеру телефона.
+
+Режимы:
+
+    python telegram_bot.py                  # long polling, один процесс (как раньше)
+    python telegram_bot.py set-webhook      # зарегистрировать TELEGRAM_WEBHOOK_URL в Telegram
+    python telegram_bot.py delete-webhook   # вернуться к polling
+
+Webhook можно обслуживать отдельно, несколькими воркерами:
+
+    uvicorn telegram_bot:webhook_app --port 8081 --workers 4
+
+или внутри API (TELEGRAM_WEBHOOK_IN_API=true) — тогда путь
+{API_V1_STR}/telegram/webhook. Состояние FSM хранится в Postgres
+(app/core/fsm_storage.py), поэтому воркеры взаимозаменяемы.
+"""
+import argparse
 import asyncio
+import hmac
+import logging
+import random
+from contextlib import asynccontextmanager
 import aiohttp
 from aiogram import Bot, Dispatcher, types, F
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.filters import CommandStart
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
-from aiogram.fsm.storage.memory import MemoryStorage
+from fastapi import APIRouter, FastAPI, Header, HTTPException, Request, Response, status
 from app.core.config import settings
+from app.core.fsm_storage import PostgresStorage
+from app.core.log import RequestLogMiddleware, setup_logging
+from app.db.models.bot_state import BotState
+from app.db.session import engine
 
 # TODO: Поменять на ваш адрес FastAPI
 api_url = "http://127.0.0.1:8000" + settings.API_V1_STR
 
-# Инициализация бота и диспетчера с использованием MemoryStorage
-bot = Bot(token=settings.TELEGRAM_API_TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
+WEBHOOK_PATH = "/telegram/webhook"
+
+logger = logging.getLogger("telegram_bot")
+
+
+def create_bot(api_server: str = settings.TELEGRAM_API_SERVER) -> Bot:
+    # TELEGRAM_API_SERVER — свой Bot API server или локальная заглушка (benchmarks/telegram_webhook_load.py)
+    session = AiohttpSession(api=TelegramAPIServer.from_base(api_server)) if api_server else None
+    return Bot(token=settings.TELEGRAM_API_TOKEN, session=session)
+
+
+# Инициализация бота и диспетчера; состояние FSM — в Postgres, общее для всех процессов
+bot = create_bot()
+dp = Dispatcher(storage=PostgresStorage())
+
+# Одна HTTP-сессия к API на процесс, а не новая на каждое сообщение
+_api_session: aiohttp.ClientSession | None = None
+
+
+def api_session() -> aiohttp.ClientSession:
+    global _api_session
+    if _api_session is None or _api_session.closed:
+        _api_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+    return _api_session
+
 
 # Хэндлер для команды /start
 @dp.message(CommandStart())
@@ -33,18 +82,98 @@ async def get_contact(message: types.Message):
     code = str(random.randint(1000, 9999))
 
     # Отправка кода в ваше FastAPI приложение для сохранения
-    async with aiohttp.ClientSession() as session:
-        url = f"{api_url}/codes/generate"
-        payload = {"phone": phone_number, "code": code}
-        async with session.post(url, json=payload) as resp:
-            if resp.status == 200:
-                await message.answer(f"Ваш код: {code}\nВведите его в приложении для входа.")
-            else:
-                await message.answer("Не удалось сгенерировать код, попробуйте позже.")
+    url = f"{api_url}/codes/generate"
+    payload = {"phone": phone_number, "code": code}
+    try:
+        async with api_session().post(url, json=payload) as resp:
+            ok = resp.status == 200
+    except aiohttp.ClientError as e:
+        logger.warning("Code generation request failed: %s", e)
+        ok = False
+    if ok:
+        await message.answer(f"Ваш код: {code}\nВведите его в приложении для входа.")
+    else:
+        await message.answer("Не удалось сгенерировать код, попробуйте позже.")
+
+
+webhook_router = APIRouter()
+
+@webhook_router.post(WEBHOOK_PATH, include_in_schema=False)
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: str | None = Header(None)
+):
+    """
+    Принимает обновления от Telegram. Без секрета любой мог бы прислать
+    поддельный контакт и получить код входа на чужой номер, поэтому
+    запросы без верного X-Telegram-Bot-Api-Secret-Token отклоняются.
+    """
+    secret = settings.TELEGRAM_WEBHOOK_SECRET
+    if not secret or not hmac.compare_digest(x_telegram_bot_api_secret_token or "", secret):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid webhook secret")
+
+    update = types.Update.model_validate(await request.json(), context={"bot": bot})
+    # Обрабатываем до ответа: если воркер упадёт, Telegram повторит доставку
+    await dp.feed_update(bot, update)
+    return Response(status_code=status.HTTP_200_OK)
+
+
+async def start_webhook() -> None:
+    if not settings.TELEGRAM_WEBHOOK_SECRET:
+        raise RuntimeError("Telegram webhook requires TELEGRAM_WEBHOOK_SECRET to be set")
+    async with engine.begin() as conn:
+        await conn.run_sync(BotState.__table__.create, checkfirst=True)
+
+
+async def close_bot() -> None:
+    if _api_session is not None:
+        await _api_session.close()
+    await bot.session.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
+    await start_webhook()
+    yield
+    await close_bot()
+
+# Отдельное приложение только с webhook: uvicorn telegram_bot:webhook_app --workers N
+webhook_app = FastAPI(title="Printo Telegram webhook", lifespan=lifespan)
+webhook_app.add_middleware(RequestLogMiddleware)
+webhook_app.include_router(webhook_router)
+
+
+async def set_webhook() -> None:
+    if not settings.TELEGRAM_WEBHOOK_URL or not settings.TELEGRAM_WEBHOOK_SECRET:
+        raise SystemExit("Set TELEGRAM_WEBHOOK_URL and TELEGRAM_WEBHOOK_SECRET first")
+    await bot.set_webhook(
+        settings.TELEGRAM_WEBHOOK_URL,
+        secret_token=settings.TELEGRAM_WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+        max_connections=settings.TELEGRAM_WEBHOOK_MAX_CONNECTIONS,
+    )
+    logger.info("Webhook set to %s", settings.TELEGRAM_WEBHOOK_URL)
+
 
 async def main():
-    # Запуск поллинга
-    await dp.start_polling(bot)
+    parser = argparse.ArgumentParser(description="Printo Telegram bot")
+    parser.add_argument("command", nargs="?", default="polling", choices=["polling", "set-webhook", "delete-webhook"])
+    args = parser.parse_args()
+    setup_logging()
+
+    try:
+        if args.command == "set-webhook":
+            await set_webhook()
+        elif args.command == "delete-webhook":
+            await bot.delete_webhook()
+        else:
+            async with engine.begin() as conn:
+                await conn.run_sync(BotState.__table__.create, checkfirst=True)
+            # Запуск поллинга (пока зарегистрирован webhook, Telegram его не разрешит)
+            await dp.start_polling(bot)
+    finally:
+        await close_bot()
 
 if __name__ == "__main__":
     asyncio.run(main())